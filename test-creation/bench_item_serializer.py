@@ -0,0 +1,78 @@
+"""
+Benchmark for the precompiled item template serializer.
+
+Times render_qti_item_xml against building the tree with create_qti_item_xml and
+serializing it with lxml, in items/sec, for pretty and compact output, over a set
+of edge cases and randomized items. That both write the same bytes is checked by
+tests/test_item_serializer.py.
+
+Usage: python bench_item_serializer.py [--items N] [--seed S]
+"""
+import argparse
+import random
+import time
+
+from tao_qti.main import create_qti_item_xml, render_qti_item_xml, serialize_xml
+
+# Values that exercise escaping, stripping and the stimulus "N/A" rule
+EDGE_CASE_TEXTS = [
+    '', ' ', 'N/A', ' n/a ', 'nan', 'None', 'plain text', '  padded  ',
+    'a < b && c > d', '"double" and \'single\' quotes', ']]>', '&amp; already escaped',
+    'line one\nline two', 'carriage\r\nreturn', 'tab\tseparated', '√2 ≠ 1.414…', 'emoji 😀 and 中文',
+    'עברית RTL', 'x' * 5000, 42, 3.5,
+]
+
+OPTION_IDS = ['option_A', 'option_B', 'option_C', 'option_D']
+
+
+def random_text(rng):
+    if rng.random() < 0.5:
+        return rng.choice(EDGE_CASE_TEXTS)
+    alphabet = 'abcdefghij <>&"\'\n\t√π中😀'
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+
+
+def generate_cases(count, seed):
+    """Yields argument tuples for create_qti_item_xml / render_qti_item_xml."""
+    for text in EDGE_CASE_TEXTS:
+        yield ('ITEM_1', f"Item: {text}", text, text, [(option_id, text) for option_id in OPTION_IDS], 'option_A')
+    yield ('ITEM_NO_OPTIONS', 'Item: none', '', 'Stem', [], 'option_A')
+    rng = random.Random(seed)
+    for i in range(count):
+        options = [(option_id, random_text(rng) or 'x') for option_id in OPTION_IDS[:rng.randint(1, 4)]]
+        yield (
+            f"ITEM_{i}", f"Item: {random_text(rng)}", random_text(rng), random_text(rng),
+            options, rng.choice(options)[0],
+        )
+
+
+def benchmark(cases, pretty_print=True):
+    """Times both serializers over the same cases. Returns {name: items_per_second}."""
+    results = {}
+    for name, serialize in [
+        ('lxml', lambda case: serialize_xml(create_qti_item_xml(*case), pretty_print)),
+        ('template', lambda case: render_qti_item_xml(*case, pretty_print=pretty_print)),
+    ]:
+        start = time.perf_counter()
+        for case in cases:
+            serialize(case)
+        elapsed = time.perf_counter() - start
+        results[name] = len(cases) / elapsed if elapsed else float('inf')
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000, help="Randomized items to time (default 20000)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the randomized items")
+    args = parser.parse_args()
+
+    cases = list(generate_cases(args.items, args.seed))
+
+    for pretty_print in (True, False):
+        results = benchmark(cases, pretty_print)
+        label = "pretty" if pretty_print else "compact"
+        print(f"--- {label} output ---")
+        for name, rate in results.items():
+            print(f"  {name:<9} {rate:>12,.0f} items/sec")
+        print(f"  speedup   {results['template'] / results['lxml']:>12.1f}x")
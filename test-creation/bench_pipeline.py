@@ -0,0 +1,259 @@
+"""
+Throughput benchmark for the package generation pipeline on synthetic workbooks.
+
+Synthesizes input files with the exact EXPECTED_COLUMNS at one or more scales
+(variable group sizes, optional long stems, unicode text and invalid rows), then
+times each stage on its own:
+
+    read       read_exam_data
+    validate   validate_exam_data + group_validated_items
+    item_xml   building and serializing every item document
+    test_xml   create_qti_test_xml + serialization, per group
+    manifest   create_imsmanifest_xml_for_test_package + serialization, per group
+    archive    write_package_zip, per group
+    end_to_end create_qti_packages_by_assessment_code (console output discarded)
+
+Each stage reports seconds, items/sec and the peak RSS of the process so far.
+Results can be saved as JSON (--output) and compared against an earlier run
+(--compare), so regressions show up across commits.
+
+Usage: python bench_pipeline.py [--items N [N ...]] [--format xlsx|csv] [--output FILE] [--compare FILE]
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import openpyxl
+
+from tao_qti.main import (
+    EXPECTED_COLUMNS, GENERATOR_VERSION, ITEM_SERIALIZERS, create_imsmanifest_xml_for_test_package,
+    create_qti_packages_by_assessment_code, create_qti_test_xml, group_validated_items, read_exam_data,
+    serialize_qti_item, serialize_xml, validate_exam_data, write_package_zip,
+)
+
+STAGES = ['read', 'validate', 'item_xml', 'test_xml', 'manifest', 'archive', 'end_to_end']
+
+WORDS = ['the', 'value', 'of', 'a', 'function', 'at', 'point', 'which', 'is', 'greater', 'than', 'energy',
+         'cell', 'equation', 'ratio', 'area', 'when', 'and', 'under', 'following']
+UNICODE_WORDS = ['√2', 'π', '≠', 'x²', 'θ', 'Δt', '中文', 'عربى', 'עברית', 'ñandú', '😀', '∑', 'µm', '°C']
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synthetic_rows(item_count, args):
+    """Returns input rows (lists in EXPECTED_COLUMNS order) for item_count items."""
+    rng = random.Random(args.seed)
+
+    def text(word_count):
+        words = UNICODE_WORDS + WORDS if rng.random() < args.unicode_ratio else WORDS
+        return ' '.join(rng.choice(words) for _ in range(word_count))
+
+    rows = []
+    group_number = 0
+    while len(rows) < item_count:
+        group_number += 1
+        assessment_code = f"BENCH_{group_number:06d}"
+        for i in range(min(rng.randint(args.min_group_size, args.max_group_size), item_count - len(rows))):
+            stem_words = args.long_stem_words if rng.random() < args.long_stem_ratio else args.stem_words
+            correct_answer = rng.choice('ABCD')
+            if rng.random() < args.invalid_ratio:
+                correct_answer = rng.choice(['E', '', 'A or B']) # Rejected by validation
+            rows.append([
+                f"{assessment_code}_I{i + 1}", assessment_code, rng.choice(['Easy', 'Medium', 'Hard']), 'Apply', 'Solve',
+                text(rng.randint(0, 30)) or 'N/A', text(stem_words),
+                text(6), text(10), text(6), text(10), text(6), text(10), text(6), text(10),
+                correct_answer,
+            ])
+    if args.shuffle:
+        rng.shuffle(rows)
+    return rows
+
+
+def write_workbook(path, rows):
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPECTED_COLUMNS)
+            writer.writerows(rows)
+        return
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(EXPECTED_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+class StageTimer:
+    """Accumulates wall time per stage; a stage may be entered many times (once per group)."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.peak_rss = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+            self.peak_rss[name] = peak_rss_mb()
+
+
+def run_stages(workbook_path, output_dir, args):
+    """Times every stage over one workbook. Returns (valid item count, group count, StageTimer)."""
+    timer = StageTimer()
+    with timer.stage('read'):
+        df = read_exam_data(workbook_path)
+    with timer.stage('validate'):
+        validation = validate_exam_data(df)
+        groups = list(group_validated_items(validation, df.groupby('Assessment Code')))
+
+    # Stages interleave per group so only one package is held in memory at a time
+    for group in groups:
+        item_entries = []
+        item_references = []
+        with timer.stage('item_xml'):
+            for item in group.items:
+                path = f"items/item_{item.item_identifier}.xml"
+                item_entries.append((path, serialize_qti_item(
+                    item.item_identifier, f"Item: {item.item_code}", item.item_stimulus, item.question_text,
+                    item.options, item.correct_answer_id, item_serializer=args.item_serializer
+                )))
+                item_references.append((item.item_identifier, path))
+        with timer.stage('test_xml'):
+            test_identifier = f"{group.assessment_code}_Test"
+            test_xml_bytes = serialize_xml(create_qti_test_xml(
+                test_identifier, f"Test for Assessment Code: {group.assessment_code}",
+                [(identifier, f"../{path}") for identifier, path in item_references]
+            ))
+        with timer.stage('manifest'):
+            test_path = f"tests/test_{test_identifier}.xml"
+            manifest_xml_bytes = serialize_xml(create_imsmanifest_xml_for_test_package(
+                group.assessment_code, test_identifier, test_path, item_references
+            ))
+        with timer.stage('archive'):
+            write_package_zip(
+                os.path.join(output_dir, f"{group.assessment_code}.zip"),
+                [('items/', None), ('tests/', None), ('imsmanifest.xml', manifest_xml_bytes),
+                 (test_path, test_xml_bytes)] + item_entries
+            )
+
+    with timer.stage('end_to_end'), open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        create_qti_packages_by_assessment_code(
+            read_exam_data(workbook_path), output_base_dir=os.path.join(output_dir, 'end_to_end'),
+            workers=args.workers, item_serializer=args.item_serializer
+        )
+
+    valid_items = sum(len(group.items) for group in groups)
+    return valid_items, len(groups), timer
+
+
+def print_run(run, baseline=None):
+    print(f"\n--- {run['items']:,} items in {run['groups']:,} groups ({run['valid_items']:,} valid) ---")
+    print(f"  {'stage':<11} {'seconds':>9} {'items/sec':>12} {'peak RSS MB':>12}" + ("  vs baseline" if baseline else ""))
+    for name in STAGES:
+        stage = run['stages'][name]
+        line = f"  {name:<11} {stage['seconds']:>9.3f} {stage['items_per_sec']:>12,.0f} {stage['peak_rss_mb']:>12.1f}"
+        if baseline and name in baseline['stages'] and baseline['stages'][name]['items_per_sec']:
+            line += f"  {stage['items_per_sec'] / baseline['stages'][name]['items_per_sec']:>10.2f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs='+', default=[1000, 10000], help="Item counts to benchmark (default 1000 10000)")
+    parser.add_argument("--format", choices=['xlsx', 'csv'], default='xlsx', help="Synthetic input file format")
+    parser.add_argument("--min-group-size", type=int, default=10, help="Smallest assessment group (default 10)")
+    parser.add_argument("--max-group-size", type=int, default=60, help="Largest assessment group (default 60)")
+    parser.add_argument("--stem-words", type=int, default=40, help="Words in a normal item stem (default 40)")
+    parser.add_argument("--long-stem-words", type=int, default=800, help="Words in a long item stem (default 800)")
+    parser.add_argument("--long-stem-ratio", type=float, default=0.05, help="Share of items with a long stem")
+    parser.add_argument("--unicode-ratio", type=float, default=0.3, help="Share of text fields mixing in non-ASCII words")
+    parser.add_argument("--invalid-ratio", type=float, default=0.01, help="Share of rows with a bad Correct Answer")
+    parser.add_argument("--shuffle", action="store_true", help="Interleave the rows of different assessments")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic data")
+    parser.add_argument("--item-serializer", choices=ITEM_SERIALIZERS, default='lxml', help="Item serializer to time")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for the end_to_end stage")
+    parser.add_argument("--workbook-dir", help="Keep the synthetic workbooks here and reuse them on later runs")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare items/sec against")
+    args = parser.parse_args()
+    if not 1 <= args.min_group_size <= args.max_group_size:
+        parser.error("--min-group-size must be between 1 and --max-group-size")
+
+    baseline_runs = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline_runs = {run['items']: run for run in json.load(f)['runs']}
+
+    params = {key: value for key, value in vars(args).items() if key not in ('workbook_dir', 'output', 'compare')}
+    results = {
+        "benchmark": "pipeline",
+        "generator_version": GENERATOR_VERSION,
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "params": params,
+        "runs": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as temp_dir:
+        workbook_dir = args.workbook_dir or temp_dir
+        os.makedirs(workbook_dir, exist_ok=True)
+        for item_count in args.items:
+            # The name covers every parameter that changes the data, so reuse is safe
+            data_key = (f"{item_count}_{args.min_group_size}-{args.max_group_size}_{args.stem_words}-{args.long_stem_words}"
+                        f"_{args.long_stem_ratio}_{args.unicode_ratio}_{args.invalid_ratio}_{int(args.shuffle)}_{args.seed}")
+            workbook_path = os.path.join(workbook_dir, f"bench_{data_key}.{args.format}")
+            if not os.path.exists(workbook_path):
+                print(f"Synthesizing {item_count:,} items into {workbook_path}...")
+                start = time.perf_counter()
+                write_workbook(workbook_path, synthetic_rows(item_count, args))
+                print(f"  done in {time.perf_counter() - start:.1f}s")
+
+            output_dir = tempfile.mkdtemp(prefix="packages_", dir=temp_dir)
+            valid_items, group_count, timer = run_stages(workbook_path, output_dir, args)
+            run = {"items": item_count, "valid_items": valid_items, "groups": group_count, "stages": {}}
+            for name in STAGES:
+                seconds = timer.seconds.get(name, 0.0)
+                # Read and validate see every row; the other stages only the valid items
+                stage_items = item_count if name in ('read', 'validate') else valid_items
+                run["stages"][name] = {
+                    "seconds": round(seconds, 6),
+                    "items_per_sec": round(stage_items / seconds, 1) if seconds else 0.0,
+                    "peak_rss_mb": round(timer.peak_rss.get(name, 0.0), 1),
+                }
+            results["runs"].append(run)
+            print_run(run, baseline_runs.get(item_count))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to: '{os.path.abspath(args.output)}'")
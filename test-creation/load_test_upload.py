@@ -0,0 +1,177 @@
+"""
+Upload load test: drives taoApiUtil against the local mock TAO server.
+
+Builds synthetic QTI packages in memory with main.py (or uses the zips of
+--packages-dir), starts mock_tao_server.py on a free port with the requested
+faults (or targets --url), and imports every package through
+taoApiUtil.import_package with up to --workers concurrent uploads over one pooled
+session and one taoApiUtil.UploadController, as taoApiUtil.py does. Reports
+throughput, p50/p99 latency per HTTP request, failures, the number of retried
+requests and the concurrency the uploads settled at, optionally as JSON (--output).
+
+Usage: python load_test_upload.py [--packages N] [--items-per-package N] [--workers N]
+                                  [--latency-ms MS] [--error-rate R] [--drop-rate R] ...
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tao_qti import taoApiUtil
+from tao_qti.main import InMemoryPackage, ValidatedItem, create_qti_package_for_assessment
+from mock_tao_server import add_fault_arguments, config_from_arguments, start_mock_server
+
+LOAD_TEST_USERNAME = "loadtest"
+LOAD_TEST_PASSWORD = "loadtest"
+
+
+def synthetic_packages(package_count, items_per_package, stem_words):
+    """Builds package_count InMemoryPackages of items_per_package items each."""
+    stem = ' '.join(['lorem'] * stem_words)
+    packages = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for p in range(package_count):
+            items = [
+                ValidatedItem(
+                    i + 2, f"LT{p}_I{i}", f"LT{p}_I{i}", 'N/A', f"{stem} {p}.{i}?",
+                    [(f"option_{letter}", f"Answer {letter} {i}") for letter in 'ABCD'], 'option_A'
+                )
+                for i in range(items_per_package)
+            ]
+            packages.append(create_qti_package_for_assessment(f"LOADTEST_{p:05d}", items, None, in_memory=True))
+    return packages
+
+
+def packages_from_dir(packages_dir):
+    packages = []
+    for filename in sorted(f for f in os.listdir(packages_dir) if f.endswith(".zip")):
+        with open(os.path.join(packages_dir, filename), "rb") as f:
+            packages.append(InMemoryPackage(filename, f.read()))
+    return packages
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class RequestRecorder:
+    """Response hook for the upload session recording the latency and status of every HTTP request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.statuses = {}
+
+    def __call__(self, response, *args, **kwargs):
+        with self._lock:
+            self.latencies.append(response.elapsed.total_seconds())
+            self.statuses[str(response.status_code)] = self.statuses.get(str(response.status_code), 0) + 1
+
+
+def run_load_test(packages, workers, mode, adaptive=True):
+    """Imports every package; returns (results, seconds, RequestRecorder, UploadController)."""
+    recorder = RequestRecorder()
+    results = {}
+    session = taoApiUtil.create_tao_session(pool_size=workers)
+    session.hooks["response"].append(recorder)
+    controller = taoApiUtil.UploadController(workers, adaptive=adaptive)
+
+    def upload(package):
+        endpoints = taoApiUtil.plan_imports(package.filename, mode, zip_data=package.data)
+        results[package.filename] = taoApiUtil.import_package(
+            package.filename, session=session, endpoints=endpoints, zip_data=package.data, controller=controller
+        )
+
+    start = time.perf_counter()
+    with session, open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(upload, packages))
+    return results, time.perf_counter() - start, recorder, controller
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packages", type=int, default=50, help="Synthetic packages to upload (default 50)")
+    parser.add_argument("--items-per-package", type=int, default=30, help="Items per synthetic package (default 30)")
+    parser.add_argument("--stem-words", type=int, default=50, help="Words per synthetic item stem (default 50)")
+    parser.add_argument("--packages-dir", help="Upload the zips in this directory instead of synthetic packages")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent uploads at most (default 4)")
+    parser.add_argument("--fixed-concurrency", action="store_true", help="Keep --workers uploads in flight instead of adapting")
+    parser.add_argument("--mode", choices=list(taoApiUtil.IMPORT_MODES), default="auto", help="Import endpoints, as in taoApiUtil.py")
+    parser.add_argument("--url", help="Target an already running server instead of starting the mock")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    if args.packages_dir:
+        packages = packages_from_dir(args.packages_dir)
+    else:
+        print(f"Building {args.packages} synthetic packages of {args.items_per_package} items...")
+        packages = synthetic_packages(args.packages, args.items_per_package, args.stem_words)
+    total_bytes = sum(len(package.data) for package in packages)
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        server, base_url = start_mock_server(config_from_arguments(args, LOAD_TEST_USERNAME, LOAD_TEST_PASSWORD))
+        taoApiUtil.auth_header = server.config.auth_header
+    taoApiUtil.base_url = base_url
+
+    print(f"Uploading {len(packages)} packages ({total_bytes / 1024 / 1024:.1f} MiB) to {base_url} with {args.workers} workers...")
+    results, seconds, recorder, controller = run_load_test(packages, args.workers, args.mode, not args.fixed_concurrency)
+    server_stats = server.stats.snapshot() if server else None
+    if server:
+        server.shutdown()
+
+    planned = sum(len(result) for result in results.values())
+    succeeded = sum(ok is True for result in results.values() for ok in result.values())
+    unverified = sum(ok is None for result in results.values() for ok in result.values())
+    client_requests = len(recorder.latencies)
+    summary = {
+        "packages": len(packages),
+        "bytes": total_bytes,
+        "workers": args.workers,
+        "concurrency_limit": controller.limit.limit,
+        "seconds": round(seconds, 3),
+        "packages_per_sec": round(len(packages) / seconds, 2),
+        "mib_per_sec": round(total_bytes / 1024 / 1024 / seconds, 2),
+        "imports_planned": planned,
+        "imports_succeeded": succeeded,
+        "imports_failed": planned - succeeded - unverified,
+        "imports_unverified": unverified,
+        "http_requests": client_requests,
+        "http_statuses": recorder.statuses,
+        "latency_p50_ms": round(percentile(recorder.latencies, 0.50) * 1000, 1) if recorder.latencies else None,
+        "latency_p99_ms": round(percentile(recorder.latencies, 0.99) * 1000, 1) if recorder.latencies else None,
+        "latency_mean_ms": round(statistics.fmean(recorder.latencies) * 1000, 1) if recorder.latencies else None,
+        "server": server_stats,
+    }
+    # Every request the server saw beyond one per planned import was a retry
+    # (dropped connections never produce a response, so they only show up server side)
+    attempts = server_stats["requests"] if server_stats else client_requests
+    summary["retries"] = max(0, attempts - planned)
+    fault_keys = ("latency_ms", "jitter_ms", "bandwidth_kbps", "error_rate", "throttle_rate", "drop_rate", "max_concurrent")
+    if any(getattr(args, key) for key in fault_keys):
+        summary["faults"] = {key: getattr(args, key) for key in fault_keys}
+
+    print("\n--- 📈 Upload Load Test ---")
+    print(f"  Throughput:   {summary['packages_per_sec']} packages/s, {summary['mib_per_sec']} MiB/s ({summary['seconds']}s)")
+    print(f"  Imports:      {succeeded}/{planned} succeeded, {unverified} with an unknown outcome")
+    print(f"  HTTP:         {client_requests} responses {recorder.statuses}, {summary['retries']} retries")
+    if server_stats:
+        print(f"  Dropped:      {server_stats['dropped']} connections")
+    print(f"  Latency:      p50 {summary['latency_p50_ms']} ms, p99 {summary['latency_p99_ms']} ms")
+    print(f"  Concurrency:  settled at {summary['concurrency_limit']} of {args.workers}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nResults written to: '{os.path.abspath(args.output)}'")
@@ -0,0 +1,273 @@
+"""
+Local stand-in for the TAO REST import endpoints, for offline upload testing.
+
+Implements the two endpoints taoApiUtil.py talks to:
+
+    POST /taoQtiItem/RestQtiItem/import/   (multipart field "content")
+    POST /taoQtiTest/RestQtiTests/import/  (multipart field "qtiPackage")
+
+Requests must carry the configured Basic credentials. The uploaded file must be a
+zip with an imsmanifest.xml, and a valid upload is answered with
+{"success": true, ...} like TAO does. Faults can be injected: latency (with
+jitter), a per-connection bandwidth limit on the request body, random 5xx and 429
+responses, connections dropped mid-upload, and a limited number of imports
+processed at once (--max-concurrent), like a pool of PHP workers: further imports
+queue, and get a 503 after waiting BUSY_QUEUE_SECONDS. GET /_stats returns request counters
+as JSON.
+
+Usage: python mock_tao_server.py [--port 8080] [--latency-ms 200] [--error-rate 0.05] ...
+       then set TAO_BASE_URL=http://127.0.0.1:8080 for taoApiUtil.py
+"""
+import argparse
+import base64
+import email.parser
+import email.policy
+import io
+import json
+import os
+import random
+import socket
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Import path -> multipart field the package must be sent in
+IMPORT_FIELDS = {
+    "/taoQtiItem/RestQtiItem/import/": "content",
+    "/taoQtiTest/RestQtiTests/import/": "qtiPackage",
+}
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# How long an import waits for a free worker with --max-concurrent before a 503
+BUSY_QUEUE_SECONDS = 1.0
+
+
+class MockTaoConfig:
+    """Credentials and fault injection settings of a mock server."""
+
+    def __init__(self, username="admin", password="admin", latency_ms=0.0, jitter_ms=0.0, bandwidth_kbps=None,
+                 error_rate=0.0, throttle_rate=0.0, drop_rate=0.0, retry_after=1, max_concurrent=None, seed=None):
+        self.auth_header = f"Basic {base64.b64encode(f'{username}:{password}'.encode()).decode()}"
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.bandwidth_kbps = bandwidth_kbps # Per connection, applied while reading the request body
+        self.error_rate = error_rate # Share of requests answered with a random 5xx
+        self.throttle_rate = throttle_rate # Share of requests answered with 429 Too Many Requests
+        self.drop_rate = drop_rate # Share of connections closed halfway through the upload
+        self.retry_after = retry_after
+        # Imports processed at once; None for no limit
+        self.workers = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+
+    def roll(self):
+        with self.random_lock:
+            return self.random.random()
+
+    def latency_seconds(self):
+        with self.random_lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+
+class MockTaoStats:
+    """Thread-safe request counters, served at GET /_stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {"requests": 0, "bytes_received": 0, "dropped": 0, "by_status": {}, "by_path": {}}
+
+    def add(self, path, status=None, body_size=0):
+        with self._lock:
+            self.counts["requests"] += 1
+            self.counts["bytes_received"] += body_size
+            self.counts["by_path"][path] = self.counts["by_path"].get(path, 0) + 1
+            if status is None:
+                self.counts["dropped"] += 1
+            else:
+                self.counts["by_status"][str(status)] = self.counts["by_status"].get(str(status), 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.counts))
+
+
+class MockTaoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, like a real web server in front of TAO
+    server_version = "MockTAO/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self, length, limit=None):
+        """Reads the request body, throttled to the configured bandwidth. Stops after limit bytes."""
+        bandwidth = self.server.config.bandwidth_kbps
+        to_read = length if limit is None else min(length, limit)
+        chunks = []
+        start = time.perf_counter()
+        received = 0
+        while received < to_read:
+            chunk = self.rfile.read(min(READ_CHUNK_SIZE, to_read - received))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+            if bandwidth:
+                ahead = received / (bandwidth * 1024) - (time.perf_counter() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+        return b"".join(chunks)
+
+    def drop_connection(self):
+        self.close_connection = True
+        try:
+            # RST instead of FIN, so the client sees a reset like a dying proxy would send
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, b"\x01\x00\x00\x00\x00\x00\x00\x00")
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def do_GET(self):
+        if urlsplit(self.path).path == "/_stats":
+            self.send_json(200, self.server.stats.snapshot())
+        else:
+            self.send_json(404, {"success": False, "errorMsg": "Not found"})
+
+    def do_POST(self):
+        config = self.server.config
+        stats = self.server.stats
+        path = urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+
+        if config.drop_rate and config.roll() < config.drop_rate:
+            self.read_body(length, limit=length // 2)
+            stats.add(path, None, length // 2)
+            self.drop_connection()
+            return
+
+        body = self.read_body(length)
+        if config.workers is not None and not config.workers.acquire(timeout=BUSY_QUEUE_SECONDS):
+            status, payload, headers = 503, {"success": False, "errorMsg": "No free worker"}, None
+        else:
+            try:
+                if config.latency_ms or config.jitter_ms:
+                    time.sleep(config.latency_seconds())
+                status, payload, headers = self.handle_import(path, body)
+            finally:
+                if config.workers is not None:
+                    config.workers.release()
+        stats.add(path, status, len(body))
+        self.send_json(status, payload, headers)
+
+    def handle_import(self, path, body):
+        """Returns (status, JSON payload, extra headers) for an import request."""
+        config = self.server.config
+        field = IMPORT_FIELDS.get(path)
+        if field is None:
+            return 404, {"success": False, "errorMsg": f"No import endpoint at {path}"}, None
+        if self.headers.get("Authorization") != config.auth_header:
+            return 401, {"success": False, "errorMsg": "Authentication failed"}, {"WWW-Authenticate": 'Basic realm="TAO"'}
+        if config.throttle_rate and config.roll() < config.throttle_rate:
+            return 429, {"success": False, "errorMsg": "Too many requests"}, {"Retry-After": str(config.retry_after)}
+        if config.error_rate and config.roll() < config.error_rate:
+            with config.random_lock:
+                status = config.random.choice([500, 502, 503, 504])
+            return status, {"success": False, "errorMsg": "Injected server error"}, None
+
+        content_type = self.headers.get("Content-Type", "")
+        if not content_type.startswith("multipart/form-data"):
+            return 400, {"success": False, "errorMsg": "Expected multipart/form-data"}, None
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+        )
+        parts = {
+            part.get_param("name", header="content-disposition"): part
+            for part in message.iter_parts() if part.get_content_disposition() == "form-data"
+        }
+        if field not in parts:
+            return 400, {"success": False, "errorMsg": f"Missing file field '{field}'"}, None
+        filename = parts[field].get_filename()
+        data = parts[field].get_payload(decode=True) or b""
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                zf.getinfo("imsmanifest.xml")
+        except (zipfile.BadZipFile, KeyError):
+            return 200, {"success": False, "errorMsg": f"'{filename}' is not a QTI package with an imsmanifest.xml"}, None
+        return 200, {"success": True, "data": {"filename": filename, "size": len(data)}}, None
+
+
+def create_mock_server(config, host="127.0.0.1", port=0, verbose=False):
+    """Creates (but doesn't start) a mock server; port 0 picks a free port (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), MockTaoHandler)
+    server.daemon_threads = True
+    server.config = config
+    server.stats = MockTaoStats()
+    server.verbose = verbose
+    return server
+
+
+def start_mock_server(config, host="127.0.0.1", port=0, verbose=False):
+    """Starts a mock server on a background thread. Returns (server, base_url); stop with server.shutdown()."""
+    server = create_mock_server(config, host, port, verbose)
+    threading.Thread(target=server.serve_forever, name="mock-tao-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def add_fault_arguments(parser):
+    """Adds the fault injection options shared with load_test_upload.py."""
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Processing delay per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- variation of the delay")
+    parser.add_argument("--bandwidth-kbps", type=float, help="Upload bandwidth per connection in KiB/s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 5xx")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Share of connections dropped mid-upload")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429 (default 1)")
+    parser.add_argument("--max-concurrent", type=int, help="Imports processed at once; the rest queue, then get a 503")
+    parser.add_argument("--seed", type=int, help="Seed for the fault injection")
+
+
+def config_from_arguments(args, username, password):
+    return MockTaoConfig(
+        username=username, password=password, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        bandwidth_kbps=args.bandwidth_kbps, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        drop_rate=args.drop_rate, retry_after=args.retry_after, max_concurrent=args.max_concurrent, seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on (default 8080)")
+    parser.add_argument("--username", default=os.getenv("TAO_USERNAME", "admin"), help="Accepted user (default $TAO_USERNAME or admin)")
+    parser.add_argument("--password", default=os.getenv("TAO_PASSWORD", "admin"), help="Accepted password (default $TAO_PASSWORD or admin)")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    server = create_mock_server(config_from_arguments(args, args.username, args.password), args.host, args.port, args.verbose)
+    print(f"🧪 Mock TAO server listening on http://{args.host}:{server.server_port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\nRequest counters: {json.dumps(server.stats.snapshot())}")
@@ -0,0 +1,6 @@
+"""
+tao-qti: QTI 2.1 package generation from Excel/CSV exam data, and import into TAO.
+
+The modules are imported on demand (see cli.py), so importing the package itself
+loads nothing else.
+"""
@@ -0,0 +1,318 @@
+"""
+Batch generation: builds the QTI packages of many workbooks in one run.
+
+Takes a directory (every .xlsx and .csv file in it) or a glob pattern, and reads
+every sheet of every workbook. All assessments are built by one worker pool
+(--workers), so the imports and the pool are paid for once instead of once per file.
+Before anything is built the inputs are checked against each other:
+
+  * An Assessment Code found in more than one input (file or sheet) is built from
+    the first input only, in sorted path and sheet order; the others are skipped.
+  * An Item code found in more than one input is reported, since TAO would get two
+    items with the same identifier.
+
+The run ends with one consolidated JSON report (default:
+<output_folder_for_packages>/batch_report.json) with, per input sheet, its rows,
+rejected rows, assessments and packages, plus the collisions and totals.
+
+Usage: python -m tao_qti.batch <input_dir_or_glob> <output_folder_for_packages> [options]
+"""
+import glob
+import json
+import os
+import sys
+import time
+from typing import NamedTuple
+
+from . import main
+from .metrics import METRICS, write_run_report
+
+INPUT_EXTENSIONS = ('.xlsx', '.csv')
+
+BATCH_REPORT_FILENAME = "batch_report.json"
+
+
+class InputSheet(NamedTuple):
+    """One input of a batch: a CSV file, or one sheet of a workbook."""
+    file_path: str
+    sheet: str # None for CSV files
+
+    @property
+    def label(self):
+        return self.file_path if self.sheet is None else f"{self.file_path} [{self.sheet}]"
+
+
+def find_input_files(pattern):
+    """The .xlsx/.csv files of a directory or glob pattern, sorted; Excel lock files (~$...) are left out."""
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(
+        path for path in paths
+        if os.path.isfile(path) and path.lower().endswith(INPUT_EXTENSIONS)
+        and not os.path.basename(path).startswith('~$')
+    )
+
+
+def read_input_sheets(file_path, read_cache_dir=None):
+    """
+    Reads every sheet of a workbook (or the CSV file) in one pass.
+
+    With read_cache_dir, the sheets of an unchanged workbook come from the read cache
+    (see main.ReadCache) instead of being parsed again.
+
+    Returns:
+        list of tuple: (InputSheet, DataFrame or None, error message or None) per sheet.
+        Sheets without the expected columns (e.g. instructions) come back with an error.
+    """
+    import pandas as pd
+
+    if file_path.lower().endswith('.csv'):
+        try:
+            return [(InputSheet(file_path, None), main.read_exam_data(file_path, read_cache_dir=read_cache_dir), None)]
+        except (ValueError, FileNotFoundError) as e:
+            return [(InputSheet(file_path, None), None, str(e))]
+
+    read_cache = main.ReadCache(read_cache_dir) if read_cache_dir else None
+    with METRICS.time("read"):
+        if read_cache is not None:
+            cached = read_cache.load(file_path, variant="sheets")
+            if cached is not None:
+                frames, sheet_entries = cached
+                METRICS.incr("read_cache_hits")
+                frames, sheets = iter(frames), []
+                for sheet_name, error, filtered in sheet_entries:
+                    df = None if error else next(frames)
+                    if df is not None:
+                        main.warn_about_filtered_rows(df, filtered)
+                    sheets.append((InputSheet(file_path, sheet_name), df, error))
+                return sheets
+            METRICS.incr("read_cache_misses")
+            fingerprint = read_cache.fingerprint(file_path)
+        try:
+            frames = pd.read_excel(file_path, sheet_name=None)
+        except Exception as e:
+            return [(InputSheet(file_path, None), None, f"Error reading file '{file_path}': {e}")]
+    sheets = []
+    filtered_rows = []
+    for sheet_name, df in frames.items():
+        source = InputSheet(file_path, str(sheet_name))
+        try:
+            df, filtered = main.prepare_exam_frame(df, source.label)
+        except ValueError as e:
+            sheets.append((source, None, str(e)))
+            filtered_rows.append(0)
+            continue
+        main.warn_about_filtered_rows(df, filtered)
+        sheets.append((source, df, None))
+        filtered_rows.append(filtered)
+    if read_cache is not None:
+        read_cache.save(
+            file_path, fingerprint, [df for _, df, error in sheets if not error], variant="sheets",
+            extra=[[source.sheet, error, filtered] for (source, _, error), filtered in zip(sheets, filtered_rows)]
+        )
+    return sheets
+
+
+class BatchReport:
+    """Per-input statistics and cross-input collisions, written as the consolidated JSON report."""
+
+    def __init__(self):
+        self.inputs = {} # label -> stats
+        self.code_sources = {} # Assessment Code -> label of the input it is built from
+        self.item_sources = {} # item identifier -> (label, Item code) of its first input
+        self.assessment_code_collisions = []
+        self.item_code_collisions = []
+        self.part_sources = {} # Assessment Code of each (possibly sharded) group -> label
+        self.rejected_rows = []
+
+    def add_input(self, source, error=None):
+        self.inputs[source.label] = {
+            "file": source.file_path, "sheet": source.sheet, "error": error, "rows": 0, "rows_rejected": 0,
+            "assessments": 0, "assessments_skipped": 0, "packages": [], "packages_failed": [], "packages_unchanged": 0,
+        }
+
+    def add_groups(self, source, df):
+        """Validates an input and yields its groups, minus the Assessment Codes of earlier inputs."""
+        stats = self.inputs[source.label]
+        validation = main.validate_exam_data(df)
+        stats["rows"] = len(df)
+        stats["rows_rejected"] = len(validation.rejected_rows)
+        if len(validation.rejected_rows):
+            self.rejected_rows.append(validation.rejected_rows.assign(File=source.file_path, Sheet=source.sheet))
+
+        for group in main.group_validated_items(validation, df.groupby('Assessment Code')):
+            first_source = self.code_sources.get(group.assessment_code)
+            if first_source is not None:
+                stats["assessments_skipped"] += 1
+                self.assessment_code_collisions.append({
+                    "assessment_code": group.assessment_code, "built_from": first_source, "skipped_in": source.label,
+                })
+                print(f"⚠️  Assessment Code '{group.assessment_code}' in {source.label} is already in {first_source}; skipping it here.")
+                continue
+            self.code_sources[group.assessment_code] = source.label
+            stats["assessments"] += 1
+            for item in group.items:
+                first = self.item_sources.setdefault(item.item_identifier, (source.label, item.item_code))
+                if first[0] != source.label:
+                    self.item_code_collisions.append({
+                        "item_identifier": item.item_identifier, "item_code": item.item_code,
+                        "first_in": first[0], "also_in": source.label, "assessment_code": group.assessment_code,
+                    })
+                    print(f"⚠️  Item code '{item.item_code}' in {source.label} is also used in {first[0]}.")
+            yield group
+
+    def record_package(self, group, result):
+        stats = self.inputs[self.part_sources[group.assessment_code]]
+        if result is None:
+            stats["packages_failed"].append(group.assessment_code)
+        else:
+            stats["packages"].append(os.path.basename(result))
+
+    def summary(self, output_dir, seconds):
+        inputs = list(self.inputs.values())
+        built = sum(len(stats["packages"]) for stats in inputs)
+        totals = {
+            "files": len({stats["file"] for stats in inputs}),
+            "inputs": len(inputs),
+            "inputs_skipped": sum(1 for stats in inputs if stats["error"]),
+            "rows": sum(stats["rows"] for stats in inputs),
+            "rows_rejected": sum(stats["rows_rejected"] for stats in inputs),
+            "assessments": sum(stats["assessments"] for stats in inputs),
+            "packages_built": built,
+            "packages_failed": sum(len(stats["packages_failed"]) for stats in inputs),
+            "packages_unchanged": sum(stats["packages_unchanged"] for stats in inputs),
+            "assessment_code_collisions": len(self.assessment_code_collisions),
+            "item_code_collisions": len(self.item_code_collisions),
+        }
+        return {
+            "output_dir": os.path.abspath(output_dir),
+            "seconds": round(seconds, 3),
+            "totals": totals,
+            "inputs": inputs,
+            "collisions": {
+                "assessment_codes": self.assessment_code_collisions,
+                "item_codes": self.item_code_collisions,
+            },
+        }
+
+
+def print_usage():
+    print("Usage: python -m tao_qti.batch <input_dir_or_glob> <output_folder_for_packages> [options]")
+    print("Options (plus every generation option of main.py except --stream):")
+    print(f"  --report FILE  Consolidated JSON report (default: <output_folder_for_packages>/{BATCH_REPORT_FILENAME})")
+    print("  --rejected-report FILE is written for all inputs together, with File and Sheet columns")
+    print("Example: python -m tao_qti.batch 'data/**/*.xlsx' qti_output --workers 8")
+
+
+def parse_args(argv):
+    """Parses command line arguments into (input_pattern, output_dir, options)."""
+    options = {"report": None}
+    generation_args = []
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg == "--report":
+            if not args:
+                raise ValueError("--report requires a value.")
+            options["report"] = args.pop(0)
+        else:
+            generation_args.append(arg)
+    input_pattern, output_dir, generation_options = main.parse_args(generation_args)
+    if generation_options["stream"]:
+        raise ValueError("--stream is not supported in batch mode; every sheet is read whole.")
+    options.update(generation_options)
+    return input_pattern, output_dir, options
+
+
+def cli_main(argv):
+    """Runs the command line (python -m tao_qti.batch ... or tao-qti batch ...) with the arguments in argv."""
+    import pandas as pd
+
+    try:
+        input_pattern, output_dir, options = parse_args(argv)
+    except ValueError as ve:
+        print(f"❌ Error: {ve}")
+        print_usage()
+        sys.exit(1)
+
+    input_files = find_input_files(input_pattern)
+    if not input_files:
+        print(f"❌ Error: No .xlsx or .csv files found for '{input_pattern}'.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    report = BatchReport()
+    try:
+        print(f"Reading {len(input_files)} input files...")
+        groups = []
+        part_code_check = main.PartCodeCheck()
+        for file_path in input_files:
+            for source, df, error in read_input_sheets(file_path, options["read_cache_dir"]):
+                report.add_input(source, error)
+                if error:
+                    print(f"⚠️  Skipping {source.label}: {error}")
+                    continue
+                for group in report.add_groups(source, df):
+                    # Sharded here rather than by the builder, so every part is traced back to its input
+                    parts = main.shard_assessment_group(
+                        group, options["max_items_per_package"], options["max_package_bytes"],
+                        options["media_source_dir"], options["quiet"]
+                    )
+                    part_code_check.add(group, parts)
+                    for part in parts:
+                        report.part_sources[part.assessment_code] = source.label
+                        groups.append(part)
+
+        if options["rejected_report_path"]:
+            rejected_rows = (pd.concat(report.rejected_rows) if report.rejected_rows
+                             else main._empty_rejected_rows().assign(File=[], Sheet=[]))
+            main.write_rejected_rows_report(rejected_rows, options["rejected_report_path"])
+
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"Generating {len(groups)} QTI packages from {len(report.inputs)} inputs in: '{os.path.abspath(output_dir)}'")
+        built_codes = set()
+
+        def record_package(group, result):
+            built_codes.add(group.assessment_code)
+            report.record_package(group, result)
+
+        main.create_qti_packages_from_groups(
+            groups, output_dir, options["workers"], compression=options["compression"],
+            compresslevel=options["compresslevel"], item_serializer=options["item_serializer"],
+            pretty_print=options["pretty_print"], incremental=options["incremental"], on_package=record_package,
+            quiet=options["quiet"], stream_xml=options["stream_xml"], media_source_dir=options["media_source_dir"],
+            max_image_size=options["max_image_size"], validate_schema=options["validate_schema"],
+            schema_dir=options["schema_dir"], max_items_per_section=options["max_items_per_section"],
+            item_cache_bytes=options["item_cache_bytes"], item_cache_dir=options["item_cache_dir"],
+        )
+        # on_package isn't called for assessments skipped by --incremental
+        for group in groups:
+            if group.assessment_code not in built_codes:
+                report.inputs[report.part_sources[group.assessment_code]]["packages_unchanged"] += 1
+    except ValueError as ve:
+        print(f"❌ ValueError: {ve}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ An unexpected error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        write_run_report("batch", options["metrics_json"], options["prometheus_textfile"])
+
+    summary = report.summary(output_dir, time.perf_counter() - start)
+    report_path = options["report"] or os.path.join(output_dir, BATCH_REPORT_FILENAME)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    totals = summary["totals"]
+    print("\n--- 📦 Batch Summary ---")
+    print(f"  Inputs:      {totals['inputs']} sheets in {totals['files']} files ({totals['inputs_skipped']} skipped)")
+    print(f"  Rows:        {totals['rows']} ({totals['rows_rejected']} rejected)")
+    print(f"  Packages:    {totals['packages_built']} built, {totals['packages_failed']} failed, {totals['packages_unchanged']} unchanged")
+    print(f"  Collisions:  {totals['assessment_code_collisions']} Assessment Codes, {totals['item_code_collisions']} Item codes")
+    print(f"\n✅ Batch report written to: '{os.path.abspath(report_path)}'")
+
+
+if __name__ == "__main__":
+    cli_main(sys.argv[1:])
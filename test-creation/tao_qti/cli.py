@@ -0,0 +1,179 @@
+"""
+tao-qti: one command for generating, uploading and validating QTI packages.
+
+    tao-qti generate <path_to_excel_file> <output_folder> [options]   main.py
+    tao-qti batch <input_dir_or_glob> <output_folder> [options]       batch.py
+    tao-qti forms <path_to_excel_file> <output_folder> --forms N      forms.py
+    tao-qti upload <qti_packages_dir> [options]                       taoApiUtil.py
+    tao-qti run <path_to_excel_file> <output_folder> [options]        pipeline.py
+    tao-qti validate <file_or_dir>... [options]                       rows and package XML, nothing built
+    tao-qti serve [options]                                           service.py
+
+Every subcommand takes the options of its script; `tao-qti <command> --help` lists
+them. A subcommand's module is imported only when it runs, and the modules import
+their heavy dependencies only where they are used, so `tao-qti --help`, the
+--help of every subcommand and `tao-qti upload` never load pandas, numpy or lxml.
+tests/test_startup.py keeps this in check.
+
+Install with `pip install .` in this folder, or run it as `python -m tao_qti.cli`.
+"""
+import importlib
+import os
+import sys
+
+# Subcommand -> (module with cli_main and print_usage, summary); validate lives here
+COMMANDS = {
+    "generate": ("main", "Build QTI packages from an Excel/CSV file"),
+    "batch": ("batch", "Build the packages of every workbook in a folder or glob pattern"),
+    "forms": ("forms", "Build N randomized forms of every assessment"),
+    "upload": ("taoApiUtil", "Import a folder of packages into TAO"),
+    "run": ("pipeline", "Generate and upload in one pipelined pass"),
+    "validate": (None, "Check workbook rows and package XML without building or uploading"),
+    "serve": ("service", "Run the HTTP generation service with warm workers"),
+}
+
+VALIDATE_EXTENSIONS = ('.xlsx', '.csv', '.zip')
+
+
+def print_usage():
+    print("Usage: tao-qti <command> [arguments] [options]")
+    print("Commands:")
+    for command, (_, summary) in COMMANDS.items():
+        print(f"  {command:<10} {summary}")
+    print("Run 'tao-qti <command> --help' for the arguments and options of a command.")
+
+
+def print_validate_usage():
+    print("Usage: tao-qti validate <file_or_dir>... [options]")
+    print("Checks .xlsx/.csv workbooks row by row, as generate would, and .zip packages against the local XSDs.")
+    print("Directories are expanded to the workbooks and packages in them.")
+    print("Options:")
+    print("  --rejected-report FILE  Write the rejected rows of all workbooks to a CSV, with a File column")
+    print("  --schema-dir DIR        Local XSD mirror for packages (default: schemas next to main.py)")
+    print("Exits with status 1 if any row was rejected or any package is invalid.")
+
+
+def parse_validate_args(argv):
+    """Parses validate's arguments into (paths, options)."""
+    options = {"rejected_report_path": None, "schema_dir": None}
+    paths = []
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg in ("--rejected-report", "--schema-dir"):
+            if not args:
+                raise ValueError(f"{arg} requires a value.")
+            options["rejected_report_path" if arg == "--rejected-report" else "schema_dir"] = args.pop(0)
+        elif arg.startswith("--"):
+            raise ValueError(f"Unknown option '{arg}'.")
+        elif os.path.isdir(arg):
+            paths += sorted(
+                os.path.join(arg, name) for name in os.listdir(arg)
+                if name.lower().endswith(VALIDATE_EXTENSIONS) and not name.startswith('~$')
+            )
+        else:
+            paths.append(arg)
+    if not paths:
+        raise ValueError("Nothing to validate.")
+    return paths, options
+
+
+def validate_workbooks(paths, rejected_report_path=None):
+    """Reads and validates each workbook like generate does. Returns the number of workbooks with problems."""
+    import pandas as pd
+    from . import main
+
+    failures = 0
+    rejected_reports = []
+    for path in paths:
+        try:
+            df = main.read_exam_data(path)
+        except (ValueError, FileNotFoundError) as e:
+            print(f"❌ {path}: {e}")
+            failures += 1
+            continue
+        rejected_rows = main.validate_exam_data(df).rejected_rows
+        for message in rejected_rows['Message']:
+            print(f"  ⚠️ {message}")
+        print(f"{'❌' if len(rejected_rows) else '✅'} {path}: {len(df)} rows in {df['Assessment Code'].nunique()} "
+              f"assessments, {len(rejected_rows)} rejected")
+        failures += bool(len(rejected_rows))
+        rejected_reports.append(rejected_rows.assign(File=path))
+    if rejected_report_path:
+        rejected_rows = (pd.concat(rejected_reports) if rejected_reports
+                         else main._empty_rejected_rows().assign(File=[]))
+        main.write_rejected_rows_report(rejected_rows, rejected_report_path)
+    return failures
+
+
+def validate_packages(paths, schema_dir=None):
+    """Validates the XML documents of each package zip. Returns the number of invalid packages."""
+    import zipfile
+    from . import qti_schemas
+
+    try:
+        schema_cache = qti_schemas.get_schema_cache(schema_dir)
+    except ValueError as ve:
+        print(f"❌ Error: {ve}")
+        return len(paths)
+    failures = 0
+    for path in paths:
+        try:
+            errors = qti_schemas.validate_package(path, schema_cache)
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"❌ {path}: {e}")
+            failures += 1
+            continue
+        for name, messages in errors.items():
+            print(f"  ❌ {name}: " + "; ".join(messages[:qti_schemas.MAX_REPORTED_ERRORS]))
+        print(f"❌ {path}: {len(errors)} invalid documents" if errors else f"✅ {path}: valid")
+        failures += bool(errors)
+    return failures
+
+
+def validate_command(argv):
+    """tao-qti validate. Returns the exit status."""
+    try:
+        paths, options = parse_validate_args(argv)
+    except ValueError as ve:
+        print(f"❌ Error: {ve}")
+        print_validate_usage()
+        return 1
+    packages = [path for path in paths if path.lower().endswith('.zip')]
+    workbooks = [path for path in paths if not path.lower().endswith('.zip')]
+    failures = 0
+    if workbooks:
+        failures += validate_workbooks(workbooks, options["rejected_report_path"])
+    if packages:
+        failures += validate_packages(packages, options["schema_dir"])
+    print(f"\n{'❌' if failures else '✅'} {len(paths) - failures} of {len(paths)} files passed validation.")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    """Console script entry point: dispatches to the subcommand's module."""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print_usage()
+        return 0
+    command, args = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"❌ Error: Unknown command '{command}'.")
+        print_usage()
+        return 1
+    wants_help = args[:1] in (["-h"], ["--help"])
+    if command == "validate":
+        if wants_help:
+            print_validate_usage()
+            return 0
+        return validate_command(args)
+    module = importlib.import_module(f".{COMMANDS[command][0]}", __package__)
+    if wants_help:
+        module.print_usage()
+        return 0
+    module.cli_main(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
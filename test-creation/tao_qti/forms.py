@@ -0,0 +1,341 @@
+"""
+Randomized test forms: N parallel versions of every assessment, for exam security.
+
+Each form of an assessment is its own package, <Assessment Code>_form01,
+_form02, ... In every form:
+
+  * the items come in their own order (--no-shuffle-items keeps the workbook order),
+  * the options of every item come in their own order, with the correct answer
+    remapped (--no-shuffle-options keeps them). The option identifiers stay in
+    place (option_A is always shown first), so each form gets its own copy of the
+    item, identified <item>_F01, _F02, ...
+  * with --sample K, only K randomly chosen items are used.
+
+Forms are reproducible: the random choices for form f of assessment A come from a
+generator seeded with (--seed, A, f), so the same seed gives the same forms, with
+any --workers and whatever else is in the workbook. Without --seed a random one is
+picked and printed. The seed, and for every form the items, their option order and
+correct answers, are written to <output_folder_for_packages>/forms.json (or --key FILE).
+
+Each item is escaped and its images resolved once per task (main.ItemTemplateParts).
+Every form then only joins pre-encoded bytes in its own order, so N forms cost far
+less than N builds of the assessment.
+
+Usage: python -m tao_qti.forms <path_to_excel_file> <output_folder_for_packages> --forms N [options]
+"""
+import contextlib
+import json
+import math
+import os
+import random
+import secrets
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from . import main
+from .metrics import METRICS, write_run_report
+
+FORMS_KEY_FILENAME = "forms.json"
+
+
+def form_code(assessment_code, form_number, form_count):
+    return f"{assessment_code}_form{form_number:0{max(2, len(str(form_count)))}d}"
+
+
+def plan_form(group, form_number, form_options):
+    """
+    The items of one form and the order of their options.
+
+    Returns:
+        list of tuple: (ValidatedItem, option order as indexes into item.options), in form order.
+    """
+    rng = random.Random(f"{form_options['seed']}:{group.assessment_code}:{form_number}")
+    positions = list(range(len(group.items)))
+    sample = form_options["sample"]
+    if sample and sample < len(positions):
+        positions = rng.sample(positions, sample)
+        if not form_options["shuffle_items"]:
+            positions.sort()
+    elif form_options["shuffle_items"]:
+        rng.shuffle(positions)
+    plan = []
+    for position in positions:
+        item = group.items[position]
+        option_order = list(range(len(item.options)))
+        if form_options["shuffle_options"]:
+            rng.shuffle(option_order)
+        plan.append((item, option_order))
+    return plan
+
+
+def form_item(item, option_order, form_suffix):
+    """The copy of item with its options in option_order, the correct answer remapped to its new position."""
+    option_ids = [option_id for option_id, _ in item.options]
+    correct_position = option_order.index(option_ids.index(item.correct_answer_id))
+    return item._replace(
+        item_identifier=f"{item.item_identifier}_{form_suffix}",
+        options=tuple((option_ids[position], item.options[source][1]) for position, source in enumerate(option_order)),
+        correct_answer_id=option_ids[correct_position],
+    )
+
+
+def build_forms(group, form_numbers, output_dir, package_options, form_options):
+    """
+    Builds the given forms of one assessment.
+
+    Returns:
+        list of tuple: (form number, create_qti_package_for_assessment result, key entries of the form's items).
+    """
+    media_library = main.package_media_library(
+        output_dir, package_options["media_source_dir"], package_options["max_image_size"]
+    )
+    item_parts = {}
+    with METRICS.time("item_xml"):
+        for item in group.items:
+            image_sources, _ = main.resolve_item_media(media_library, item)
+            try:
+                item_parts[item.item_identifier] = main.ItemTemplateParts(
+                    f"Item: {item.item_code}", item.item_stimulus, item.question_text, item.options, image_sources
+                )
+            except ValueError:
+                pass # Left to the package builder, which reports the item and skips it
+
+    results = []
+    for form_number in form_numbers:
+        form_suffix = f"F{form_number:0{max(2, len(str(form_options['forms'])))}d}"
+        items, item_xml, key = [], {}, []
+        with METRICS.time("item_xml"):
+            for item, option_order in plan_form(group, form_number, form_options):
+                form_variant = form_item(item, option_order, form_suffix) if form_options["shuffle_options"] else item
+                parts = item_parts.get(item.item_identifier)
+                if parts is not None:
+                    item_xml[form_variant.item_identifier] = parts.render(
+                        form_variant.item_identifier, form_variant.correct_answer_id, package_options["pretty_print"],
+                        option_order
+                    )
+                items.append(form_variant)
+                key.append({
+                    "item_code": item.item_code,
+                    "item_identifier": form_variant.item_identifier,
+                    "options": [item.options[source][0] for source in option_order],
+                    "correct_answer": form_variant.correct_answer_id,
+                })
+        result = main.create_qti_package_for_assessment(
+            form_code(group.assessment_code, form_number, form_options["forms"]), items, output_dir,
+            # The rejected rows are the same for every form; report them once
+            rejected_messages=group.rejected_messages if form_number == 1 else [],
+            item_xml=item_xml, **package_options
+        )
+        METRICS.incr("forms_built" if result else "forms_failed")
+        results.append((form_number, result, key))
+    return results
+
+
+def _build_forms_captured(group, form_numbers, output_dir, package_options, form_options):
+    """build_forms with its console output buffered."""
+    chunks = []
+    with contextlib.redirect_stdout(main._CapturedStream(chunks, "stdout")), \
+            contextlib.redirect_stderr(main._CapturedStream(chunks, "stderr")):
+        results = build_forms(group, form_numbers, output_dir, package_options, form_options)
+    return results, chunks
+
+
+def _build_forms_in_worker(group, form_numbers, output_dir, package_options, form_options):
+    """Process pool entry point: _build_forms_captured plus the metrics recorded for this task."""
+    results, chunks = _build_forms_captured(group, form_numbers, output_dir, package_options, form_options)
+    return results, chunks, METRICS.drain()
+
+
+def form_tasks(groups, form_count, workers):
+    """(group, form numbers) per task: the forms of an assessment are split so all workers get some."""
+    forms_per_task = max(1, math.ceil(form_count / workers))
+    for group in groups:
+        for first in range(1, form_count + 1, forms_per_task):
+            yield group, list(range(first, min(form_count, first + forms_per_task - 1) + 1))
+
+
+def create_forms(groups, output_dir, package_options, form_options, workers=1, quiet=False):
+    """
+    Builds form_options["forms"] forms of every AssessmentGroup. Returns the forms key:
+    Assessment Code -> list of {"form", "package", "items"} in form order.
+    """
+    if package_options["validate_schema"]:
+        main.check_schema_mirror(package_options["schema_dir"])
+    forms_key = {}
+
+    def record(group, results):
+        for form_number, result, key in results:
+            forms_key.setdefault(group.assessment_code, []).append({
+                "form": form_number,
+                "package": os.path.basename(result) if result else None,
+                "items": key,
+            })
+
+    tasks = form_tasks(groups, form_options["forms"], workers)
+    if workers <= 1:
+        for group, form_numbers in tasks:
+            if quiet:
+                # Errors go to stderr and are still shown
+                results, chunks = _build_forms_captured(group, form_numbers, output_dir, package_options, form_options)
+                main._replay_output(chunks, quiet=True)
+            else:
+                results = build_forms(group, form_numbers, output_dir, package_options, form_options)
+            record(group, results)
+        return forms_key
+
+    pending = deque()
+
+    def report_oldest():
+        group, form_numbers, future = pending.popleft()
+        try:
+            results, chunks, worker_metrics = future.result()
+        except Exception as e:
+            # Only reached if the worker itself died (e.g. killed or unpicklable data)
+            METRICS.incr("forms_failed", len(form_numbers))
+            print(f"  ❌ An unexpected error occurred while building forms {form_numbers} of Assessment Code "
+                  f"'{group.assessment_code}': {e}", file=sys.stderr)
+            record(group, [])
+            return
+        METRICS.merge(worker_metrics)
+        main._replay_output(chunks, quiet=quiet)
+        record(group, results)
+
+    # Forked workers start with a copy of this process's metrics; clear it so nothing is counted twice
+    with ProcessPoolExecutor(max_workers=workers, initializer=METRICS.reset) as executor:
+        for group, form_numbers in tasks:
+            pending.append((group, form_numbers, executor.submit(
+                _build_forms_in_worker, group, form_numbers, output_dir, package_options, form_options
+            )))
+            if len(pending) >= workers * 2:
+                report_oldest()
+        while pending:
+            report_oldest()
+    return forms_key
+
+
+def print_usage():
+    print("Usage: python -m tao_qti.forms <path_to_excel_file> <output_folder_for_packages> --forms N [options]")
+    print("Options (plus the generation options of main.py except --stream, --incremental and the package size limits):")
+    print("  --forms N               Forms to build per assessment")
+    print("  --seed S                Seed of the random choices; the same seed rebuilds the same forms (default: random)")
+    print("  --sample K              Use K randomly chosen items of each assessment per form")
+    print("  --no-shuffle-items      Keep the items in workbook order")
+    print("  --no-shuffle-options    Keep the options in workbook order")
+    print(f"  --key FILE              Forms key with the seed, item order and answers (default: <output_folder_for_packages>/{FORMS_KEY_FILENAME})")
+    print("Example: python -m tao_qti.forms test.xlsx qti_forms --forms 50 --seed 2024 --workers 8")
+
+
+def parse_args(argv):
+    """
+    Parses command line arguments into (excel_file_path, output_dir, options).
+
+    Form options are handled here; everything else is parsed by main.parse_args.
+    """
+    options = {"forms": None, "seed": None, "sample": None, "shuffle_items": True, "shuffle_options": True,
+               "key": None}
+    generation_args = []
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg in ("--forms", "--sample"):
+            if not args:
+                raise ValueError(f"{arg} requires a value.")
+            value = args.pop(0)
+            if not value.isdigit() or int(value) < 1:
+                raise ValueError(f"{arg} must be a positive integer, got '{value}'.")
+            options[arg[2:]] = int(value)
+        elif arg in ("--seed", "--key"):
+            if not args:
+                raise ValueError(f"{arg} requires a value.")
+            options[arg[2:]] = args.pop(0)
+        elif arg == "--no-shuffle-items":
+            options["shuffle_items"] = False
+        elif arg == "--no-shuffle-options":
+            options["shuffle_options"] = False
+        else:
+            generation_args.append(arg)
+    excel_file_path, output_dir, generation_options = main.parse_args(generation_args)
+    if options["forms"] is None:
+        raise ValueError("--forms is required.")
+    for option, name in (("stream", "--stream"), ("incremental", "--incremental"),
+                         ("max_items_per_package", "--max-items-per-package"), ("max_package_bytes", "--max-package-mb")):
+        if generation_options[option]:
+            raise ValueError(f"{name} is not supported for forms; every form is built from the whole assessment "
+                             "(use --sample to make forms smaller).")
+    options.update(generation_options)
+    return excel_file_path, output_dir, options
+
+
+def cli_main(argv):
+    """Runs the command line (python -m tao_qti.forms ... or tao-qti forms ...) with the arguments in argv."""
+    try:
+        excel_file_path, output_dir, options = parse_args(argv)
+    except ValueError as ve:
+        print(f"❌ Error: {ve}")
+        print_usage()
+        sys.exit(1)
+
+    if not os.path.isfile(excel_file_path):
+        print(f"❌ Error: File '{excel_file_path}' does not exist.")
+        sys.exit(1)
+
+    form_options = {
+        "forms": options["forms"],
+        "seed": options["seed"] if options["seed"] is not None else str(secrets.randbelow(10 ** 9)),
+        "sample": options["sample"],
+        "shuffle_items": options["shuffle_items"],
+        "shuffle_options": options["shuffle_options"],
+    }
+    package_options = {
+        "compression": options["compression"],
+        "compresslevel": options["compresslevel"],
+        "item_serializer": options["item_serializer"],
+        "pretty_print": options["pretty_print"],
+        "stream_xml": options["stream_xml"],
+        "media_source_dir": options["media_source_dir"],
+        "max_image_size": options["max_image_size"],
+        "validate_schema": options["validate_schema"],
+        "schema_dir": options["schema_dir"],
+        "max_items_per_section": options["max_items_per_section"],
+        "item_cache_bytes": options["item_cache_bytes"],
+        "item_cache_dir": options["item_cache_dir"],
+    }
+
+    start = time.perf_counter()
+    try:
+        df_exam_data = main.read_exam_data(excel_file_path, read_cache_dir=options["read_cache_dir"])
+        validation = main.validate_exam_data(df_exam_data)
+        if options["rejected_report_path"]:
+            main.write_rejected_rows_report(validation.rejected_rows, options["rejected_report_path"])
+        groups = list(main.group_validated_items(validation, df_exam_data.groupby('Assessment Code')))
+
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"Generating {form_options['forms']} forms of {len(groups)} assessments in: '{os.path.abspath(output_dir)}'")
+        print(f"🎲 Seed: {form_options['seed']} (pass --seed {form_options['seed']} to rebuild the same forms)")
+        forms_key = create_forms(groups, output_dir, package_options, form_options, options["workers"], options["quiet"])
+    except ValueError as ve:
+        print(f"❌ ValueError: {ve}")
+        sys.exit(1)
+    except FileNotFoundError as fnf:
+        print(f"❌ File Error: {fnf}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ An unexpected error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        write_run_report("forms", options["metrics_json"], options["prometheus_textfile"])
+
+    key_path = options["key"] or os.path.join(output_dir, FORMS_KEY_FILENAME)
+    with open(key_path, 'w', encoding='utf-8') as f:
+        json.dump({**form_options, "assessments": forms_key}, f, indent=2, ensure_ascii=False)
+
+    built = sum(1 for forms in forms_key.values() for form in forms if form["package"])
+    failed = sum(1 for forms in forms_key.values() for form in forms if not form["package"])
+    print(f"\n✅ Built {built} form packages ({failed} failed) in {time.perf_counter() - start:.1f}s.")
+    print(f"✅ Forms key written to: '{os.path.abspath(key_path)}'")
+
+
+if __name__ == "__main__":
+    cli_main(sys.argv[1:])
@@ -0,0 +1,3050 @@
+from __future__ import annotations # numpy, pandas and lxml are imported where they are used
+
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from math import nan as NaN
+from typing import TYPE_CHECKING, NamedTuple
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import posixpath
+import sys
+import re
+import stat
+import string
+
+from .metrics import METRICS, quiet_stdout, write_run_report
+from .qti_schemas import MAX_REPORTED_ERRORS, check_schema_mirror, get_schema_cache
+
+if TYPE_CHECKING: # For the annotations only
+    import numpy as np
+    import pandas as pd
+
+# Rows per chunk when streaming CSV input
+STREAM_CHUNK_ROWS = 10000
+
+# Part of every build cache key; bump it whenever the generated package content changes
+GENERATOR_VERSION = "1"
+
+# Timestamp stored for every zip entry (the earliest date the zip format can hold)
+ZIP_ENTRY_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Build cache file kept in the output directory by incremental builds
+BUILD_CACHE_FILENAME = ".qti_build_cache.json"
+
+# Default memory cap of the per-process item XML cache (see ItemXmlCache)
+ITEM_CACHE_BYTES = 64 * 1024 * 1024
+
+# --- QTI 2.1 XML Generation Functions ---
+
+def sanitize_identifier(name):
+    """Sanitizes a string to be a valid QTI identifier."""
+    # Convert to string first
+    name_str = str(name)
+    # Replace non-alphanumeric characters (except underscore and hyphen) with underscore
+    s = re.sub(r'[^\w-]', '_', name_str)
+    # Ensure it doesn't start with a number or hyphen (QTI identifier rules)
+    if s and (s[0].isdigit() or s[0] == '-'):
+         s = '_' + s
+    # Ensure it's not empty or just underscores/hyphens after cleaning
+    s = s.strip('_').strip('-')
+    if not s:
+        s = "unspecified_id" + re.sub(r'[^\w]', '', name_str) # Add some cleaned characters from original if possible
+        if not s or s == "unspecified_id":
+             s = "unspecified_id" + str(abs(hash(name_str))) # Fallback to hash if still empty
+        s = s[:64] # Limit length to avoid issues with file paths etc.
+    return s
+
+
+def _set_paragraph_content(p, text, image_sources=None):
+    """Sets the text of a <p>, turning [img:...] references into <img> elements when image_sources is given."""
+    from lxml import etree
+
+    if not image_sources:
+        p.text = text
+        return
+    runs = MEDIA_REFERENCE_PATTERN.split(text)
+    # Always set the leading text (even '') so lxml keeps the paragraph on one line
+    p.text = runs[0]
+    for i in range(1, len(runs), 3):
+        reference, alt, tail = runs[i], runs[i + 1], runs[i + 2]
+        img = etree.SubElement(p, "img", src=image_sources[reference], alt=alt or "")
+        img.tail = tail or None
+
+
+def create_qti_item_xml(item_identifier, item_title, item_stimulus, question_text, options, correct_answer_id,
+                        image_sources=None):
+    """
+    Creates a QTI 2.1 assessmentItem XML element.
+
+    Args:
+        item_identifier (str): Unique identifier for the item.
+        item_title (str): Title for the item.
+        item_stimulus (str): Optional introductory text/stimulus for the question.
+        question_text (str): The main question stem.
+        options (list of tuple): List of (option_id, option_text) for choice interaction.
+        correct_answer_id (str): The identifier of the correct option.
+        image_sources (dict): Optional image reference -> src (relative to the item file).
+            When given, [img:reference] and [img:reference|alt] in the stimulus, stem and
+            options become <img> elements; see split_media_references.
+    Returns:
+        etree.Element: The assessmentItem XML element.
+    """
+    from lxml import etree
+
+    # QTI 2.1 Namespaces
+    nsmap = {
+        None: "http://www.imsglobal.org/xsd/imsqti_v2p1",
+        'xsi': "http://www.w3.org/2001/XMLSchema-instance"
+    }
+
+    assessmentItem = etree.Element(
+        "assessmentItem",
+        identifier=item_identifier,
+        title=item_title,
+        adaptive="false",
+        timeDependent="false",
+        nsmap=nsmap,
+        attrib={
+            "{http://www.w3.org/2001/XMLSchema-instance}schemaLocation":
+            "http://www.imsglobal.org/xsd/imsqti_v2p1 http://www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_v2p1p1.xsd"
+        }
+    )
+
+    # --- responseDeclaration ---
+    responseDeclaration = etree.SubElement(
+        assessmentItem,
+        "responseDeclaration",
+        identifier="RESPONSE",
+        baseType="identifier",
+        cardinality="single"
+    )
+    correctResponse = etree.SubElement(responseDeclaration, "correctResponse")
+    value = etree.SubElement(correctResponse, "value")
+    value.text = correct_answer_id
+
+    # --- outcomeDeclaration ---
+    # Item outcome for score - typically float max 1 for correct answer
+    outcomeDeclaration_score = etree.SubElement(
+        assessmentItem,
+        "outcomeDeclaration",
+        identifier="SCORE",
+        cardinality="single",
+        baseType="float",
+        normalMaximum="1",
+        normalMinimum="0"
+    )
+    defaultValue_score = etree.SubElement(outcomeDeclaration_score, "defaultValue")
+    value_score = etree.SubElement(defaultValue_score, "value")
+    value_score.text = "0"
+
+    # --- itemBody ---
+    itemBody = etree.SubElement(assessmentItem, "itemBody")
+    
+    # Add Item Stimulus if present and not empty/N/A
+    if item_stimulus and str(item_stimulus).strip().lower() not in ["n/a", ""]:
+        # Use <p> for stimulus.
+        p_stimulus = etree.SubElement(itemBody, "p")
+        # Basic HTML escaping might be needed if stimulus contains XML special chars
+        _set_paragraph_content(p_stimulus, str(item_stimulus).strip(), image_sources)
+
+    # Prompt for the question (Item Stem)
+    p_prompt = etree.SubElement(itemBody, "p")
+    # Basic HTML escaping might be needed if stem contains XML special chars
+    _set_paragraph_content(p_prompt, str(question_text).strip(), image_sources)
+
+    # Choice Interaction
+    choiceInteraction = etree.SubElement(
+        itemBody,
+        "choiceInteraction",
+        responseIdentifier="RESPONSE",
+        shuffle="false", # Or "true" if option order doesn't matter
+        maxChoices="1"
+    )
+
+    for option_id, option_text in options:
+        simpleChoice = etree.SubElement(
+            choiceInteraction,
+            "simpleChoice",
+            identifier=option_id
+        )
+        # Basic HTML escaping might be needed for option text
+        p_choice = etree.SubElement(simpleChoice, "p")
+        _set_paragraph_content(p_choice, str(option_text).strip(), image_sources)
+
+    # --- responseProcessing ---
+    # Use a standard template for item processing
+    responseProcessing = etree.SubElement(
+        assessmentItem,
+        "responseProcessing",
+        template="http://www.imsglobal.org/question/qti_v2p1/rptemplates/match_correct"
+    )
+
+    return assessmentItem
+
+# --- Precompiled Item Template Serializer ---
+# Renders the same document as serialize_xml(create_qti_item_xml(...)) straight to bytes.
+# Only the identifier, title, stimulus, stem, options and correct answer vary between
+# items, so everything else is pre-encoded once at import time.
+
+XML_DECLARATION = b"<?xml version='1.0' encoding='UTF-8'?>\n"
+
+# Characters lxml refuses in text and attribute values
+_XML_INCOMPATIBLE_CHARS = re.compile('[^\x09\x0A\x0D\x20-\uD7FF\uE000-\uFFFD\U00010000-\U0010FFFF]')
+
+
+def _check_xml_compatible(value):
+    if _XML_INCOMPATIBLE_CHARS.search(value):
+        raise ValueError("All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters")
+    return value
+
+
+def escape_xml_text(value):
+    """Escapes element text the way libxml2 serializes it, returned as UTF-8 bytes."""
+    value = _check_xml_compatible(str(value))
+    return (value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            .replace('\r', '&#13;').encode('utf-8'))
+
+
+def escape_xml_attribute(value):
+    """Escapes a double-quoted attribute value the way libxml2 serializes it, returned as UTF-8 bytes."""
+    value = _check_xml_compatible(str(value))
+    return (value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+            .replace('\n', '&#10;').replace('\r', '&#13;').replace('\t', '&#9;').encode('utf-8'))
+
+
+class _ByteTemplate:
+    """A str.format style template split once into UTF-8 byte literals and field names."""
+
+    def __init__(self, lines, pretty_print):
+        # lines: (indent level, markup) pairs; pretty printing uses lxml's two-space indent
+        if pretty_print:
+            template = ''.join(f"{'  ' * level}{markup}\n" for level, markup in lines)
+        else:
+            template = ''.join(markup for _, markup in lines)
+        self.parts = [
+            (literal.encode('utf-8'), field)
+            for literal, field, _, _ in string.Formatter().parse(template)
+        ]
+
+    def render(self, out, values=None):
+        """Appends the rendered bytes to the list out; values maps field names to escaped bytes."""
+        for literal, field in self.parts:
+            out.append(literal)
+            if field is not None:
+                out.append(values[field])
+
+
+_ITEM_TEMPLATE_SEGMENTS = {
+    'head': [
+        (0, '<assessmentItem xmlns="http://www.imsglobal.org/xsd/imsqti_v2p1" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'identifier="{identifier}" title="{title}" adaptive="false" timeDependent="false" '
+            'xsi:schemaLocation="http://www.imsglobal.org/xsd/imsqti_v2p1 '
+            'http://www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_v2p1p1.xsd">'),
+        (1, '<responseDeclaration identifier="RESPONSE" baseType="identifier" cardinality="single">'),
+        (2, '<correctResponse>'),
+        (3, '<value>{correct_answer}</value>'),
+        (2, '</correctResponse>'),
+        (1, '</responseDeclaration>'),
+        (1, '<outcomeDeclaration identifier="SCORE" cardinality="single" baseType="float" normalMaximum="1" normalMinimum="0">'),
+        (2, '<defaultValue>'),
+        (3, '<value>0</value>'),
+        (2, '</defaultValue>'),
+        (1, '</outcomeDeclaration>'),
+        (1, '<itemBody>'),
+    ],
+    'paragraph': [
+        (2, '<p>{text}</p>'),
+    ],
+    'choices_open': [
+        (2, '<choiceInteraction responseIdentifier="RESPONSE" shuffle="false" maxChoices="1">'),
+    ],
+    'choice': [
+        (3, '<simpleChoice identifier="{identifier}">'),
+        (4, '<p>{text}</p>'),
+        (3, '</simpleChoice>'),
+    ],
+    'choices_close': [
+        (2, '</choiceInteraction>'),
+    ],
+    'choices_empty': [
+        (2, '<choiceInteraction responseIdentifier="RESPONSE" shuffle="false" maxChoices="1"/>'),
+    ],
+    'tail': [
+        (1, '</itemBody>'),
+        (1, '<responseProcessing template="http://www.imsglobal.org/question/qti_v2p1/rptemplates/match_correct"/>'),
+        (0, '</assessmentItem>'),
+    ],
+}
+
+_ITEM_TEMPLATES = {
+    pretty_print: {name: _ByteTemplate(lines, pretty_print) for name, lines in _ITEM_TEMPLATE_SEGMENTS.items()}
+    for pretty_print in (True, False)
+}
+
+
+def _escape_paragraph_content(text, image_sources=None):
+    """Template counterpart of _set_paragraph_content: the escaped content of a <p>."""
+    if not image_sources:
+        return escape_xml_text(text)
+    runs = MEDIA_REFERENCE_PATTERN.split(text)
+    out = [escape_xml_text(runs[0])]
+    for i in range(1, len(runs), 3):
+        reference, alt, tail = runs[i], runs[i + 1], runs[i + 2]
+        out.append(b'<img src="' + escape_xml_attribute(image_sources[reference]) + b'" alt="'
+                   + escape_xml_attribute(alt or "") + b'"/>')
+        out.append(escape_xml_text(tail))
+    return b''.join(out)
+
+
+class ItemTemplateParts:
+    """
+    The escaped text of an item, ready to be rendered with the precompiled byte template.
+
+    Escaping and image resolution happen once here. render() then only joins
+    pre-encoded bytes, so variants of the same item (another identifier, the
+    options in another order; see forms.py) cost little more than a copy.
+    """
+
+    __slots__ = ('title', 'paragraphs', 'option_ids', 'option_texts')
+
+    def __init__(self, item_title, item_stimulus, question_text, options, image_sources=None):
+        self.title = escape_xml_attribute(item_title)
+        question = _escape_paragraph_content(str(question_text).strip(), image_sources)
+        # Same stimulus rule as create_qti_item_xml
+        if item_stimulus and str(item_stimulus).strip().lower() not in ["n/a", ""]:
+            self.paragraphs = (_escape_paragraph_content(str(item_stimulus).strip(), image_sources), question)
+        else:
+            self.paragraphs = (question,)
+        self.option_ids = [escape_xml_attribute(option_id) for option_id, _ in options]
+        self.option_texts = [_escape_paragraph_content(str(option_text).strip(), image_sources)
+                             for _, option_text in options]
+
+    def render(self, item_identifier, correct_answer_id, pretty_print=True, option_order=None):
+        """
+        Renders the item document. With option_order (indexes into the options), the
+        option texts are shown in that order, while the option identifiers keep their
+        positions; correct_answer_id must already refer to the new positions.
+        """
+        templates = _ITEM_TEMPLATES[pretty_print]
+        out = [XML_DECLARATION]
+        templates['head'].render(out, {
+            'identifier': escape_xml_attribute(item_identifier),
+            'title': self.title,
+            'correct_answer': escape_xml_text(correct_answer_id),
+        })
+        for text in self.paragraphs:
+            templates['paragraph'].render(out, {'text': text})
+        if self.option_texts:
+            templates['choices_open'].render(out)
+            for position, source in enumerate(option_order or range(len(self.option_texts))):
+                templates['choice'].render(out, {
+                    'identifier': self.option_ids[position],
+                    'text': self.option_texts[source],
+                })
+            templates['choices_close'].render(out)
+        else:
+            templates['choices_empty'].render(out)
+        templates['tail'].render(out)
+        return b''.join(out)
+
+
+def render_qti_item_xml(item_identifier, item_title, item_stimulus, question_text, options, correct_answer_id,
+                        pretty_print=True, image_sources=None):
+    """
+    Renders a QTI 2.1 assessmentItem document from the precompiled byte template.
+
+    Takes the same arguments as create_qti_item_xml and returns the same bytes as
+    serialize_xml(create_qti_item_xml(...), pretty_print), without building a tree.
+
+    Returns:
+        bytes: The UTF-8 encoded item XML, including the XML declaration.
+    """
+    parts = ItemTemplateParts(item_title, item_stimulus, question_text, options, image_sources)
+    return parts.render(item_identifier, correct_answer_id, pretty_print)
+
+
+def test_section_sizes(item_count, max_items_per_section=None):
+    """Item counts of the assessmentSections a test of item_count items is split into (always at least one)."""
+    if not max_items_per_section or item_count <= max_items_per_section:
+        return [item_count]
+    full_sections, remainder = divmod(item_count, max_items_per_section)
+    return [max_items_per_section] * full_sections + ([remainder] if remainder else [])
+
+
+def test_section_title(test_title, section_number, section_count):
+    if section_count == 1:
+        return f"Questions for: {test_title}"
+    return f"Questions for: {test_title} (part {section_number} of {section_count})"
+
+
+def create_qti_test_xml(test_identifier, test_title, item_references, max_items_per_section=None):
+    """
+    Creates a QTI 2.1 assessmentTest XML element referencing multiple items.
+
+    Args:
+        test_identifier (str): Unique identifier for the test.
+        test_title (str): Title of the assessment test.
+        item_references (list of tuple): List of (item_identifier, item_ref_path).
+        max_items_per_section (int): Optional limit; larger tests get consecutive sections
+            <test_identifier>-SEC-01, -SEC-02, ... in item order.
+    Returns:
+        etree.Element: The assessmentTest XML element.
+    """
+    from lxml import etree
+
+    nsmap = {
+        None: "http://www.imsglobal.org/xsd/imsqti_v2p1",
+        'xsi': "http://www.w3.org/2001/XMLSchema-instance"
+    }
+
+    assessmentTest = etree.Element(
+        "assessmentTest",
+        identifier=test_identifier,
+        title=test_title,
+        nsmap=nsmap,
+        attrib={
+            "{http://www.w3.org/2001/XMLSchema-instance}schemaLocation":
+            "http://www.imsglobal.org/xsd/imsqti_v2p1 http://www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_v2p1p1.xsd"
+        }
+    )
+
+    # Outcome Declarations (Standard QTI Test outcomes)
+    # The total score outcome is necessary for the test level
+    outcome_declarations = [
+        ("TOTAL_SCORE", "integer", "0"),
+        ("TOTAL_MAXSCORE", "float", str(len(item_references))), # Max score is sum of item max scores (1 per item)
+        ("TOTAL_MINSCORE", "float", "0"),
+    ]
+    for identifier, baseType, defaultValue in outcome_declarations:
+        outcomeDeclaration = etree.SubElement(
+            assessmentTest,
+            "outcomeDeclaration",
+            identifier=identifier,
+            cardinality="single",
+            baseType=baseType
+        )
+        default_val_elem = etree.SubElement(outcomeDeclaration, "defaultValue")
+        val_elem = etree.SubElement(default_val_elem, "value")
+        val_elem.text = defaultValue
+
+    # Test Part
+    testPart = etree.SubElement(
+        assessmentTest,
+        "testPart",
+        identifier=f"{test_identifier}-TPRT-01",
+        navigationMode="linear", # Sequential navigation
+        submissionMode="individual" # Items submitted individually
+    )
+
+    section_sizes = test_section_sizes(len(item_references), max_items_per_section)
+    section_start = 0
+    for section_number, section_size in enumerate(section_sizes, start=1):
+        # Assessment Section
+        assessmentSection = etree.SubElement(
+            testPart,
+            "assessmentSection",
+            identifier=f"{test_identifier}-SEC-{section_number:02d}",
+            title=test_section_title(test_title, section_number, len(section_sizes)),
+            visible="true",
+            required="true", # Section is required
+            keepTogether="false", # Items can be split across pages
+            fixed="false" # Items can be reordered within the section
+        )
+
+        # --- Remove Selection and Ordering blocks entirely ---
+        # This relies on the platform's default behavior to select all items
+        # and present them in the order they appear in the XML.
+        # This is a common and minimal approach.
+
+        # Assessment Item References (Add a reference for each item)
+        # These must be added directly under the assessmentSection when selection/ordering are omitted
+        for item_identifier, item_ref_path in item_references[section_start:section_start + section_size]:
+            etree.SubElement(
+                assessmentSection,
+                "assessmentItemRef",
+                identifier=item_identifier, # This is the item identifier
+                href=item_ref_path,
+                required="true", # Item must be included
+                fixed="false" # Item position is not fixed (allows section shuffling if configured elsewhere, but likely default is order in XML)
+            )
+        section_start += section_size
+
+    # --- outcomeProcessing is omitted as discussed in previous fix ---
+    # Relying on the QTI player's default aggregation (usually sums item scores)
+
+    return assessmentTest
+
+
+def create_imsmanifest_xml_for_test_package(
+    package_identifier, test_identifier, test_filename_relative_path, item_references_for_manifest, media_files=None, css_files=None,
+    item_files=None
+):
+    """
+    Creates an imsmanifest.xml for a QTI 2.1 package that contains multiple items
+    and a test that references them. The primary resource is the test.
+
+    Args:
+        package_identifier (str): The overall identifier for this package (e.g., Assessment Code).
+        test_identifier (str): The identifier of the QTI Test.
+        test_filename_relative_path (str): The relative path to the QTI Test XML file.
+        item_references_for_manifest (list of tuple): List of (item_identifier, item_filename_relative_path).
+        media_files (list): Optional list of relative paths to media files (e.g., images).
+        css_files (list): Optional list of relative paths to CSS files.
+        item_files (dict): Optional item_identifier -> relative paths of the files (e.g. images)
+            used by that item only. They are listed in that item's resource.
+    Returns:
+        etree.Element: The manifest XML element.
+    """
+    from lxml import etree
+
+    if media_files is None:
+        media_files = []
+    if css_files is None:
+        css_files = []
+    if item_files is None:
+        item_files = {}
+
+    nsmap = {
+        None: "http://www.imsglobal.org/xsd/imscp_v1p1",
+        'xsi': "http://www.w3.org/2001/XMLSchema-instance",
+        'lom': "http://ltsc.ieee.org/xsd/LOM",
+        'qtiMetadata': "http://www.imsglobal.org/xsd/imsqti_metadata_v2p1"
+    }
+
+    # Ensure paths use forward slashes for XML
+    test_filename_relative_path = test_filename_relative_path.replace(os.sep, '/')
+    item_references_for_manifest = [(id, path.replace(os.sep, '/')) for id, path in item_references_for_manifest]
+    media_files = [path.replace(os.sep, '/') for path in media_files]
+    css_files = [path.replace(os.sep, '/') for path in css_files]
+
+
+    manifest = etree.Element(
+        "manifest",
+        identifier=f"MANIFEST-{package_identifier}",
+        nsmap=nsmap,
+        attrib={
+            "{http://www.w3.org/2001/XMLSchema-instance}schemaLocation":
+            "http://www.imsglobal.org/xsd/imscp_v1p1 http://www.imsglobal.org/xsd/qti/qtiv2p1/qtiv2p1_imscpv1p2_v1p0.xsd "
+            "http://ltsc.ieee.org/xsd/LOM http://www.imsglobal.org/xsd/imsmd_loose_v1p3p2.xsd "
+            "http://www.imsglobal.org/xsd/imsqti_metadata_v2p1 http://www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_metadata_v2p1p1.xsd"
+        }
+    )
+
+    metadata = etree.SubElement(manifest, "metadata")
+    schema = etree.SubElement(metadata, "schema")
+    schema.text = "QTIv2.1 Package"
+    schemaversion = etree.SubElement(metadata, "schemaversion")
+    schemaversion.text = "1.0.0"
+
+    # Optional LOM metadata for the overall package
+    lom = etree.SubElement(metadata, "{http://ltsc.ieee.org/xsd/LOM}lom")
+    general = etree.SubElement(lom, "{http://ltsc.ieee.org/xsd/LOM}general")
+    identifier_elem = etree.SubElement(general, "{http://ltsc.ieee.org/xsd/LOM}identifier")
+    entry = etree.SubElement(identifier_elem, "{http://ltsc.ieee.org/xsd/LOM}entry")
+    entry.text = package_identifier
+    title_elem = etree.SubElement(general, "{http://ltsc.ieee.org/xsd/LOM}title")
+    string_elem = etree.SubElement(title_elem, "{http://ltsc.ieee.org/xsd/LOM}string")
+    string_elem.text = f"QTI 2.1 Package: {package_identifier}"
+
+    organizations = etree.SubElement(manifest, "organizations")
+    # It's good practice to declare the test as the primary organization resource
+    organization = etree.SubElement(organizations, "organization", identifier=f"ORG-{package_identifier}")
+    title_org = etree.SubElement(organization, "title")
+    title_org.text = f"Test: {package_identifier}"
+    # Add the test as an item in the organization structure
+    item_org = etree.SubElement(organization, "item", identifier=f"ITEMREF-{test_identifier}", identifierref=f"RESOURCE-{test_identifier}")
+    title_item_org = etree.SubElement(item_org, "title")
+    title_item_org.text = f"Test: {package_identifier}"
+
+
+    resources = etree.SubElement(manifest, "resources")
+
+    # Resources for Assessment Items
+    for item_identifier, item_filename_relative_path in item_references_for_manifest:
+        item_resource = etree.SubElement(
+            resources,
+            "resource",
+            type="imsqti_item_xmlv2p1",
+            identifier=f"RESOURCE-{item_identifier}",
+            href=item_filename_relative_path
+        )
+        # Add basic item metadata if available/necessary
+        item_resource_metadata = etree.SubElement(item_resource, "metadata")
+        qti_metadata = etree.SubElement(item_resource_metadata, "{http://www.imsglobal.org/xsd/imsqti_metadata_v2p1}qtiMetadata")
+        interactionType = etree.SubElement(qti_metadata, "{http://www.imsglobal.org/xsd/imsqti_metadata_v2p1}interactionType")
+        interactionType.text = "choiceInteraction" # Assuming all are choice interactions
+        
+        # Add the item XML file itself
+        etree.SubElement(item_resource, "file", href=item_filename_relative_path)
+        for item_file_path in item_files.get(item_identifier, ()):
+            etree.SubElement(item_resource, "file", href=item_file_path.replace(os.sep, '/'))
+        # Add any shared media/CSS files to item resources too (optional, depends on player)
+        for media_file_path in media_files:
+             etree.SubElement(item_resource, "file", href=media_file_path)
+        for css_file_path in css_files:
+             etree.SubElement(item_resource, "file", href=css_file_path)
+
+
+    # Resource for the Assessment Test (Primary Resource for the package)
+    test_resource = etree.SubElement(
+        resources,
+        "resource",
+        type="imsqti_test_xmlv2p1",
+        identifier=f"RESOURCE-{test_identifier}",
+        href=test_filename_relative_path
+    )
+    # Add basic test metadata
+    test_resource_metadata = etree.SubElement(test_resource, "metadata")
+    # Can add test-specific LOM or QTI metadata here if needed
+
+    # Add the test XML file itself
+    etree.SubElement(test_resource, "file", href=test_filename_relative_path)
+    
+    # The test resource DEPENDS on ALL the item resources
+    for item_identifier, _ in item_references_for_manifest:
+        etree.SubElement(test_resource, "dependency", identifierref=f"RESOURCE-{item_identifier}")
+
+    # Add any shared media/CSS files to the test resource too
+    for media_file_path in media_files:
+        etree.SubElement(test_resource, "file", href=media_file_path)
+    for css_file_path in css_files:
+        etree.SubElement(test_resource, "file", href=css_file_path)
+
+
+    return manifest
+
+# --- Streaming Test and Manifest Writers ---
+# Write the same documents as serialize_xml(create_qti_test_xml(...)) and
+# serialize_xml(create_imsmanifest_xml_for_test_package(...)) piece by piece into a
+# binary file object (such as a zip entry opened for writing), using the byte
+# templates of the item serializer. No tree is built, so memory use stays the same
+# however many items a group has.
+
+# Items rendered between writes to the output
+STREAM_WRITE_BATCH = 1000
+
+_TEST_TEMPLATE_SEGMENTS = {
+    'head': [
+        (0, '<assessmentTest xmlns="http://www.imsglobal.org/xsd/imsqti_v2p1" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" identifier="{identifier}" title="{title}" '
+            'xsi:schemaLocation="http://www.imsglobal.org/xsd/imsqti_v2p1 '
+            'http://www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_v2p1p1.xsd">'),
+        (1, '<outcomeDeclaration identifier="TOTAL_SCORE" cardinality="single" baseType="integer">'),
+        (2, '<defaultValue>'),
+        (3, '<value>0</value>'),
+        (2, '</defaultValue>'),
+        (1, '</outcomeDeclaration>'),
+        (1, '<outcomeDeclaration identifier="TOTAL_MAXSCORE" cardinality="single" baseType="float">'),
+        (2, '<defaultValue>'),
+        (3, '<value>{item_count}</value>'),
+        (2, '</defaultValue>'),
+        (1, '</outcomeDeclaration>'),
+        (1, '<outcomeDeclaration identifier="TOTAL_MINSCORE" cardinality="single" baseType="float">'),
+        (2, '<defaultValue>'),
+        (3, '<value>0</value>'),
+        (2, '</defaultValue>'),
+        (1, '</outcomeDeclaration>'),
+        (1, '<testPart identifier="{identifier}-TPRT-01" navigationMode="linear" submissionMode="individual">'),
+    ],
+    'section_open': [
+        (2, '<assessmentSection identifier="{identifier}-SEC-{section_number}" title="{section_title}" visible="true" '
+            'required="true" keepTogether="false" fixed="false">'),
+    ],
+    'section_empty': [
+        (2, '<assessmentSection identifier="{identifier}-SEC-{section_number}" title="{section_title}" visible="true" '
+            'required="true" keepTogether="false" fixed="false"/>'),
+    ],
+    'item_ref': [
+        (3, '<assessmentItemRef identifier="{identifier}" href="{href}" required="true" fixed="false"/>'),
+    ],
+    'section_close': [
+        (2, '</assessmentSection>'),
+    ],
+    'tail': [
+        (1, '</testPart>'),
+        (0, '</assessmentTest>'),
+    ],
+}
+
+_MANIFEST_TEMPLATE_SEGMENTS = {
+    'head': [
+        (0, '<manifest xmlns="http://www.imsglobal.org/xsd/imscp_v1p1" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:lom="http://ltsc.ieee.org/xsd/LOM" '
+            'xmlns:qtiMetadata="http://www.imsglobal.org/xsd/imsqti_metadata_v2p1" identifier="MANIFEST-{identifier}" '
+            'xsi:schemaLocation="http://www.imsglobal.org/xsd/imscp_v1p1 '
+            'http://www.imsglobal.org/xsd/qti/qtiv2p1/qtiv2p1_imscpv1p2_v1p0.xsd '
+            'http://ltsc.ieee.org/xsd/LOM http://www.imsglobal.org/xsd/imsmd_loose_v1p3p2.xsd '
+            'http://www.imsglobal.org/xsd/imsqti_metadata_v2p1 '
+            'http://www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_metadata_v2p1p1.xsd">'),
+        (1, '<metadata>'),
+        (2, '<schema>QTIv2.1 Package</schema>'),
+        (2, '<schemaversion>1.0.0</schemaversion>'),
+        (2, '<lom:lom>'),
+        (3, '<lom:general>'),
+        (4, '<lom:identifier>'),
+        (5, '<lom:entry>{identifier_text}</lom:entry>'),
+        (4, '</lom:identifier>'),
+        (4, '<lom:title>'),
+        (5, '<lom:string>QTI 2.1 Package: {identifier_text}</lom:string>'),
+        (4, '</lom:title>'),
+        (3, '</lom:general>'),
+        (2, '</lom:lom>'),
+        (1, '</metadata>'),
+        (1, '<organizations>'),
+        (2, '<organization identifier="ORG-{identifier}">'),
+        (3, '<title>Test: {identifier_text}</title>'),
+        (3, '<item identifier="ITEMREF-{test_identifier}" identifierref="RESOURCE-{test_identifier}">'),
+        (4, '<title>Test: {identifier_text}</title>'),
+        (3, '</item>'),
+        (2, '</organization>'),
+        (1, '</organizations>'),
+        (1, '<resources>'),
+    ],
+    'item_resource_open': [
+        (2, '<resource type="imsqti_item_xmlv2p1" identifier="RESOURCE-{identifier}" href="{href}">'),
+        (3, '<metadata>'),
+        (4, '<qtiMetadata:qtiMetadata>'),
+        (5, '<qtiMetadata:interactionType>choiceInteraction</qtiMetadata:interactionType>'),
+        (4, '</qtiMetadata:qtiMetadata>'),
+        (3, '</metadata>'),
+    ],
+    'file': [
+        (3, '<file href="{href}"/>'),
+    ],
+    'resource_close': [
+        (2, '</resource>'),
+    ],
+    'test_resource_open': [
+        (2, '<resource type="imsqti_test_xmlv2p1" identifier="RESOURCE-{identifier}" href="{href}">'),
+        (3, '<metadata/>'),
+        (3, '<file href="{href}"/>'),
+    ],
+    'dependency': [
+        (3, '<dependency identifierref="RESOURCE-{identifier}"/>'),
+    ],
+    'tail': [
+        (2, '</resource>'),
+        (1, '</resources>'),
+        (0, '</manifest>'),
+    ],
+}
+
+_TEST_TEMPLATES = {
+    pretty_print: {name: _ByteTemplate(lines, pretty_print) for name, lines in _TEST_TEMPLATE_SEGMENTS.items()}
+    for pretty_print in (True, False)
+}
+_MANIFEST_TEMPLATES = {
+    pretty_print: {name: _ByteTemplate(lines, pretty_print) for name, lines in _MANIFEST_TEMPLATE_SEGMENTS.items()}
+    for pretty_print in (True, False)
+}
+
+
+def _flush(out, parts):
+    out.write(b''.join(parts))
+    parts.clear()
+
+
+def write_qti_test_xml(out, test_identifier, test_title, item_references, pretty_print=True, max_items_per_section=None):
+    """
+    Streams the assessmentTest document into a binary file object.
+
+    Takes the same arguments as create_qti_test_xml (plus out and pretty_print) and
+    writes the same bytes as serialize_xml(create_qti_test_xml(...), pretty_print).
+    item_references only needs to be iterable twice: once to count, once to write.
+    """
+    templates = _TEST_TEMPLATES[pretty_print]
+    identifier = escape_xml_attribute(test_identifier)
+    item_count = sum(1 for _ in item_references)
+    parts = [XML_DECLARATION]
+    templates['head'].render(parts, {
+        'identifier': identifier,
+        'title': escape_xml_attribute(test_title),
+        'item_count': str(item_count).encode('ascii'),
+    })
+    section_sizes = test_section_sizes(item_count, max_items_per_section)
+
+    def section_values(section_number):
+        return {
+            'identifier': identifier,
+            'section_number': f"{section_number:02d}".encode('ascii'),
+            'section_title': escape_xml_attribute(test_section_title(test_title, section_number, len(section_sizes))),
+        }
+
+    if not item_count:
+        templates['section_empty'].render(parts, section_values(1))
+    else:
+        section_number, section_end = 1, section_sizes[0]
+        templates['section_open'].render(parts, section_values(section_number))
+        for i, (item_identifier, item_ref_path) in enumerate(item_references, start=1):
+            if i > section_end:
+                templates['section_close'].render(parts)
+                section_number += 1
+                section_end += section_sizes[section_number - 1]
+                templates['section_open'].render(parts, section_values(section_number))
+            templates['item_ref'].render(parts, {
+                'identifier': escape_xml_attribute(item_identifier),
+                'href': escape_xml_attribute(item_ref_path),
+            })
+            if i % STREAM_WRITE_BATCH == 0:
+                _flush(out, parts)
+        templates['section_close'].render(parts)
+    templates['tail'].render(parts)
+    _flush(out, parts)
+
+
+def write_imsmanifest_xml_for_test_package(
+    out, package_identifier, test_identifier, test_filename_relative_path, item_references_for_manifest,
+    media_files=None, css_files=None, item_files=None, pretty_print=True
+):
+    """
+    Streams the imsmanifest.xml document into a binary file object.
+
+    Takes the same arguments as create_imsmanifest_xml_for_test_package (plus out and
+    pretty_print) and writes the same bytes as serializing the tree it builds.
+    item_references_for_manifest is iterated twice: for the item resources, then for
+    the test's dependencies.
+    """
+    templates = _MANIFEST_TEMPLATES[pretty_print]
+    item_files = item_files or {}
+    shared_files = [
+        escape_xml_attribute(path.replace(os.sep, '/')) for path in (media_files or []) + (css_files or [])
+    ]
+    test_identifier_attribute = escape_xml_attribute(test_identifier)
+    parts = [XML_DECLARATION]
+    templates['head'].render(parts, {
+        'identifier': escape_xml_attribute(package_identifier),
+        'identifier_text': escape_xml_text(package_identifier),
+        'test_identifier': test_identifier_attribute,
+    })
+    for i, (item_identifier, item_filename_relative_path) in enumerate(item_references_for_manifest, start=1):
+        href = escape_xml_attribute(item_filename_relative_path.replace(os.sep, '/'))
+        templates['item_resource_open'].render(parts, {'identifier': escape_xml_attribute(item_identifier), 'href': href})
+        own_files = [escape_xml_attribute(path.replace(os.sep, '/')) for path in item_files.get(item_identifier, ())]
+        for file_href in [href] + own_files + shared_files:
+            templates['file'].render(parts, {'href': file_href})
+        templates['resource_close'].render(parts)
+        if i % STREAM_WRITE_BATCH == 0:
+            _flush(out, parts)
+
+    templates['test_resource_open'].render(parts, {
+        'identifier': test_identifier_attribute,
+        'href': escape_xml_attribute(test_filename_relative_path.replace(os.sep, '/')),
+    })
+    for i, (item_identifier, _) in enumerate(item_references_for_manifest, start=1):
+        templates['dependency'].render(parts, {'identifier': escape_xml_attribute(item_identifier)})
+        if i % STREAM_WRITE_BATCH == 0:
+            _flush(out, parts)
+    for file_href in shared_files:
+        templates['file'].render(parts, {'href': file_href})
+    templates['tail'].render(parts)
+    _flush(out, parts)
+
+# --- Media Assets ---
+# Images are referenced from the stimulus, stem and option cells as [img:path] or
+# [img:path|alt text], with path relative to the media directory (--media-dir).
+# Every asset is stored in the package under a name derived from its content hash,
+# so an image used by many items is embedded once per package, and the same
+# diagram gets the same name in every package.
+
+MEDIA_REFERENCE_PATTERN = re.compile(r'\[img:([^\]|]+)(?:\|([^\]]*))?\]')
+
+# Resized images kept in the output directory, so reruns don't process them again
+MEDIA_CACHE_DIRNAME = ".qti_media_cache"
+
+# Pillow format per extension for the images --max-image-size may resize; other files are embedded as is
+RESIZABLE_IMAGE_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.webp': 'WEBP'}
+
+
+def split_media_references(text):
+    """Returns the [img:...] references in a cell's text as (reference, alt) pairs, in order."""
+    return [(reference, alt or "") for reference, alt in MEDIA_REFERENCE_PATTERN.findall(str(text))]
+
+
+def media_references(item):
+    """Yields the image references of a ValidatedItem's stimulus, stem and options (repeats included)."""
+    for text in [item.item_stimulus, item.question_text] + [option_text for _, option_text in item.options]:
+        for reference, _ in split_media_references(text):
+            yield reference
+
+
+class MediaAsset(NamedTuple):
+    """An image as stored in packages: its content-addressed path inside the zip and its bytes."""
+    archive_path: str
+    data: bytes
+
+
+class MediaLibrary:
+    """
+    Resolves image references to MediaAssets, hashing (and resizing) each file only
+    once per process.
+
+    With max_image_size, raster images larger than that many pixels on their longest
+    side are scaled down with Pillow and re-encoded in their own format. The results
+    are memoized in cache_dir under the hash of the source file, so later runs reuse
+    them without decoding the image again.
+    """
+
+    def __init__(self, source_dir, cache_dir=None, max_image_size=None, archive_dir="Media"):
+        self.source_dir = os.path.realpath(source_dir)
+        self.cache_dir = cache_dir
+        self.max_image_size = max_image_size
+        self.archive_dir = archive_dir
+        self._assets = {}
+
+    def resolve(self, reference):
+        path = os.path.realpath(os.path.join(self.source_dir, reference.strip()))
+        asset = self._assets.get(path)
+        if asset is None:
+            if os.path.commonpath([self.source_dir, path]) != self.source_dir:
+                raise ValueError(f"Image '{reference}' is outside the media directory '{self.source_dir}'.")
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Image '{reference}' not found in the media directory '{self.source_dir}'.")
+            with open(path, 'rb') as f:
+                data = f.read()
+            extension = os.path.splitext(path)[1].lower()
+            if self.max_image_size and extension in RESIZABLE_IMAGE_FORMATS:
+                data = self._resized(data, extension)
+            asset = MediaAsset(f"{self.archive_dir}/{hashlib.sha256(data).hexdigest()}{extension}", data)
+            self._assets[path] = asset
+            METRICS.incr("media_assets_resolved")
+        return asset
+
+    def _resized(self, data, extension):
+        cache_path = None
+        if self.cache_dir:
+            cache_path = os.path.join(
+                self.cache_dir, f"{hashlib.sha256(data).hexdigest()}-{self.max_image_size}{extension}"
+            )
+            if os.path.isfile(cache_path):
+                METRICS.incr("media_cache_hits")
+                with open(cache_path, 'rb') as f:
+                    return f.read()
+
+        from PIL import Image # Optional dependency, only needed for --max-image-size
+        with Image.open(io.BytesIO(data)) as image:
+            if max(image.size) > self.max_image_size:
+                image.thumbnail((self.max_image_size, self.max_image_size))
+                buffer = io.BytesIO()
+                image.save(buffer, format=RESIZABLE_IMAGE_FORMATS[extension])
+                data = buffer.getvalue()
+                METRICS.incr("images_resized")
+
+        if cache_path:
+            # Small images are memoized too, so they aren't decoded again either
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(f"{cache_path}.tmp", 'wb') as f:
+                f.write(data)
+            os.replace(f"{cache_path}.tmp", cache_path)
+        return data
+
+
+# One library per media setup and process, shared by every package built in that process
+_MEDIA_LIBRARIES = {}
+
+
+def get_media_library(source_dir, cache_dir=None, max_image_size=None):
+    key = (source_dir, cache_dir, max_image_size)
+    if key not in _MEDIA_LIBRARIES:
+        _MEDIA_LIBRARIES[key] = MediaLibrary(source_dir, cache_dir, max_image_size)
+    return _MEDIA_LIBRARIES[key]
+
+
+def package_media_library(output_base_dir, media_source_dir=None, max_image_size=None):
+    """The MediaLibrary for packages built into output_base_dir, or None without media_source_dir."""
+    if not media_source_dir:
+        return None
+    cache_dir = os.path.join(output_base_dir, MEDIA_CACHE_DIRNAME) if max_image_size and output_base_dir else None
+    return get_media_library(media_source_dir, cache_dir, max_image_size)
+
+
+def resolve_item_media(media_library, item, items_dir="Items"):
+    """
+    Resolves the item's images to their content-addressed paths in the package.
+
+    Returns:
+        tuple: (image_sources: reference -> path relative to items_dir, assets: path in
+        package -> bytes). Both are empty without a media library (text left as is).
+    """
+    image_sources = {}
+    assets = {}
+    if media_library:
+        for reference in media_references(item):
+            asset = media_library.resolve(reference)
+            assets[asset.archive_path] = asset.data
+            image_sources[reference] = posixpath.relpath(asset.archive_path, items_dir)
+    return image_sources, assets
+
+
+# --- Main Package Creation Logic (Grouped by Assessment Code) ---
+
+# Item serializers selectable for package generation
+ITEM_SERIALIZERS = ['lxml', 'template']
+
+
+def serialize_xml(xml_tree, pretty_print=True):
+    """Serializes an lxml tree to the UTF-8 bytes stored in the package."""
+    from lxml import etree
+
+    return etree.tostring(xml_tree, pretty_print=pretty_print, encoding='UTF-8', xml_declaration=True)
+
+
+@METRICS.timed("item_xml")
+def serialize_qti_item(item_identifier, item_title, item_stimulus, question_text, options, correct_answer_id,
+                       item_serializer='lxml', pretty_print=True, image_sources=None):
+    """Returns the item XML bytes, built with lxml or rendered from the precompiled template."""
+    if item_serializer == 'template':
+        return render_qti_item_xml(
+            item_identifier, item_title, item_stimulus, question_text, options, correct_answer_id, pretty_print,
+            image_sources
+        )
+    qti_xml_tree = create_qti_item_xml(
+        item_identifier, item_title, item_stimulus, question_text, options, correct_answer_id, image_sources
+    )
+    return serialize_xml(qti_xml_tree, pretty_print)
+
+
+class ItemXmlCache:
+    """
+    LRU cache of serialized item XML, shared by every package built in a process.
+
+    The same Item code often appears under several Assessment Codes. Its XML only
+    depends on the item's fields, its resolved image paths and the serializer
+    settings, so it is serialized once and every later package containing it
+    reuses the bytes. Entries are keyed by a hash of all of those (and
+    GENERATOR_VERSION) and evicted least recently used once max_bytes is exceeded.
+    With cache_dir the entries are also written there, so they survive evictions
+    and are shared by all worker processes and later runs.
+    """
+
+    def __init__(self, max_bytes=ITEM_CACHE_BYTES, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.size = 0
+        self.entries = OrderedDict() # key -> XML bytes, least recently used first
+        self.validated = set() # Keys whose XML passed schema validation in this process
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(item, item_title, image_sources, item_serializer, pretty_print):
+        payload = json.dumps([
+            GENERATOR_VERSION, item.item_identifier, item_title, item.item_stimulus, item.question_text, item.options,
+            item.correct_answer_id, sorted(image_sources.items()), item_serializer, pretty_print,
+        ], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.xml")
+
+    def get(self, key):
+        """The cached XML bytes of key, or None."""
+        data = self.entries.get(key)
+        if data is not None:
+            self.entries.move_to_end(key)
+            METRICS.incr("item_cache_hits")
+            return data
+        if self.cache_dir:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+            except OSError:
+                pass
+            else:
+                self._remember(key, data)
+                METRICS.incr("item_cache_hits")
+                return data
+        METRICS.incr("item_cache_misses")
+        return None
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if self.cache_dir:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Unique temp name: workers sharing the directory may write the same entry at once
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+    def _remember(self, key, data):
+        previous = self.entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        if len(data) > self.max_bytes:
+            return
+        self.entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.validated.discard(evicted_key)
+            METRICS.incr("item_cache_evictions")
+
+
+# One item XML cache per setup and process, shared by every package built in that process
+_ITEM_XML_CACHES = {}
+
+
+def get_item_xml_cache(max_bytes=ITEM_CACHE_BYTES, cache_dir=None):
+    key = (max_bytes, cache_dir)
+    if key not in _ITEM_XML_CACHES:
+        _ITEM_XML_CACHES[key] = ItemXmlCache(max_bytes, cache_dir)
+    return _ITEM_XML_CACHES[key]
+
+
+def check_schema_valid(schema_cache, document, name):
+    """
+    Validates a serialized XML document with a qti_schemas.SchemaCache; raises ValueError
+    if it is invalid. The serialized form is what gets validated because the builders
+    create unqualified elements: they only get their namespace from the default xmlns
+    declaration when written out.
+    """
+    with METRICS.time("schema"):
+        errors = schema_cache.validate(document)
+    METRICS.incr("documents_validated")
+    if errors:
+        METRICS.incr("documents_invalid")
+        more = f" (and {len(errors) - MAX_REPORTED_ERRORS} more)" if len(errors) > MAX_REPORTED_ERRORS else ""
+        raise ValueError(f"{name} is not valid against its schema: {'; '.join(errors[:MAX_REPORTED_ERRORS])}{more}")
+
+
+class InMemoryPackage(NamedTuple):
+    """A built package kept in memory instead of being written to the output directory."""
+    filename: str
+    data: bytes
+
+
+def _write_zip_entries(zf, entries, compression, compresslevel):
+    for arcname, data in entries:
+        # Fixed timestamps: identical input always gives a byte-identical zip
+        zip_info = ZipInfo(arcname, date_time=ZIP_ENTRY_DATE_TIME)
+        if arcname.endswith('/'):
+            zip_info.external_attr = (0o40755 << 16) | 0x10 # Directory flag, as make_archive wrote it
+            zf.writestr(zip_info, b'')
+        elif callable(data):
+            # A writer streaming the document into the entry (see --stream-xml)
+            zip_info.external_attr = 0o100644 << 16
+            zip_info.compress_type = compression
+            zip_info._compresslevel = compresslevel # What writestr sets from its compresslevel argument
+            with zf.open(zip_info, 'w') as entry:
+                data(entry)
+        else:
+            zip_info.external_attr = 0o100644 << 16
+            zf.writestr(zip_info, data, compress_type=compression, compresslevel=compresslevel)
+
+
+def write_package_zip(zip_filename, entries, compression=ZIP_DEFLATED, compresslevel=None):
+    """
+    Writes an in-memory QTI package straight into a zip archive.
+
+    Args:
+        zip_filename (str): Destination path of the zip.
+        entries (list of tuple): (archive_path, data) pairs in archive order. A path ending
+            in '/' with data None is written as a directory entry. data may also be a
+            callable taking a binary file object, which writes the entry's content.
+        compression (int): ZIP_DEFLATED or ZIP_STORED.
+        compresslevel (int): Optional deflate level (0-9); None uses zlib's default.
+    """
+    # Write next to the destination and swap in at the end so an interrupted run
+    # never leaves a truncated package behind
+    temp_zip_filename = f"{zip_filename}.tmp"
+    try:
+        with ZipFile(temp_zip_filename, 'w', compression=compression, compresslevel=compresslevel) as zf:
+            _write_zip_entries(zf, entries, compression, compresslevel)
+        os.replace(temp_zip_filename, zip_filename)
+        METRICS.incr("bytes_written", os.path.getsize(zip_filename))
+    finally:
+        if os.path.exists(temp_zip_filename):
+            os.remove(temp_zip_filename)
+
+
+def build_package_zip(entries, compression=ZIP_DEFLATED, compresslevel=None):
+    """Same as write_package_zip, but returns the zip as bytes instead of writing a file."""
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w', compression=compression, compresslevel=compresslevel) as zf:
+        _write_zip_entries(zf, entries, compression, compresslevel)
+    return buffer.getvalue()
+
+
+def create_qti_package_for_assessment(assessment_code, items, output_base_dir, compression=ZIP_DEFLATED, compresslevel=None,
+                                      rejected_messages=(), item_serializer='lxml', pretty_print=True, in_memory=False,
+                                      stream_xml=False, media_source_dir=None, max_image_size=None,
+                                      validate_schema=False, schema_dir=None, max_items_per_section=None,
+                                      item_cache_bytes=ITEM_CACHE_BYTES, item_cache_dir=None, item_xml=None):
+    """
+    Generates the QTI 2.1 package (items, test and manifest zipped together) for a
+    single Assessment Code group.
+
+    Args:
+        assessment_code (str): The group's Assessment Code.
+        items (list of ValidatedItem): Rows of the group that passed validate_exam_data.
+        output_base_dir (str): Directory the zip is written to.
+        compression, compresslevel: See write_package_zip.
+        rejected_messages (list of str): Skip messages for the group's rejected rows.
+        item_serializer (str): 'lxml' builds each item tree, 'template' renders it from the
+            precompiled byte template (same output, faster).
+        pretty_print (bool): Indent the XML documents; False writes them compact.
+        in_memory (bool): Return the zip as an InMemoryPackage instead of writing it to
+            output_base_dir (used to hand packages straight to an uploader).
+        stream_xml (bool): Write the test and manifest documents straight into their zip
+            entries with the streaming writers instead of building and serializing their
+            trees first (same bytes, flat memory use for very large groups).
+        media_source_dir (str): Directory the [img:...] references of the items are
+            resolved against (see MediaLibrary). Without it, references are left as text.
+        max_image_size (int): Scale down larger images to this many pixels (needs Pillow);
+            the results are memoized in output_base_dir/.qti_media_cache.
+        validate_schema (bool): Validate every item, test and manifest against the local
+            XSD mirror (see qti_schemas.py). Invalid items are skipped; an invalid test or
+            manifest fails the package. With stream_xml only the items are validated (the
+            test and manifest are never held in memory).
+        schema_dir (str): XSD mirror to validate against (default qti_schemas.default_schema_dir()).
+        max_items_per_section (int): Split the test into sections of at most this many items.
+        item_cache_bytes (int): Memory cap of the process's ItemXmlCache, which lets packages
+            sharing an item reuse its serialized XML; 0 serializes every item anew.
+        item_cache_dir (str): Also keep the ItemXmlCache entries in this directory.
+        item_xml (dict): Item XML bytes by item identifier, stored as they are instead of
+            serializing those items (see forms.py).
+
+    The XML documents are serialized in memory and written entry by entry into the
+    zip, so no intermediate files are created in the output directory.
+
+    Errors are reported and contained here so that one bad group never stops the
+    remaining groups from being processed.
+
+    Returns:
+        str | InMemoryPackage | None: Path of the created zip (or the package itself with
+        in_memory=True), or None if the group was skipped or failed.
+    """
+    # Sanitize the assessment code for use in filenames and identifiers
+    assessment_identifier = sanitize_identifier(assessment_code)
+    if not assessment_identifier or "unspecified_id" in assessment_identifier: # Check for the default identifier
+         print(f"  ⚠️ Skipping group with invalid or empty Assessment Code: '{assessment_code}' (Sanitized: {assessment_identifier})")
+         return None
+
+    try:
+        group_size = len(items) + len(rejected_messages)
+        print(f"\nProcessing Assessment Code: '{assessment_code}' (Sanitized: {assessment_identifier}) with {group_size} items.")
+
+        # --- Package layout (paths inside the zip) ---
+        items_dir = "Items"
+        tests_dir = "Tests"
+        media_dir = "Media"
+        # Add a directory for css if needed in the future
+        # css_dir = "CSS"
+        # Items are referenced from the tests directory; relpath is slow, so it's computed once
+        items_dir_from_test = posixpath.relpath(items_dir, tests_dir)
+
+        media_library = package_media_library(output_base_dir, media_source_dir, max_image_size)
+
+        item_entries = [] # (path in package, serialized item XML)
+        item_references_for_test = [] # To build the test XML (identifier, path from test dir)
+        item_references_for_manifest = [] # To build the manifest XML (identifier, path from package root)
+        item_media_files = {} # item identifier -> media paths from package root, for the manifest
+        schema_cache = get_schema_cache(schema_dir) if validate_schema else None
+        item_xml_cache = get_item_xml_cache(item_cache_bytes, item_cache_dir) if item_cache_bytes else None
+        media_entries = {} # media path in package -> bytes; each asset stored once per package
+
+        # --- Generate QTI Item XMLs for all items in this group ---
+        print("  Generating item XMLs...")
+        for message in rejected_messages:
+            print(f"    ⚠️ {message}")
+
+        for item in items:
+             try:
+                item_title = f"Item: {item.item_code}" # Use raw code for title if preferred
+
+                # Define item XML path relative to package root
+                item_xml_filename = f"item_{item.item_identifier}.xml" # Use sanitized ID in filename
+                item_xml_path_in_package = posixpath.join(items_dir, item_xml_filename)
+
+                image_sources, item_assets = resolve_item_media(media_library, item, items_dir)
+
+                # Generate QTI Item XML, unless it was handed in or another package of this run already did
+                item_xml_bytes = item_xml.get(item.item_identifier) if item_xml else None
+                cache_key = None # Only set for items looked up in the item cache
+                if item_xml_bytes is None and item_xml_cache is not None:
+                    cache_key = item_xml_cache.key(item, item_title, image_sources, item_serializer, pretty_print)
+                    item_xml_bytes = item_xml_cache.get(cache_key)
+                if item_xml_bytes is None:
+                    item_xml_bytes = serialize_qti_item(
+                        item.item_identifier, item_title, item.item_stimulus, item.question_text, item.options,
+                        item.correct_answer_id, item_serializer=item_serializer, pretty_print=pretty_print,
+                        image_sources=image_sources
+                    )
+                    if cache_key is not None:
+                        item_xml_cache.put(cache_key, item_xml_bytes)
+                if schema_cache and (cache_key is None or cache_key not in item_xml_cache.validated):
+                    check_schema_valid(schema_cache, item_xml_bytes, f"Item '{item.item_code}'")
+                    if cache_key is not None:
+                        item_xml_cache.validated.add(cache_key)
+                item_entries.append((item_xml_path_in_package, item_xml_bytes))
+                if item_assets:
+                    item_media_files[item.item_identifier] = list(item_assets)
+                    for archive_path, data in item_assets.items():
+                        media_entries.setdefault(archive_path, data)
+
+                # Calculate relative path from the tests directory to this item XML
+                item_ref_path_from_test = posixpath.join(items_dir_from_test, item_xml_filename)
+
+                # Store info for test and manifest
+                item_references_for_test.append((item.item_identifier, item_ref_path_from_test))
+                item_references_for_manifest.append((item.item_identifier, item_xml_path_in_package))
+                # print(f"    ✅ Generated item: {item.item_identifier}") # Keep this quieter
+
+             except Exception as e:
+                 print(f"    ❌ Error processing item row {item.row_number} ('{item.item_code}'): {e}", file=sys.stderr)
+                 # Continue processing other items in the group
+
+        # --- Check if any valid items were processed ---
+        if not item_references_for_test:
+             print(f"  Skipping test and package generation for Assessment Code '{assessment_code}' - No valid items found.")
+             return None # Move on to the next assessment code group
+
+        # --- Generate QTI Test XML for this group ---
+        print(f"  Generating test XML for {len(item_references_for_test)} items...")
+        test_identifier = f"{assessment_identifier}_Test" # Use assessment ID for test ID
+        test_title = f"Test for Assessment Code: {assessment_code}" # Use raw code for title
+
+        test_qti_filename = f"test_{test_identifier}.xml" # Use sanitized test ID in filename
+        test_xml_path_in_package = posixpath.join(tests_dir, test_qti_filename)
+
+        if stream_xml:
+            # Written later, while the zip is created (so the archive time includes it)
+            def test_xml_bytes(out):
+                with METRICS.time("test_xml"):
+                    write_qti_test_xml(
+                        out, test_identifier, test_title, item_references_for_test, pretty_print, max_items_per_section
+                    )
+        else:
+            with METRICS.time("test_xml"):
+                test_xml_tree = create_qti_test_xml(
+                    test_identifier, test_title, item_references_for_test, max_items_per_section
+                )
+                test_xml_bytes = serialize_xml(test_xml_tree, pretty_print)
+            if schema_cache:
+                check_schema_valid(schema_cache, test_xml_bytes, f"Test '{test_identifier}'")
+        print(f"    ✅ Generated test: {test_identifier}")
+
+        # --- Generate imsmanifest.xml for the package ---
+        print("  Generating manifest XML...")
+
+        # Media files are listed in the resources of the items that use them
+        if stream_xml:
+            def manifest_xml_bytes(out):
+                with METRICS.time("manifest"):
+                    write_imsmanifest_xml_for_test_package(
+                        out, assessment_identifier, test_identifier, test_xml_path_in_package,
+                        item_references_for_manifest, item_files=item_media_files, pretty_print=pretty_print
+                    )
+        else:
+            with METRICS.time("manifest"):
+                imsmanifest_xml_tree = create_imsmanifest_xml_for_test_package(
+                    package_identifier=assessment_identifier, # Use assessment_identifier as the main package ID
+                    test_identifier=test_identifier,
+                    test_filename_relative_path=test_xml_path_in_package, # Path relative to package root
+                    item_references_for_manifest=item_references_for_manifest,
+                    item_files=item_media_files
+                )
+                manifest_xml_bytes = serialize_xml(imsmanifest_xml_tree, pretty_print)
+            if schema_cache:
+                check_schema_valid(schema_cache, manifest_xml_bytes, "imsmanifest.xml")
+        print(f"    ✅ Generated manifest.")
+
+        # --- Create ZIP File for the entire package ---
+        print(f"  Creating package ZIP: {assessment_identifier}.zip...")
+        # Same archive layout as zipping the package directory: folders, manifest, test, items
+        package_entries = [
+            (f"{items_dir}/", None),
+            (f"{tests_dir}/", None),
+        ] + ([(f"{media_dir}/", None)] if media_entries else []) + [
+            ("imsmanifest.xml", manifest_xml_bytes),
+            (test_xml_path_in_package, test_xml_bytes),
+        ] + item_entries + list(media_entries.items())
+        METRICS.incr("items_built", len(item_entries))
+        METRICS.incr("media_files_embedded", len(media_entries))
+        METRICS.incr("packages_built")
+        if in_memory:
+            with METRICS.time("archive"):
+                zip_bytes = build_package_zip(package_entries, compression=compression, compresslevel=compresslevel)
+            print(f"  ✅ Successfully created package: {assessment_identifier}.zip ({len(zip_bytes)} bytes, in memory)")
+            return InMemoryPackage(f"{assessment_identifier}.zip", zip_bytes)
+        zip_filename = os.path.join(output_base_dir, f"{assessment_identifier}.zip")
+        with METRICS.time("archive"):
+            write_package_zip(zip_filename, package_entries, compression=compression, compresslevel=compresslevel)
+        print(f"  ✅ Successfully created package: {assessment_identifier}.zip")
+        return zip_filename
+
+    except KeyError as ke:
+         # This error indicates a missing column, which should ideally be caught earlier by read_exam_data,
+         # but good to have a fallback.
+        print(f"  ❌ Error: Missing expected column '{ke}' while processing group '{assessment_code}'.")
+        METRICS.incr("packages_failed")
+    except Exception as e:
+        print(f"  ❌ An unexpected error occurred while processing Assessment Code '{assessment_code}': {e}", file=sys.stderr)
+        METRICS.incr("packages_failed")
+        # Optionally print traceback for debugging
+        # import traceback
+        # traceback.print_exc()
+
+
+class _CapturedStream(io.TextIOBase):
+    """Text stream that records writes as (stream_name, text) chunks in a shared list."""
+
+    def __init__(self, chunks, name):
+        self.chunks = chunks
+        self.name = name
+
+    def write(self, text):
+        self.chunks.append((self.name, text))
+        return len(text)
+
+
+def _replay_output(chunks, quiet=False):
+    """Writes captured output; quiet keeps only stderr (errors)."""
+    for name, text in chunks:
+        if not quiet or name == "stderr":
+            getattr(sys, name).write(text)
+
+
+def _create_package_captured(group, output_base_dir, package_options):
+    """Builds one package and returns its buffered console output."""
+    chunks = []
+    with contextlib.redirect_stdout(_CapturedStream(chunks, "stdout")), \
+            contextlib.redirect_stderr(_CapturedStream(chunks, "stderr")):
+        zip_path = _create_package_for_group(group, output_base_dir, package_options)
+    return zip_path, chunks
+
+
+def _create_package_in_worker(group, output_base_dir, package_options):
+    """Process pool entry point: _create_package_captured plus the metrics recorded for this group."""
+    zip_path, chunks = _create_package_captured(group, output_base_dir, package_options)
+    # Each task hands back only its own numbers; the worker process is reused
+    return zip_path, chunks, METRICS.drain()
+
+
+def _create_package_for_group(group, output_base_dir, package_options):
+    return create_qti_package_for_assessment(
+        group.assessment_code, group.items, output_base_dir, rejected_messages=group.rejected_messages, **package_options
+    )
+
+
+class BuildCache:
+    """
+    Content-hash cache for incremental builds, persisted as JSON in the output directory.
+
+    A group's key hashes GENERATOR_VERSION, the options that change the zip bytes and
+    the group's normalized rows (its ValidatedItems). A group is skipped when its key
+    matches the last successful build and that zip is still on disk with the same size.
+    """
+
+    def __init__(self, output_base_dir, package_options):
+        self.path = os.path.join(output_base_dir, BUILD_CACHE_FILENAME)
+        # item_serializer and stream_xml are left out on purpose: both ways write the same bytes
+        self.options_key = [
+            GENERATOR_VERSION,
+            package_options.get("compression"),
+            package_options.get("compresslevel"),
+            package_options.get("pretty_print", True),
+        ]
+        if package_options.get("max_items_per_section"):
+            self.options_key.append(["max_items_per_section", package_options["max_items_per_section"]])
+        self.media_source_dir = package_options.get("media_source_dir")
+        if self.media_source_dir:
+            # Only added with media, so the keys of existing caches stay valid
+            self.options_key += [os.path.abspath(self.media_source_dir), package_options.get("max_image_size")]
+        self.packages = {}
+        self._group_keys = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self.packages = json.load(f).get("packages", {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable build cache '{self.path}': {e}")
+
+    def group_key(self, group):
+        # Row numbers are left out so inserting rows elsewhere in the file doesn't invalidate a group
+        normalized_rows = [list(item[1:]) for item in group.items]
+        key_parts = [self.options_key, group.assessment_code, normalized_rows]
+        if self.media_source_dir:
+            # Replacing an image file must rebuild the groups that use it
+            key_parts.append([
+                [reference, self._file_signature(os.path.join(self.media_source_dir, reference.strip()))]
+                for item in group.items for reference in media_references(item)
+            ])
+        payload = json.dumps(key_parts, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _file_signature(path):
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            return None
+        return [file_stat.st_size, file_stat.st_mtime_ns]
+
+    def is_unchanged(self, group, output_base_dir):
+        """True if the group's zip from a previous run is still valid. Remembers the key for record()."""
+        key = self.group_key(group)
+        self._group_keys[group.assessment_code] = key
+        entry = self.packages.get(group.assessment_code)
+        if not entry or entry.get("hash") != key:
+            return False
+        zip_path = os.path.join(output_base_dir, entry["zip"])
+        return os.path.isfile(zip_path) and os.path.getsize(zip_path) == entry.get("size")
+
+    def print_skip(self, group):
+        print(f"\n⏭️  Skipping Assessment Code '{group.assessment_code}' - unchanged since last build ({self.packages[group.assessment_code]['zip']}).")
+
+    def record(self, group, zip_path):
+        """Stores the key of a group that was just built (or forgets it if the build failed)."""
+        key = self._group_keys.pop(group.assessment_code, None)
+        if zip_path and key:
+            self.packages[group.assessment_code] = {
+                "hash": key, "zip": os.path.basename(zip_path), "size": os.path.getsize(zip_path)
+            }
+        else:
+            self.packages.pop(group.assessment_code, None)
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"generator_version": GENERATOR_VERSION, "packages": self.packages}, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+def _create_packages_in_process_pool(assessment_groups, output_base_dir, workers, package_options, build_cache=None,
+                                     on_package=None, quiet=False):
+    """
+    Builds every group in a process pool, replaying each group's output in group order.
+
+    Only a small window of groups is submitted ahead of the one being reported, so a
+    lazily produced group iterator (see stream_assessment_groups) is never drained
+    into memory all at once.
+    """
+    group_count = 0
+    pending = deque()
+
+    def report_oldest():
+        group, future = pending.popleft()
+        if future is None:
+            if not quiet:
+                build_cache.print_skip(group)
+            return
+        try:
+            zip_path, chunks, worker_metrics = future.result()
+            METRICS.merge(worker_metrics)
+            # Quiet runs still show everything about a group that failed
+            _replay_output(chunks, quiet=quiet and zip_path is not None)
+        except Exception as e:
+            # Only reached if the worker itself died (e.g. killed or unpicklable data)
+            zip_path = None
+            print(f"  ❌ An unexpected error occurred while processing Assessment Code '{group.assessment_code}': {e}", file=sys.stderr)
+        if build_cache is not None:
+            build_cache.record(group, zip_path)
+        if on_package is not None:
+            on_package(group, zip_path)
+
+    # Forked workers start with a copy of this process's metrics; clear it so nothing is counted twice
+    with ProcessPoolExecutor(max_workers=workers, initializer=METRICS.reset) as executor:
+        for group in assessment_groups:
+            group_count += 1
+            if build_cache is not None and build_cache.is_unchanged(group, output_base_dir):
+                pending.append((group, None))
+            else:
+                pending.append((group, executor.submit(_create_package_in_worker, group, output_base_dir, package_options)))
+            if len(pending) >= workers * 2:
+                report_oldest()
+        while pending:
+            report_oldest()
+    return group_count
+
+
+def _create_packages(assessment_groups, output_base_dir, workers, package_options, incremental=False, on_package=None,
+                     quiet=False):
+    """
+    Builds a package per AssessmentGroup. Returns the number of groups seen.
+
+    With incremental=True, groups whose content hash matches the build cache in
+    output_base_dir are skipped (see BuildCache). on_package(group, result) is called
+    in group order with each built group's create_qti_package_for_assessment result.
+    With quiet=True the per-group progress lines are dropped; errors and the output
+    of groups that produced no package are still shown.
+    """
+    build_cache = BuildCache(output_base_dir, package_options) if incremental else None
+    try:
+        if workers and workers > 1:
+            return _create_packages_in_process_pool(
+                assessment_groups, output_base_dir, workers, package_options, build_cache, on_package, quiet
+            )
+        group_count = 0
+        for group in assessment_groups:
+            group_count += 1
+            if build_cache is not None and build_cache.is_unchanged(group, output_base_dir):
+                if not quiet:
+                    build_cache.print_skip(group)
+                continue
+            if quiet:
+                # Errors go to stderr and are never held back
+                with quiet_stdout() as quiet_output:
+                    with quiet_output.hold() as held:
+                        zip_path = _create_package_for_group(group, output_base_dir, package_options)
+                    if zip_path is None:
+                        quiet_output.release(held)
+            else:
+                zip_path = _create_package_for_group(group, output_base_dir, package_options)
+            if build_cache is not None:
+                build_cache.record(group, zip_path)
+            if on_package is not None:
+                on_package(group, zip_path)
+        return group_count
+    finally:
+        # Saved even if the run is interrupted, so finished packages aren't rebuilt next time
+        if build_cache is not None:
+            build_cache.save()
+
+
+# --- Sharding Oversized Assessments ---
+# Groups over --max-items-per-package or --max-package-mb are split, in item order,
+# into consecutive packages <code>_part01, <code>_part02, ... Each part is a complete
+# package (its own test and manifest, only its own items and images).
+
+# Estimated bytes an item adds beyond its text: item XML markup, manifest resource,
+# test reference and zip entry headers
+ITEM_OVERHEAD_BYTES = 2048
+# Estimated bytes per package beyond its items: manifest and test markup, directory entries
+PACKAGE_OVERHEAD_BYTES = 4096
+# Estimated bytes of an <img> element in place of its [img:...] reference
+IMAGE_REFERENCE_BYTES = 128
+# Characters XML escaping lengthens (to &amp; &lt; &gt; &quot; &#10; &#13; &#9;), by 5 bytes at most
+_ESCAPED_CHARACTERS = re.compile('[&<>"\n\r\t]')
+
+
+def _escaped_bytes_bound(value):
+    """
+    Upper bound of the UTF-8 size of a value once escaped for XML. Unlike escape_xml_text
+    it never raises, so text that isn't XML compatible is rejected by the item's own build.
+    """
+    text = str(value)
+    return len(text.encode('utf-8', 'replace')) + 5 * len(_ESCAPED_CHARACTERS.findall(text))
+
+
+def estimate_item_bytes(item):
+    """Upper-bound estimate of the uncompressed bytes an item adds to its package, images excluded."""
+    size = ITEM_OVERHEAD_BYTES + 8 * len(item.item_identifier.encode('utf-8')) + _escaped_bytes_bound(item.item_code)
+    for text in [item.item_stimulus, item.question_text] + [option_text for _, option_text in item.options]:
+        size += _escaped_bytes_bound(text)
+    return size
+
+
+def _item_image_sizes(item, media_source_dir):
+    """Referenced image path -> file size (0 if missing) for an item, for estimating package sizes."""
+    sizes = {}
+    for reference in media_references(item):
+        path = os.path.join(media_source_dir, reference.strip())
+        sizes[path] = os.path.getsize(path) if os.path.isfile(path) else 0
+    return sizes
+
+
+def shard_assessment_group(group, max_items_per_package=None, max_package_bytes=None, media_source_dir=None,
+                           quiet=False):
+    """
+    Splits an AssessmentGroup into parts within the limits; returns [group] if it fits.
+
+    Sizes are estimated before anything is serialized (see estimate_item_bytes), counting
+    each image once per part at its source size, so a part's zip stays below
+    max_package_bytes. An item too large on its own gets a part of its own. The
+    group's rejected-row messages go with the first part.
+    """
+    if not max_items_per_package and not max_package_bytes:
+        return [group]
+    parts = []
+    current, current_bytes, current_images = [], PACKAGE_OVERHEAD_BYTES, set()
+    for item in group.items:
+        item_bytes = estimate_item_bytes(item)
+        image_sizes = {}
+        if media_source_dir:
+            image_sizes = _item_image_sizes(item, media_source_dir)
+            item_bytes += IMAGE_REFERENCE_BYTES * len(image_sizes)
+        new_image_bytes = sum(size for path, size in image_sizes.items() if path not in current_images)
+        too_many = max_items_per_package and len(current) >= max_items_per_package
+        too_big = max_package_bytes and current and current_bytes + item_bytes + new_image_bytes > max_package_bytes
+        if too_many or too_big:
+            parts.append(current)
+            current, current_bytes, current_images = [], PACKAGE_OVERHEAD_BYTES, set()
+            new_image_bytes = sum(image_sizes.values())
+        current.append(item)
+        current_bytes += item_bytes + new_image_bytes
+        current_images.update(image_sizes)
+    parts.append(current)
+    if len(parts) == 1:
+        return [group]
+
+    width = max(2, len(str(len(parts))))
+    METRICS.incr("groups_sharded")
+    if not quiet:
+        print(f"\n✂️  Splitting Assessment Code '{group.assessment_code}' ({len(group.items)} items) into {len(parts)} packages.")
+    return [
+        AssessmentGroup(f"{group.assessment_code}_part{number:0{width}d}", items,
+                        group.rejected_messages if number == 1 else [])
+        for number, items in enumerate(parts, start=1)
+    ]
+
+
+class PartCodeCheck:
+    """
+    Checks that no part of a split assessment gets the code of another group of the
+    run, which would overwrite its zip or reuse its identifiers. Codes are compared
+    sanitized, as they are used in file names and identifiers.
+    """
+
+    def __init__(self):
+        self.group_codes = {}
+        self.part_codes = {}
+
+    def add(self, group, parts):
+        """Records a group and its parts (from shard_assessment_group). Raises ValueError on a clash."""
+        group_key = sanitize_identifier(group.assessment_code)
+        if group_key in self.part_codes:
+            raise ValueError(
+                f"Assessment Code '{group.assessment_code}' is also the name of a part of split assessment "
+                f"'{self.part_codes[group_key]}'. Rename it or change --max-items-per-package/--max-package-mb."
+            )
+        self.group_codes[group_key] = group.assessment_code
+        if len(parts) == 1:
+            return
+        for part in parts:
+            part_key = sanitize_identifier(part.assessment_code)
+            if part_key in self.group_codes:
+                raise ValueError(
+                    f"Part '{part.assessment_code}' of split assessment '{group.assessment_code}' would replace "
+                    f"Assessment Code '{self.group_codes[part_key]}'. Rename it or change "
+                    "--max-items-per-package/--max-package-mb."
+                )
+            self.part_codes[part_key] = group.assessment_code
+
+
+def shard_assessment_groups(assessment_groups, max_items_per_package=None, max_package_bytes=None, media_source_dir=None,
+                            quiet=False):
+    """
+    Lazily applies shard_assessment_group to every group of an iterable. Raises
+    ValueError, before yielding the group concerned, when a part code clashes with
+    another group's (see PartCodeCheck).
+    """
+    check = PartCodeCheck()
+    for group in assessment_groups:
+        parts = shard_assessment_group(group, max_items_per_package, max_package_bytes, media_source_dir, quiet)
+        if max_items_per_package or max_package_bytes:
+            check.add(group, parts)
+        yield from parts
+
+
+def write_rejected_rows_report(rejected_rows, report_path):
+    """Writes the rejected-rows report (see validate_exam_data) as CSV."""
+    rejected_rows.to_csv(report_path, index=False)
+    print(f"Rejected rows report ({len(rejected_rows)} rows) written to: '{os.path.abspath(report_path)}'")
+
+
+def create_qti_packages_from_groups(assessment_groups, output_base_dir="qti_grouped_packages_generated", workers=1,
+                                    compression=ZIP_DEFLATED, compresslevel=None, item_serializer='lxml',
+                                    pretty_print=True, incremental=False, in_memory=False, on_package=None, quiet=False,
+                                    stream_xml=False, media_source_dir=None, max_image_size=None, validate_schema=False,
+                                    schema_dir=None, max_items_per_section=None, max_items_per_package=None,
+                                    max_package_bytes=None, item_cache_bytes=ITEM_CACHE_BYTES,
+                                    item_cache_dir=None):
+    """
+    Builds a package per AssessmentGroup of an iterable of already validated groups,
+    from any number of inputs, in one worker pool. Returns the number of groups seen.
+
+    The options work as in create_qti_packages_by_assessment_code, which (like
+    create_qti_packages_from_stream and batch.py) hands its groups to this function.
+    """
+    if in_memory and incremental:
+        raise ValueError("Incremental builds need the zips on disk and can't be combined with in_memory.")
+    if validate_schema:
+        check_schema_mirror(schema_dir) # Fails the run here instead of every package
+    package_options = {
+        "compression": compression,
+        "compresslevel": compresslevel,
+        "item_serializer": item_serializer,
+        "pretty_print": pretty_print,
+        "in_memory": in_memory,
+        "stream_xml": stream_xml,
+        "media_source_dir": media_source_dir,
+        "max_image_size": max_image_size,
+        "validate_schema": validate_schema,
+        "schema_dir": schema_dir,
+        "max_items_per_section": max_items_per_section,
+        "item_cache_bytes": item_cache_bytes,
+        "item_cache_dir": item_cache_dir,
+    }
+    assessment_groups = shard_assessment_groups(
+        assessment_groups, max_items_per_package, max_package_bytes, media_source_dir, quiet
+    )
+    return _create_packages(assessment_groups, output_base_dir, workers, package_options, incremental, on_package, quiet)
+
+
+def create_qti_packages_by_assessment_code(input_df, output_base_dir="qti_grouped_packages_generated", workers=1,
+                                           compression=ZIP_DEFLATED, compresslevel=None, rejected_report_path=None,
+                                           item_serializer='lxml', pretty_print=True, incremental=False,
+                                           in_memory=False, on_package=None, quiet=False, stream_xml=False,
+                                           media_source_dir=None, max_image_size=None, validate_schema=False,
+                                           schema_dir=None, max_items_per_section=None, max_items_per_package=None,
+                                           max_package_bytes=None, item_cache_bytes=ITEM_CACHE_BYTES,
+                                           item_cache_dir=None):
+    """
+    Reads an Excel DataFrame, groups items by 'Assessment Code', and generates
+    a QTI 2.1 package for each Assessment Code containing all its items and a test.
+
+    All rows are validated in one vectorized pass (validate_exam_data) before any XML
+    is built; the optional rejected_report_path receives the rejected rows as CSV.
+
+    With workers > 1 the groups are built in a process pool. Each group's output is
+    buffered in its worker and replayed here in group order, so the console output
+    matches the serial run.
+
+    compression/compresslevel control how zip entries are stored (see write_package_zip);
+    item_serializer, pretty_print, stream_xml, media_source_dir, max_image_size, validate_schema,
+    schema_dir, max_items_per_section, item_cache_bytes and item_cache_dir are passed on to
+    create_qti_package_for_assessment.
+    Groups over max_items_per_package items or max_package_bytes (estimated) are split
+    into several packages (see shard_assessment_group).
+    With incremental=True, assessments unchanged since the last build into the same
+    output directory are skipped (see BuildCache).
+
+    With in_memory=True no zips are written: each package is built as an InMemoryPackage
+    and passed to on_package(group, package) as soon as it is ready (None for groups
+    that produced no package). on_package may block to apply backpressure.
+
+    quiet=True drops the per-group progress lines (see _create_packages).
+    """
+    if in_memory and incremental:
+        raise ValueError("Incremental builds need the zips on disk and can't be combined with in_memory.")
+    if not os.path.exists(output_base_dir):
+        os.makedirs(output_base_dir)
+
+    print(f"Generating QTI Packages Grouped by Assessment Code in: '{os.path.abspath(output_base_dir)}'")
+
+    # Group the DataFrame by 'Assessment Code'
+    grouped_by_assessment = input_df.groupby('Assessment Code')
+
+    if grouped_by_assessment.ngroups == 0:
+        print("No groups found in the DataFrame. Is the 'Assessment Code' column present and populated?")
+        return
+
+    validation = validate_exam_data(input_df)
+    if rejected_report_path:
+        write_rejected_rows_report(validation.rejected_rows, rejected_report_path)
+
+    create_qti_packages_from_groups(
+        group_validated_items(validation, grouped_by_assessment), output_base_dir, workers, compression=compression,
+        compresslevel=compresslevel, item_serializer=item_serializer, pretty_print=pretty_print, incremental=incremental, in_memory=in_memory,
+        on_package=on_package, quiet=quiet, stream_xml=stream_xml, media_source_dir=media_source_dir,
+        max_image_size=max_image_size, validate_schema=validate_schema, schema_dir=schema_dir,
+        max_items_per_section=max_items_per_section, max_items_per_package=max_items_per_package,
+        max_package_bytes=max_package_bytes, item_cache_bytes=item_cache_bytes, item_cache_dir=item_cache_dir
+    )
+
+    print("\nFinished processing all Assessment Codes.")
+
+
+def create_qti_packages_from_stream(file_path, output_base_dir="qti_grouped_packages_generated", workers=1,
+                                    compression=ZIP_DEFLATED, compresslevel=None, rejected_report_path=None,
+                                    item_serializer='lxml', pretty_print=True, incremental=False,
+                                    in_memory=False, on_package=None, quiet=False, stream_xml=False,
+                                    media_source_dir=None, max_image_size=None, validate_schema=False,
+                                    schema_dir=None, max_items_per_section=None, max_items_per_package=None,
+                                    max_package_bytes=None, item_cache_bytes=ITEM_CACHE_BYTES,
+                                    item_cache_dir=None):
+    """
+    Streaming counterpart of read_exam_data + create_qti_packages_by_assessment_code.
+
+    Rows are read with stream_assessment_groups, so only the groups that are still
+    being collected are held in memory, and each group is validated as it completes.
+    Packages are produced in the order their groups complete in the file rather than
+    sorted by Assessment Code. in_memory, on_package, quiet and the sharding limits work
+    as in create_qti_packages_by_assessment_code.
+    """
+    import pandas as pd
+
+    if in_memory and incremental:
+        raise ValueError("Incremental builds need the zips on disk and can't be combined with in_memory.")
+    with METRICS.time("read"): # The first pass over the file (counting rows per code)
+        record_groups = stream_assessment_groups(file_path)
+
+    if not os.path.exists(output_base_dir):
+        os.makedirs(output_base_dir)
+
+    print(f"Generating QTI Packages Grouped by Assessment Code in: '{os.path.abspath(output_base_dir)}'")
+
+    rejected_reports = []
+
+    def validated_groups():
+        while True:
+            # Reading is interleaved with building, so time each step of the reader on its own
+            with METRICS.time("read"):
+                next_group = next(record_groups, None)
+            if next_group is None:
+                return
+            assessment_code, item_records = next_group
+            validation = validate_exam_data(item_records_to_frame(item_records))
+            if rejected_report_path:
+                rejected_reports.append(validation.rejected_rows)
+            yield AssessmentGroup(
+                assessment_code,
+                [item for item in validation.items if item is not None],
+                [message for message in validation.rejected_messages if message is not None],
+            )
+
+    group_count = create_qti_packages_from_groups(
+        validated_groups(), output_base_dir, workers, compression=compression, compresslevel=compresslevel,
+        item_serializer=item_serializer, pretty_print=pretty_print, incremental=incremental, in_memory=in_memory,
+        on_package=on_package, quiet=quiet, stream_xml=stream_xml, media_source_dir=media_source_dir,
+        max_image_size=max_image_size, validate_schema=validate_schema, schema_dir=schema_dir,
+        max_items_per_section=max_items_per_section, max_items_per_package=max_items_per_package,
+        max_package_bytes=max_package_bytes, item_cache_bytes=item_cache_bytes, item_cache_dir=item_cache_dir
+    )
+
+    if rejected_report_path:
+        rejected_rows = pd.concat(rejected_reports) if rejected_reports else _empty_rejected_rows()
+        write_rejected_rows_report(rejected_rows.sort_values('Row'), rejected_report_path)
+
+    if group_count == 0:
+        print("No groups found in the input file. Is the 'Assessment Code' column present and populated?")
+        return
+
+    print("\nFinished processing all Assessment Codes.")
+
+
+# --- Input Reading ---
+
+EXPECTED_COLUMNS = [
+    'Item code', 'Assessment Code', 'Difficulty Level', 'Bloom\'s Taxonomy',
+    'Action Words', 'Item Stimulus', 'Item Stem', 'Option A',
+    'Rationale for Option A', 'Option B', 'Rationale for Option B',
+    'Option C', 'Rationale for Option C', 'Option D',
+    'Rationale for Option D', 'Correct Answer'
+]
+
+
+class ItemRecord(NamedTuple):
+    """The fields of one input row that package generation needs."""
+    row_number: int # Spreadsheet row number (header is row 1)
+    item_code: object
+    assessment_code: str
+    item_stimulus: object
+    item_stem: object
+    option_a: object
+    option_b: object
+    option_c: object
+    option_d: object
+    correct_answer: object
+
+
+# ItemRecord field -> expected input column (row_number and assessment_code are derived)
+ITEM_RECORD_COLUMNS = {
+    'item_code': 'Item code',
+    'item_stimulus': 'Item Stimulus',
+    'item_stem': 'Item Stem',
+    'option_a': 'Option A',
+    'option_b': 'Option B',
+    'option_c': 'Option C',
+    'option_d': 'Option D',
+    'correct_answer': 'Correct Answer',
+}
+
+
+def map_expected_columns(columns, file_path):
+    """
+    Matches the expected columns case-insensitively against the columns of the input.
+
+    Returns:
+        list: The actual column names, in EXPECTED_COLUMNS order.
+    Raises:
+        ValueError: If any expected column is missing.
+    """
+    # Create a mapping of lowercased column names to actual column names
+    col_map = {str(col).lower(): col for col in columns} # Ensure column names are strings
+    missing_columns = [col for col in EXPECTED_COLUMNS if col.lower() not in col_map]
+
+    if missing_columns:
+        raise ValueError(
+            f"The file '{file_path}' is missing expected columns: {missing_columns}. "
+            f"Please ensure the following columns exist: {EXPECTED_COLUMNS}"
+        )
+
+    return [col_map[col.lower()] for col in EXPECTED_COLUMNS]
+
+
+def clean_assessment_code(value):
+    """Same cleanup read_exam_data applies to the 'Assessment Code' column, for a single value."""
+    code = str(value)
+    return '' if code == 'nan' else code.strip()
+
+
+def item_records_to_frame(item_records):
+    """
+    Builds a DataFrame with the expected column names (indexed like read_exam_data) from
+    ItemRecords. The cells are kept as they are (object columns): they were already
+    typed over the whole file (see stream_assessment_groups), and pandas would type the
+    few rows of a group differently.
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame(list(item_records), columns=ItemRecord._fields, dtype=object)
+    frame.index = pd.Index(frame.pop('row_number').to_numpy(dtype='int64') - 2)
+    return frame.rename(columns={'assessment_code': 'Assessment Code', **ITEM_RECORD_COLUMNS})
+
+
+def _records_from_rows(rows, positions, converters):
+    """
+    Turns (row_number, values) tuples into ItemRecords. positions are the header positions
+    of the Assessment Code and the ITEM_RECORD_COLUMNS; converters type their cells.
+    """
+    for row_number, values in rows:
+        assessment_code, item_code, *fields = (convert(values[pos]) for pos, convert in zip(positions, converters))
+        yield ItemRecord(row_number, item_code, clean_assessment_code(assessment_code), *fields)
+
+
+# Cell strings pd.read_excel treats as missing by default (pandas' STR_NA_VALUES)
+EXCEL_NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+# Text pandas reads as booleans
+BOOLEAN_TEXTS = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+
+_INTEGER_TEXT = re.compile(r'[+-]?\d+', re.ASCII)
+_NUMBER_TEXT = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?', re.ASCII)
+
+
+def _xlsx_cell_value(value):
+    """Converts an openpyxl cell value the way pd.read_excel does, so both readers agree."""
+    if value is None or (isinstance(value, str) and value in EXCEL_NA_VALUES):
+        return NaN
+    if isinstance(value, float) and value.is_integer():
+        return int(value) # pandas turns whole-number floats back into ints
+    return value
+
+
+def _cell_class(value):
+    """
+    What pandas' type inference sees in a cell: a missing value, its type, or for text
+    whether it reads as an integer, a number or a boolean.
+    """
+    if isinstance(value, str):
+        if _INTEGER_TEXT.fullmatch(value):
+            return 'integer text'
+        if _NUMBER_TEXT.fullmatch(value):
+            return 'number text'
+        return 'boolean text' if value in BOOLEAN_TEXTS else 'text'
+    if isinstance(value, float) and value != value:
+        return 'missing'
+    return type(value)
+
+
+def _column_dtypes(column_samples, read_cells):
+    """
+    The dtype a whole-file read gives each column. pandas types a column by the classes
+    of the cells it holds (see _cell_class), so reading one cell of each class with
+    read_cells (cells -> one-column DataFrame) gives the same dtype.
+    """
+    return [read_cells(list(samples.values())).dtypes.iloc[0] for samples in column_samples]
+
+
+def _cell_converter(dtype):
+    """
+    Returns a function turning a cell as read into the value a whole-file read holds in
+    a column of dtype. Cells that don't convert are kept as they are.
+    """
+    import pandas as pd
+
+    kind = dtype.kind
+    if kind == 'M':
+        convert = lambda value: pd.NaT if value != value else pd.Timestamp(value)
+    elif kind == 'f':
+        convert = lambda value: float(BOOLEAN_TEXTS.get(value, value))
+    elif kind in 'iu':
+        convert = lambda value: int(BOOLEAN_TEXTS.get(value, value))
+    elif kind == 'b':
+        convert = lambda value: bool(BOOLEAN_TEXTS.get(value, value))
+    else:
+        return lambda value: value
+
+    def converted(value):
+        try:
+            return convert(value)
+        except (TypeError, ValueError, OverflowError):
+            return value
+
+    return converted
+
+
+def _scan_rows(rows, positions):
+    """
+    The counting pass of stream_assessment_groups. Returns the number of rows per raw
+    Assessment Code cell (None for missing ones) and, per column of positions, one
+    cell of each class (see _cell_class).
+    """
+    code_cells = Counter()
+    column_samples = [{} for _ in positions]
+    for _, values in rows:
+        for samples, pos in zip(column_samples, positions):
+            cell = values[pos]
+            samples.setdefault(_cell_class(cell), cell)
+        code = values[positions[0]]
+        code_cells[None if code != code else code] += 1
+    return code_cells, column_samples
+
+
+def _iter_xlsx_rows(file_path):
+    """Yields (row_number, values) for every data row of the first sheet, in openpyxl read-only mode."""
+    import openpyxl # Only needed for --stream; pandas imports it itself for read_excel
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        for row_number, values in enumerate(rows, start=2):
+            if all(value is None for value in values):
+                continue # Blank rows carry no data (pandas drops trailing ones too)
+            yield row_number, tuple(_xlsx_cell_value(value) for value in values)
+    finally:
+        workbook.close()
+
+
+def _xlsx_header(file_path):
+    """Returns the header row of the first sheet."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        return next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+    finally:
+        workbook.close()
+
+
+def _read_xlsx_cells(cells):
+    """Types a column of openpyxl cells (see _xlsx_cell_value) the way pd.read_excel does."""
+    from pandas.io.parsers import TextParser
+
+    return TextParser([['cell'], *([cell] for cell in cells)], header=0).read()
+
+
+def _iter_csv_rows(file_path, encoding, chunksize=None):
+    """
+    Yields (row_number, values) for every data row of a CSV, reading it in chunks. Cells
+    are read as text (NaN if missing): typed chunk by chunk, a column could hold ints in
+    one chunk and floats in the next, so stream_assessment_groups types them instead.
+    """
+    import pandas as pd
+
+    for chunk in pd.read_csv(file_path, encoding=encoding, chunksize=chunksize or STREAM_CHUNK_ROWS, dtype=str):
+        for index, *values in chunk.itertuples(name=None):
+            yield index + 2, values
+
+
+def _read_csv_cells(cells):
+    """Types a column of CSV cells, as read by _iter_csv_rows, the way pd.read_csv does."""
+    import csv
+
+    import pandas as pd
+
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(['cell'])
+    writer.writerows(['' if cell != cell else cell] for cell in cells)
+    return pd.read_csv(io.StringIO(text.getvalue()))
+
+
+def stream_assessment_groups(file_path):
+    """
+    Streams a CSV or XLSX file as (assessment_code, [ItemRecord]) groups.
+
+    Column validation and the 'Assessment Code' cleanup match read_exam_data. A first
+    pass counts the rows of each Assessment Code, so each group can be handed out as
+    soon as its last row has been read. For files where each code's rows are contiguous
+    (the usual layout), memory stays bounded by the largest group.
+
+    The first pass also keeps one cell of each kind per column (see _cell_class), which
+    is enough to type the cells like read_exam_data types the whole column: an integer
+    column with an empty cell holds floats, for example, wherever the empty cell is.
+
+    The header check and the counting pass run immediately, so a bad file raises here
+    rather than part-way through generation.
+
+    Returns:
+        iterator: (assessment_code, list of ItemRecord) tuples.
+    """
+    import pandas as pd
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"The file '{file_path}' does not exist.")
+
+    file_extension = os.path.splitext(file_path)[1].lower()
+    record_columns = ['Assessment Code', *ITEM_RECORD_COLUMNS.values()]
+
+    def scan(header, read_rows):
+        actual_columns = map_expected_columns(header, file_path)
+        columns = [str(actual_columns[EXPECTED_COLUMNS.index(column)]) for column in record_columns]
+        header = [str(col) for col in header]
+        positions = [header.index(column) for column in columns]
+        return (positions, *_scan_rows(read_rows(), positions))
+
+    try:
+        if file_extension == '.csv':
+            # The counting pass reads the whole file, so it also settles the encoding
+            encoding = 'utf-8'
+            csv_header = lambda: list(pd.read_csv(file_path, encoding=encoding, nrows=0).columns)
+            read_rows = lambda: _iter_csv_rows(file_path, encoding)
+            try:
+                positions, code_cells, column_samples = scan(csv_header(), read_rows)
+            except UnicodeDecodeError:
+                print("UTF-8 encoding failed, trying 'latin-1'.")
+                encoding = 'latin-1'
+                positions, code_cells, column_samples = scan(csv_header(), read_rows)
+            read_cells = _read_csv_cells
+        elif file_extension == '.xlsx':
+            read_rows = lambda: _iter_xlsx_rows(file_path)
+            positions, code_cells, column_samples = scan(_xlsx_header(file_path), read_rows)
+            read_cells = _read_xlsx_cells
+        else:
+            raise ValueError(
+                f"Unsupported file format: '{file_extension}'. "
+                "Please provide a .csv or .xlsx file."
+            )
+        converters = [_cell_converter(dtype) for dtype in _column_dtypes(column_samples, read_cells)]
+    except pd.errors.EmptyDataError:
+        print(f"Warning: The file '{file_path}' is empty or has no data.")
+        return iter(())
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Error reading file '{file_path}': {e}") from e
+
+    code_counts = Counter()
+    for code, count in code_cells.items():
+        code_counts[clean_assessment_code(converters[0](NaN if code is None else code))] += count
+    empty_code_rows = code_counts.pop('', 0)
+    if empty_code_rows:
+        print(f"Warning: Filtered out {empty_code_rows} rows with empty 'Assessment Code'.")
+    if not code_counts:
+         print("Warning: No rows remaining after filtering for valid 'Assessment Code'.")
+
+    return _group_records(_records_from_rows(read_rows(), positions, converters), code_counts)
+
+
+def _group_records(records, code_counts):
+    """Collects records per Assessment Code and yields each group once all of its rows are seen."""
+    open_groups = {}
+    for record in records:
+        if record.assessment_code not in code_counts:
+            continue # Empty Assessment Code
+        group = open_groups.setdefault(record.assessment_code, [])
+        group.append(record)
+        if len(group) == code_counts[record.assessment_code]:
+            yield record.assessment_code, open_groups.pop(record.assessment_code)
+
+
+# --- Input Validation ---
+
+OPTION_LETTERS = ['A', 'B', 'C', 'D']
+
+# Reasons a row is left out of its package, in the order they are checked
+SKIP_REASONS = ['invalid_item_code', 'no_valid_options', 'invalid_correct_answer']
+
+
+class ValidatedItem(NamedTuple):
+    """A row that passed validation, with everything create_qti_item_xml needs precomputed."""
+    row_number: int
+    item_code: str
+    item_identifier: str
+    item_stimulus: str
+    question_text: str
+    options: tuple # ((option_id, option_text), ...)
+    correct_answer_id: str
+
+
+class AssessmentGroup(NamedTuple):
+    """The validated rows of one Assessment Code, as handed to the package builder."""
+    assessment_code: str
+    items: list # ValidatedItem
+    rejected_messages: list # Skip message per rejected row
+
+
+class ExamDataValidation(NamedTuple):
+    """Result of validate_exam_data; arrays are aligned with the rows of the validated frame."""
+    skip_masks: dict # SKIP_REASONS -> boolean array (a row is flagged for its first failing check only)
+    valid_mask: np.ndarray
+    item_identifiers: pd.Series
+    options: pd.Series # Option tuples, as passed to create_qti_item_xml
+    items: np.ndarray # ValidatedItem for valid rows, None for rejected ones
+    rejected_messages: np.ndarray # Skip message for rejected rows, None for valid ones
+    rejected_rows: pd.DataFrame # Row, Assessment Code, Item code, Reason, Message
+
+
+def sanitize_identifiers(names):
+    """Vectorized sanitize_identifier for a pandas Series."""
+    names_str = names.astype(str)
+    s = names_str.str.replace(r'[^\w-]', '_', regex=True)
+    first_char = s.str[:1]
+    s = s.where(~(first_char.str.isdigit() | (first_char == '-')), '_' + s)
+    s = s.str.strip('_').str.strip('-')
+    # Rare: nothing usable left, fall back to the scalar version for its id scheme
+    empty = s == ''
+    if empty.any():
+        s[empty] = names_str[empty].map(sanitize_identifier)
+    return s
+
+
+def _cell_texts(values):
+    """
+    str() of every cell of a Series, like the former per-row checks. astype(str) would
+    write datetime columns whose times are all midnight without the time.
+    """
+    return values.map(str) if values.dtype.kind == 'M' else values.astype(str)
+
+
+def _empty_rejected_rows():
+    import pandas as pd
+
+    return pd.DataFrame({'Row': pd.Series(dtype=int), 'Assessment Code': [], 'Item code': [], 'Reason': [], 'Message': []})
+
+
+@METRICS.timed("validate")
+def validate_exam_data(df):
+    """
+    Validates and normalizes every row of an exam DataFrame in one vectorized pass.
+
+    Applies the checks the package builder used to run row by row: the sanitized
+    Item code must be usable, at least one option must be non-empty, and the
+    Correct Answer must name one of the non-empty options. Row numbers are the
+    spreadsheet rows (index + 2), as in the generation output.
+
+    Returns:
+        ExamDataValidation
+    """
+    import numpy as np
+    import pandas as pd
+
+    col_map = {str(col).lower(): col for col in df.columns}
+    column = lambda name: df[col_map[name.lower()]]
+
+    row_numbers = df.index.to_numpy() + 2
+    item_codes = _cell_texts(column('Item code')).str.strip()
+    item_identifiers = sanitize_identifiers(item_codes)
+    item_stimuli = _cell_texts(column('Item Stimulus')).str.strip()
+    question_texts = _cell_texts(column('Item Stem')).str.strip()
+    correct_answers = _cell_texts(column('Correct Answer')).str.strip().str.upper()
+
+    option_texts = {}
+    option_present = {}
+    for letter in OPTION_LETTERS:
+        values = column(f'Option {letter}')
+        option_texts[letter] = _cell_texts(values).str.strip()
+        option_present[letter] = (values.notna() & (option_texts[letter] != '')).to_numpy()
+
+    item_code_ok = ~item_identifiers.str.contains('unspecified_id', regex=False).to_numpy()
+    has_options = np.logical_or.reduce([option_present[letter] for letter in OPTION_LETTERS])
+    answer_ok = np.logical_or.reduce([
+        (correct_answers == letter).to_numpy() & option_present[letter] for letter in OPTION_LETTERS
+    ])
+
+    skip_masks = {
+        'invalid_item_code': ~item_code_ok,
+        'no_valid_options': item_code_ok & ~has_options,
+        'invalid_correct_answer': item_code_ok & has_options & ~answer_ok,
+    }
+    valid_mask = item_code_ok & has_options & answer_ok
+
+    option_columns = [
+        zip(option_present[letter], option_texts[letter].to_numpy()) for letter in OPTION_LETTERS
+    ]
+    options = pd.Series([
+        tuple((f"option_{letter}", text) for letter, (present, text) in zip(OPTION_LETTERS, row_options) if present)
+        for row_options in zip(*option_columns)
+    ], index=df.index, dtype=object)
+
+    items = np.full(len(df), None, dtype=object)
+    for i in np.flatnonzero(valid_mask):
+        items[i] = ValidatedItem(
+            int(row_numbers[i]), item_codes.iat[i], item_identifiers.iat[i], item_stimuli.iat[i],
+            question_texts.iat[i], options.iat[i], f"option_{correct_answers.iat[i]}"
+        )
+
+    rejected = []
+    rejected_messages = np.full(len(df), None, dtype=object)
+    for reason in SKIP_REASONS:
+        for i in np.flatnonzero(skip_masks[reason]):
+            row_number, item_code = int(row_numbers[i]), item_codes.iat[i]
+            if reason == 'invalid_item_code':
+                message = f"Skipping row {row_number} due to invalid Item Code: '{item_code}' (Sanitized: {item_identifiers.iat[i]})"
+            elif reason == 'no_valid_options':
+                message = f"Skipping item '{item_code}' (row {row_number}) due to no valid options found."
+            else:
+                valid_options_letters = [option_id[-1] for option_id, _ in options.iat[i]]
+                message = (
+                    f"Skipping item '{item_code}' (row {row_number}) due to invalid or missing 'Correct Answer' "
+                    f"value '{correct_answers.iat[i]}'. Must be one of {valid_options_letters}."
+                )
+            rejected_messages[i] = message
+            rejected.append((row_number, column('Assessment Code').iat[i], item_code, reason, message))
+
+    METRICS.incr("rows_validated", len(df))
+    METRICS.incr("rows_rejected", len(rejected))
+    if rejected:
+        rejected_rows = pd.DataFrame(rejected, columns=['Row', 'Assessment Code', 'Item code', 'Reason', 'Message'])
+        rejected_rows = rejected_rows.sort_values('Row', kind='stable').reset_index(drop=True)
+    else:
+        rejected_rows = _empty_rejected_rows()
+
+    return ExamDataValidation(skip_masks, valid_mask, item_identifiers, options, items, rejected_messages, rejected_rows)
+
+
+def group_validated_items(validation, grouped_by_assessment):
+    """Yields an AssessmentGroup per group of a DataFrame groupby, using a validation of the whole frame."""
+    for assessment_code, positions in grouped_by_assessment.indices.items():
+        yield AssessmentGroup(
+            assessment_code,
+            [item for item in validation.items[positions] if item is not None],
+            [message for message in validation.rejected_messages[positions] if message is not None],
+        )
+
+
+# Bumped when prepare_exam_frame or the entry format changes, so older read cache entries are ignored
+READ_CACHE_VERSION = "2"
+
+_CELL_CODECS = None
+
+
+def _cell_codecs():
+    """
+    (type, encode, decode) per type tag of the object column cells the read cache can
+    store; types are matched exactly, so every cell comes back as the type it was read as.
+    """
+    global _CELL_CODECS
+    if _CELL_CODECS is None:
+        import datetime
+
+        import numpy as np
+        import pandas as pd
+
+        def naive(encode):
+            def checked(value):
+                if value.tzinfo is not None:
+                    raise ValueError("time zone aware cells are not cached")
+                return encode(value)
+            return checked
+
+        _CELL_CODECS = [
+            (type(None), lambda value: "", lambda text: None),
+            (str, str, str),
+            (float, repr, float),
+            (int, str, int),
+            (bool, lambda value: "1" if value else "", bool),
+            (pd.Timestamp, naive(pd.Timestamp.isoformat), pd.Timestamp),
+            (datetime.datetime, naive(datetime.datetime.isoformat), datetime.datetime.fromisoformat),
+            (datetime.date, datetime.date.isoformat, datetime.date.fromisoformat),
+            (datetime.time, naive(datetime.time.isoformat), datetime.time.fromisoformat),
+            (type(pd.NaT), lambda value: "", lambda text: pd.NaT),
+            (np.float64, lambda value: repr(float(value)), lambda text: np.float64(float(text))),
+            (np.int64, lambda value: str(int(value)), lambda text: np.int64(int(text))),
+            (np.bool_, lambda value: "1" if value else "", lambda text: np.bool_(bool(text))),
+        ]
+    return _CELL_CODECS
+
+
+def _encode_frames(frames):
+    """
+    Lays DataFrames out as arrays for ReadCache: returns (arrays, layout), where layout
+    (JSON) names each frame's index and columns and the position of their arrays.
+    Columns of a numpy dtype are stored as they are; object columns as a type tag per
+    cell (see _cell_codecs), the cells' text and its offsets. Raises ValueError for
+    frames holding anything else.
+    """
+    import numpy as np
+
+    tags = {codec[0]: tag for tag, codec in enumerate(_cell_codecs())}
+    arrays = []
+
+    def add(array):
+        arrays.append(np.ascontiguousarray(array))
+        return len(arrays) - 1
+
+    layout = []
+    for df in frames:
+        if df.index.dtype.kind not in "iu" or not all(isinstance(name, str) for name in df.columns):
+            raise ValueError("only frames with an integer index and text column names are cached")
+        columns = []
+        for name, column in df.items():
+            dtype = column.dtype
+            if isinstance(dtype, np.dtype) and dtype.kind in "biufM":
+                columns.append({"name": name, "dtype": dtype.str, "data": add(column.to_numpy())})
+                continue
+            if dtype != object:
+                raise ValueError(f"columns of type {dtype} are not cached")
+            cell_tags, texts = [], []
+            for value in column:
+                tag = tags.get(type(value))
+                if tag is None:
+                    raise ValueError(f"cells of type {type(value).__name__} are not cached")
+                cell_tags.append(tag)
+                texts.append(_cell_codecs()[tag][1](value))
+            # Offsets count characters, so the text is decoded once and sliced
+            offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+            np.cumsum([len(text) for text in texts], out=offsets[1:])
+            columns.append({
+                "name": name, "dtype": "object", "tags": add(np.array(cell_tags, dtype=np.uint8)),
+                "offsets": add(offsets), "text": add(np.frombuffer(''.join(texts).encode('utf-8'), dtype=np.uint8)),
+            })
+        layout.append({"index": add(df.index.to_numpy(dtype=np.int64)), "index_name": df.index.name, "columns": columns})
+    return arrays, layout
+
+
+def _decode_frames(buffer, layout, positions):
+    """Rebuilds the DataFrames of _encode_frames from buffer, with positions[i] = (offset, dtype, count) of array i."""
+    import numpy as np
+    import pandas as pd
+
+    codecs = _cell_codecs()
+
+    def array(i):
+        offset, dtype, count = positions[i]
+        dtype = np.dtype(dtype)
+        if offset < 0 or offset + count * dtype.itemsize > len(buffer):
+            raise ValueError("array out of bounds")
+        # A view of the memory map: nothing is read until it is used
+        return buffer[offset:offset + count * dtype.itemsize].view(dtype)
+
+    frames = []
+    for frame in layout:
+        index = pd.Index(array(frame["index"]), name=frame["index_name"])
+        data = {}
+        for position, column in enumerate(frame["columns"]):
+            if column["dtype"] != "object":
+                data[position] = array(column["data"])
+                continue
+            cell_tags, offsets = array(column["tags"]), array(column["offsets"]).tolist()
+            text = array(column["text"]).tobytes().decode('utf-8')
+            values = np.empty(len(cell_tags), dtype=object)
+            for i, tag in enumerate(cell_tags.tolist()):
+                values[i] = codecs[tag][2](text[offsets[i]:offsets[i + 1]])
+            data[position] = values
+        df = pd.DataFrame(data, index=index, copy=False)
+        df.columns = [column["name"] for column in frame["columns"]]
+        frames.append(df)
+    return frames
+
+
+def default_read_cache_dir():
+    """The read cache directory of --read-cache: tao_qti/read in the user's cache directory."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "tao_qti", "read")
+
+
+def _is_private(file_stat):
+    """Whether a stat result belongs to the current user and nobody else can write to it."""
+    owned = not hasattr(os, "getuid") or file_stat.st_uid == os.getuid()
+    return owned and not file_stat.st_mode & 0o022
+
+
+class ReadCache:
+    """
+    Sidecar cache of read_exam_data results in cache_dir (default_read_cache_dir()
+    unless given), one entry per input path.
+
+    An entry holds the normalized frames (expected columns, cleaned Assessment Code,
+    rows without one dropped) plus the file's path, size, mtime and SHA-256, and
+    extra values the caller needs on a hit (such as the number of dropped rows, so
+    that its warning is repeated). It is reused when size and mtime are unchanged, or
+    when only the mtime moved and the content hash still matches (a touched or
+    re-saved but identical file).
+
+    The frames are stored column by column in a .cols file of plain arrays, which is
+    memory-mapped on load (see _encode_frames). Cells of mixed-type columns keep the
+    type read_excel gave them (numbers, text, dates), which validation depends on.
+    Frames with anything else aren't cached. Nothing is ever unpickled; still, the
+    directory is created 0700 and the entries 0600, and entries in a directory or
+    file that another user owns or can write to are not loaded.
+    """
+
+    def __init__(self, cache_dir=None):
+        import pandas as pd
+
+        self.cache_dir = cache_dir or default_read_cache_dir()
+        self.version = f"{READ_CACHE_VERSION}/{pd.__version__}"
+
+    def _entry_paths(self, file_path, variant):
+        key = f"{os.path.abspath(file_path)}\0{variant}"
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{name}.json"), os.path.join(self.cache_dir, f"{name}.cols")
+
+    @staticmethod
+    def _file_sha256(file_path):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _dir_is_private(self):
+        try:
+            dir_stat = os.lstat(self.cache_dir)
+        except OSError:
+            return False
+        if stat.S_ISDIR(dir_stat.st_mode) and _is_private(dir_stat):
+            return True
+        print(f"Warning: Not using the read cache '{self.cache_dir}': it must be a directory only you can write to.")
+        return False
+
+    @staticmethod
+    def _open_private(path, text=False):
+        """Opens an entry for reading, or returns None (with a warning) if it isn't a private file of this user."""
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        file_stat = os.fstat(fd)
+        if not stat.S_ISREG(file_stat.st_mode) or not _is_private(file_stat):
+            os.close(fd)
+            print(f"Warning: Ignoring read cache entry '{path}': it isn't a file only you can write to.")
+            return None
+        return os.fdopen(fd, 'r', encoding='utf-8') if text else os.fdopen(fd, 'rb')
+
+    @staticmethod
+    def _create_private(path, text=False):
+        """Creates (or truncates) an entry file readable and writable by this user only."""
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0), 0o600)
+        if hasattr(os, "fchmod"):
+            os.fchmod(fd, 0o600) # An existing file keeps its mode otherwise
+        return os.fdopen(fd, 'w', encoding='utf-8') if text else os.fdopen(fd, 'wb')
+
+    def load(self, file_path, variant="frame"):
+        """
+        The cached (list of frames, extra) of file_path, or None if there is no valid
+        entry for its current content. variant tells apart the values cached per file
+        (batch.py caches all sheets of a workbook).
+        """
+        import numpy as np
+
+        if not os.path.exists(self.cache_dir) or not self._dir_is_private():
+            return None
+        meta_path, frame_path = self._entry_paths(file_path, variant)
+        try:
+            meta_file = self._open_private(meta_path, text=True)
+            if meta_file is None:
+                return None
+            with meta_file:
+                meta = json.load(meta_file)
+            file_stat = os.stat(file_path)
+        except (OSError, ValueError):
+            return None
+        if (meta.get("version") != self.version or meta.get("path") != os.path.abspath(file_path)
+                or meta.get("size") != file_stat.st_size):
+            return None
+        if meta.get("mtime_ns") != file_stat.st_mtime_ns:
+            if meta.get("sha256") != self._file_sha256(file_path):
+                return None
+            meta["mtime_ns"] = file_stat.st_mtime_ns # Same content, so the cheap check passes next time
+            self._write_meta(meta_path, meta)
+        try:
+            frame_file = self._open_private(frame_path)
+            if frame_file is None:
+                return None
+            with frame_file:
+                size = os.fstat(frame_file.fileno()).st_size
+                # Copy-on-write, so the frames can be modified without touching the file
+                buffer = (np.memmap(frame_file, dtype=np.uint8, mode='c').view(np.ndarray) if size
+                          else np.empty(0, dtype=np.uint8))
+            return _decode_frames(buffer, meta["frames"], meta["arrays"]), meta.get("extra")
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable read cache entry '{frame_path}': {e}")
+            return None
+
+    def fingerprint(self, file_path):
+        """Size, mtime and hash of file_path, taken before it is parsed and handed back to save()."""
+        file_stat = os.stat(file_path)
+        return {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns, "sha256": self._file_sha256(file_path)}
+
+    def save(self, file_path, fingerprint, frames, variant="frame", extra=None):
+        """
+        Stores a list of frames, and the JSON-serializable extra, for file_path, unless
+        the file changed while it was being parsed or a frame can't be stored.
+        """
+        try:
+            arrays, layout = _encode_frames(frames)
+        except ValueError as e:
+            print(f"Warning: Not caching the read of '{file_path}': {e}.")
+            return
+        file_stat = os.stat(file_path)
+        if (file_stat.st_size, file_stat.st_mtime_ns) != (fingerprint["size"], fingerprint["mtime_ns"]):
+            return
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        if not self._dir_is_private():
+            return
+        meta_path, frame_path = self._entry_paths(file_path, variant)
+        positions, offset = [], 0
+        with self._create_private(f"{frame_path}.tmp") as f:
+            for array in arrays:
+                padding = -offset % 8 # Aligned, so every array can be viewed in place
+                f.write(b"\0" * padding)
+                offset += padding
+                positions.append((offset, array.dtype.str, len(array)))
+                f.write(array.tobytes())
+                offset += array.nbytes
+        os.replace(f"{frame_path}.tmp", frame_path)
+        # Written last: an entry only counts once its frames are complete
+        self._write_meta(meta_path, {
+            "version": self.version, "path": os.path.abspath(file_path), **fingerprint, "extra": extra,
+            "frames": layout, "arrays": positions,
+        })
+
+    @classmethod
+    def _write_meta(cls, meta_path, meta):
+        with cls._create_private(f"{meta_path}.tmp", text=True) as f:
+            json.dump(meta, f, indent=1)
+        os.replace(f"{meta_path}.tmp", meta_path)
+
+
+@METRICS.timed("read")
+def read_exam_data(file_path: str, data: bytes = None, read_cache_dir: str = None) -> pd.DataFrame:
+    """
+    Reads exam data from a CSV or XLSX file and returns it as a DataFrame.
+    Includes validation for required columns.
+
+    With data (the file's contents, e.g. an upload), nothing is read from disk;
+    file_path then only selects the format and names the file in messages.
+    With read_cache_dir, the result is cached there and an unchanged file isn't
+    parsed again (see ReadCache).
+    """
+    import pandas as pd
+
+    if data is None and not os.path.exists(file_path):
+        raise FileNotFoundError(f"The file '{file_path}' does not exist.")
+
+    read_cache = ReadCache(read_cache_dir) if read_cache_dir and data is None else None
+    if read_cache is not None:
+        cached = read_cache.load(file_path)
+        if cached is not None:
+            (df,), filtered_rows = cached
+            METRICS.incr("read_cache_hits")
+            print(f"Reusing the cached read of '{file_path}' ({len(df)} rows, file unchanged).")
+            warn_about_filtered_rows(df, filtered_rows)
+            return df
+        METRICS.incr("read_cache_misses")
+        fingerprint = read_cache.fingerprint(file_path)
+
+    file_extension = os.path.splitext(file_path)[1].lower()
+    df = pd.DataFrame()
+
+    def source():
+        return file_path if data is None else io.BytesIO(data)
+
+    try:
+        if file_extension == '.csv':
+            # Add encoding detection if needed, or specify common encodings
+            try:
+                df = pd.read_csv(source(), encoding='utf-8')
+            except UnicodeDecodeError:
+                 print("UTF-8 encoding failed, trying 'latin-1'.")
+                 df = pd.read_csv(source(), encoding='latin-1')
+            except FileNotFoundError: # Catch FileNotFoundError again for robustness
+                 raise FileNotFoundError(f"The file '{file_path}' was not found.")
+        elif file_extension == '.xlsx':
+            try:
+                 df = pd.read_excel(source())
+            except FileNotFoundError: # Catch FileNotFoundError again for robustness
+                 raise FileNotFoundError(f"The file '{file_path}' was not found.")
+        else:
+            raise ValueError(
+                f"Unsupported file format: '{file_extension}'. "
+                "Please provide a .csv or .xlsx file."
+            )
+    except pd.errors.EmptyDataError:
+        print(f"Warning: The file '{file_path}' is empty or has no data.")
+        return pd.DataFrame()
+    except Exception as e:
+        # Catch other pandas read errors or general exceptions during file reading
+        raise ValueError(f"Error reading file '{file_path}': {e}") from e
+
+    df, filtered_rows = prepare_exam_frame(df, file_path)
+    warn_about_filtered_rows(df, filtered_rows)
+    if read_cache is not None:
+        read_cache.save(file_path, fingerprint, [df], extra=filtered_rows)
+    return df
+
+
+def prepare_exam_frame(df, file_path):
+    """
+    Selects the expected columns of a frame read from file_path (named in errors) and
+    drops the rows without an Assessment Code. Used by read_exam_data and batch.py.
+
+    Returns:
+        tuple: (DataFrame, number of rows dropped), for warn_about_filtered_rows.
+    """
+    # Check for missing columns case-insensitively, but use the specified case for access later
+    actual_cols_in_order = map_expected_columns(df.columns, file_path)
+
+    # Ensure the DataFrame only contains the expected columns and in their specified order,
+    # using the actual column names from the file based on the lowercased match
+    df = df[actual_cols_in_order].copy() # Use .copy() to avoid SettingWithCopyWarning later
+
+    # Clean up Assessment Code - convert to string and handle potential NaNs
+    df['Assessment Code'] = df['Assessment Code'].astype(str).replace('nan', '').str.strip()
+
+    # Filter out rows where Assessment Code is empty after cleanup
+    initial_rows = len(df)
+    df = df[df['Assessment Code'] != ''].copy()
+    return df, initial_rows - len(df)
+
+
+def warn_about_filtered_rows(df, filtered_rows):
+    """Prints the warnings about a frame from prepare_exam_frame; repeated when it comes from the read cache."""
+    if filtered_rows:
+        print(f"Warning: Filtered out {filtered_rows} rows with empty 'Assessment Code'.")
+
+    if df.empty:
+         print("Warning: No rows remaining after filtering for valid 'Assessment Code'.")
+
+def print_usage():
+    print("Usage: python -m tao_qti.main <path_to_excel_file> <output_folder_for_packages> [options]")
+    print("Options:")
+    print("  --workers N                 Build packages in N parallel processes")
+    print("  --compress-level 0-9|store  Deflate level for zip entries, or 'store' for no compression")
+    print("  --stream                    Stream the input file instead of loading it into a DataFrame")
+    print("  --rejected-report FILE      Write the rows skipped by validation to a CSV report")
+    print("  --item-serializer NAME      'lxml' (default) or 'template' (precompiled byte template, faster)")
+    print("  --compact                   Write XML documents without indentation")
+    print("  --stream-xml                Stream the test and manifest XML into the zip instead of building their trees")
+    print("  --media-dir DIR             Embed the images referenced as [img:path] in the cells, relative to DIR")
+    print("  --max-image-size PX         Scale down images larger than PX pixels (needs Pillow)")
+    print("  --max-items-per-section N   Split tests into sections of at most N items")
+    print("  --max-items-per-package N   Split larger assessments into several packages (<code>_part01, ...)")
+    print("  --max-package-mb MB         Split assessments whose package would exceed MB megabytes (estimated)")
+    print("  --validate                  Validate every item, test and manifest against the local XSDs (see qti_schemas.py)")
+    print("  --schema-dir DIR            Local XSD mirror for --validate (default: schemas next to main.py)")
+    print("  --read-cache                Cache the parsed input in your cache directory and skip parsing it again")
+    print("                              while it is unchanged")
+    print("  --item-cache-mb MB          Memory for reusing the XML of items shared by several assessments, per process")
+    print(f"                              (default {ITEM_CACHE_BYTES // (1024 * 1024)}; 0 turns it off)")
+    print("  --item-cache-dir DIR        Also keep the item XML cache in DIR, shared by all workers and later runs")
+    print("  --incremental               Skip assessments whose rows haven't changed since the last build")
+    print("  --quiet                     Only print errors and the final summary, not per-assessment progress")
+    print("  --metrics-json FILE         Write a JSON run summary with per-stage timings and counters")
+    print("  --prometheus-textfile FILE  Write the run metrics in Prometheus text format")
+    print("Example: python -m tao_qti.main test.xlsx qti_assessment_packages")
+    print("         python -m tao_qti.main test.xlsx qti_assessment_packages --workers 8 --compress-level 1")
+
+def parse_args(argv):
+    """Parses command line arguments into (excel_file_path, output_dir, options)."""
+    positional, options = parse_generation_options(argv)
+    if len(positional) != 2:
+        raise ValueError("Invalid number of arguments.")
+    return positional[0], positional[1], options
+
+
+def parse_generation_options(argv):
+    """Parses the generation options of argv into (positional arguments, options); see print_usage."""
+    options = {"workers": 1, "compression": ZIP_DEFLATED, "compresslevel": None, "stream": False,
+               "rejected_report_path": None, "item_serializer": "lxml", "pretty_print": True,
+               "incremental": False, "quiet": False, "stream_xml": False, "media_source_dir": None,
+               "max_image_size": None, "validate_schema": False, "schema_dir": None,
+               "max_items_per_section": None, "max_items_per_package": None, "max_package_bytes": None,
+               "read_cache_dir": None, "item_cache_bytes": ITEM_CACHE_BYTES, "item_cache_dir": None,
+               "metrics_json": None, "prometheus_textfile": None}
+    positional = []
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg == "--workers":
+            if not args:
+                raise ValueError("--workers requires a value.")
+            value = args.pop(0)
+            try:
+                options["workers"] = int(value)
+            except ValueError:
+                raise ValueError(f"--workers must be an integer, got '{value}'.")
+            if options["workers"] < 1:
+                raise ValueError("--workers must be at least 1.")
+        elif arg == "--compress-level":
+            if not args:
+                raise ValueError("--compress-level requires a value.")
+            value = args.pop(0)
+            if value == "store":
+                options["compression"] = ZIP_STORED
+                options["compresslevel"] = None
+            elif value.isdigit() and 0 <= int(value) <= 9:
+                options["compression"] = ZIP_DEFLATED
+                options["compresslevel"] = int(value)
+            else:
+                raise ValueError(f"--compress-level must be 0-9 or 'store', got '{value}'.")
+        elif arg == "--rejected-report":
+            if not args:
+                raise ValueError("--rejected-report requires a value.")
+            options["rejected_report_path"] = args.pop(0)
+        elif arg == "--item-serializer":
+            if not args:
+                raise ValueError("--item-serializer requires a value.")
+            options["item_serializer"] = args.pop(0)
+            if options["item_serializer"] not in ITEM_SERIALIZERS:
+                raise ValueError(f"--item-serializer must be one of {ITEM_SERIALIZERS}.")
+        elif arg == "--media-dir":
+            if not args:
+                raise ValueError("--media-dir requires a value.")
+            options["media_source_dir"] = args.pop(0)
+            if not os.path.isdir(options["media_source_dir"]):
+                raise ValueError(f"--media-dir '{options['media_source_dir']}' is not a directory.")
+        elif arg == "--max-image-size":
+            if not args:
+                raise ValueError("--max-image-size requires a value.")
+            value = args.pop(0)
+            if not value.isdigit() or int(value) < 1:
+                raise ValueError(f"--max-image-size must be a positive integer, got '{value}'.")
+            if importlib.util.find_spec("PIL") is None:
+                raise ValueError("--max-image-size needs Pillow: pip install Pillow")
+            options["max_image_size"] = int(value)
+        elif arg in ("--max-items-per-section", "--max-items-per-package"):
+            if not args:
+                raise ValueError(f"{arg} requires a value.")
+            value = args.pop(0)
+            if not value.isdigit() or int(value) < 1:
+                raise ValueError(f"{arg} must be a positive integer, got '{value}'.")
+            options[arg[2:].replace("-", "_")] = int(value)
+        elif arg == "--max-package-mb":
+            if not args:
+                raise ValueError("--max-package-mb requires a value.")
+            value = args.pop(0)
+            try:
+                megabytes = float(value)
+            except ValueError:
+                raise ValueError(f"--max-package-mb must be a number, got '{value}'.")
+            if megabytes <= 0:
+                raise ValueError("--max-package-mb must be greater than 0.")
+            options["max_package_bytes"] = int(megabytes * 1024 * 1024)
+        elif arg == "--item-cache-mb":
+            if not args:
+                raise ValueError("--item-cache-mb requires a value.")
+            value = args.pop(0)
+            try:
+                megabytes = float(value)
+            except ValueError:
+                raise ValueError(f"--item-cache-mb must be a number, got '{value}'.")
+            if megabytes < 0:
+                raise ValueError("--item-cache-mb must not be negative.")
+            options["item_cache_bytes"] = int(megabytes * 1024 * 1024)
+        elif arg == "--item-cache-dir":
+            if not args:
+                raise ValueError("--item-cache-dir requires a value.")
+            options["item_cache_dir"] = args.pop(0)
+        elif arg == "--validate":
+            options["validate_schema"] = True
+        elif arg == "--schema-dir":
+            if not args:
+                raise ValueError("--schema-dir requires a value.")
+            options["schema_dir"] = args.pop(0)
+        elif arg == "--read-cache":
+            options["read_cache_dir"] = default_read_cache_dir()
+        elif arg == "--compact":
+            options["pretty_print"] = False
+        elif arg == "--incremental":
+            options["incremental"] = True
+        elif arg == "--stream":
+            options["stream"] = True
+        elif arg == "--stream-xml":
+            options["stream_xml"] = True
+        elif arg == "--quiet":
+            options["quiet"] = True
+        elif arg in ("--metrics-json", "--prometheus-textfile"):
+            if not args:
+                raise ValueError(f"{arg} requires a value.")
+            options[arg[2:].replace("-", "_")] = args.pop(0)
+        elif arg.startswith("--"):
+            raise ValueError(f"Unknown option '{arg}'.")
+        else:
+            positional.append(arg)
+    if options["validate_schema"]:
+        if options["stream_xml"]:
+            raise ValueError("--validate needs the XML trees and can't be combined with --stream-xml.")
+        check_schema_mirror(options["schema_dir"])
+    if options["read_cache_dir"] and options["stream"]:
+        raise ValueError("--read-cache caches whole-file reads and can't be combined with --stream.")
+    if options["max_image_size"] and not options["media_source_dir"]:
+        raise ValueError("--max-image-size requires --media-dir.")
+    if options["item_cache_dir"] and not options["item_cache_bytes"]:
+        raise ValueError("--item-cache-dir can't be combined with --item-cache-mb 0.")
+    return positional, options
+
+
+def cli_main(argv):
+    """Runs the command line (python -m tao_qti.main ... or tao-qti generate ...) with the arguments in argv."""
+    try:
+        excel_file_path, output_dir, options = parse_args(argv)
+    except ValueError as ve:
+        print(f"❌ Error: {ve}")
+        print_usage()
+        sys.exit(1)
+
+    if not os.path.isfile(excel_file_path):
+        print(f"❌ Error: File '{excel_file_path}' does not exist.")
+        sys.exit(1)
+
+    package_options = {
+        "workers": options["workers"],
+        "compression": options["compression"],
+        "compresslevel": options["compresslevel"],
+        "rejected_report_path": options["rejected_report_path"],
+        "item_serializer": options["item_serializer"],
+        "pretty_print": options["pretty_print"],
+        "incremental": options["incremental"],
+        "quiet": options["quiet"],
+        "stream_xml": options["stream_xml"],
+        "media_source_dir": options["media_source_dir"],
+        "max_image_size": options["max_image_size"],
+        "validate_schema": options["validate_schema"],
+        "schema_dir": options["schema_dir"],
+        "max_items_per_section": options["max_items_per_section"],
+        "max_items_per_package": options["max_items_per_package"],
+        "max_package_bytes": options["max_package_bytes"],
+        "item_cache_bytes": options["item_cache_bytes"],
+        "item_cache_dir": options["item_cache_dir"],
+    }
+
+    try:
+        if options["stream"]:
+            # Read and generate group by group without holding the whole file in memory
+            create_qti_packages_from_stream(excel_file_path, output_base_dir=output_dir, **package_options)
+        else:
+            df_exam_data = read_exam_data(excel_file_path, read_cache_dir=options["read_cache_dir"])
+            if df_exam_data.empty:
+                print("No valid data found in the input file to process.")
+                sys.exit(0)
+
+            # Create QTI packages grouped by Assessment Code
+            create_qti_packages_by_assessment_code(df_exam_data, output_base_dir=output_dir, **package_options)
+
+        print(f"\n✅ All QTI packages generation complete in: '{os.path.abspath(output_dir)}'")
+
+    except ValueError as ve:
+        print(f"❌ ValueError: {ve}")
+        sys.exit(1)
+    except FileNotFoundError as fnf:
+         print(f"❌ File Error: {fnf}")
+         sys.exit(1)
+    except Exception as e:
+        print(f"❌ An unexpected error occurred: {e}", file=sys.stderr)
+        # import traceback
+        # traceback.print_exc() # Uncomment for more detailed error info
+        sys.exit(1)
+    finally:
+        # Written for failed runs too, so they show up in monitoring
+        write_run_report("generate", options["metrics_json"], options["prometheus_textfile"])
+
+
+if __name__ == "__main__":
+    cli_main(sys.argv[1:])
@@ -0,0 +1,233 @@
+"""
+Run metrics shared by main.py, taoApiUtil.py, pipeline.py and service.py:
+per-stage timers, counters and histograms, written out as a JSON run summary or a
+Prometheus textfile (for node_exporter's textfile collector). Also holds the
+stdout wrapper behind their --quiet mode.
+"""
+import contextlib
+import functools
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+# Stages in pipeline order, as reported in the run summary
+STAGES = ["read", "validate", "item_xml", "schema", "test_xml", "manifest", "archive", "upload"]
+
+# Upper bounds (seconds) of the HTTP latency histogram buckets
+HTTP_LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+PROMETHEUS_PREFIX = "tao_qti"
+
+
+class Metrics:
+    """
+    Thread-safe registry of stage timers, counters and histograms.
+
+    Timers accumulate wall time and call counts per stage (so a stage entered once
+    per item adds up). Process pool workers hand their numbers back with drain()
+    and the parent adds them with merge().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.histograms = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, stage, seconds, calls=1):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += calls
+            entry["seconds"] += seconds
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """Decorator form of time()."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.time(stage):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name, value, buckets=HTTP_LATENCY_BUCKETS):
+        with self._lock:
+            histogram = self.histograms.setdefault(
+                name, {"buckets": list(buckets), "counts": [0] * len(buckets), "count": 0, "sum": 0.0}
+            )
+            for i, bound in enumerate(histogram["buckets"]):
+                if value <= bound:
+                    histogram["counts"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += value
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps({"stages": self.stages, "counters": self.counters, "histograms": self.histograms}))
+
+    def drain(self):
+        """Returns a snapshot and resets the registry (used by process pool workers)."""
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot):
+        for stage, entry in snapshot["stages"].items():
+            self.add_time(stage, entry["seconds"], entry["calls"])
+        for name, value in snapshot["counters"].items():
+            self.incr(name, value)
+        with self._lock:
+            for name, other in snapshot["histograms"].items():
+                histogram = self.histograms.setdefault(
+                    name, {"buckets": other["buckets"], "counts": [0] * len(other["buckets"]), "count": 0, "sum": 0.0}
+                )
+                histogram["counts"] = [a + b for a, b in zip(histogram["counts"], other["counts"])]
+                histogram["count"] += other["count"]
+                histogram["sum"] += other["sum"]
+
+    def summary(self, command, **extra):
+        """JSON-ready run summary: stages in pipeline order, counters and histograms."""
+        snapshot = self.snapshot()
+        stages = {
+            stage: {"calls": entry["calls"], "seconds": round(entry["seconds"], 6)}
+            for stage, entry in sorted(snapshot["stages"].items(),
+                                       key=lambda kv: STAGES.index(kv[0]) if kv[0] in STAGES else len(STAGES))
+        }
+        histograms = {}
+        for name, histogram in snapshot["histograms"].items():
+            histograms[name] = {
+                "buckets": {str(bound): count for bound, count in zip(histogram["buckets"], histogram["counts"])},
+                "count": histogram["count"],
+                "sum": round(histogram["sum"], 6),
+            }
+        return {
+            "command": command,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started_at)),
+            "duration_seconds": round(time.time() - self.started_at, 3),
+            **extra,
+            "stages": stages,
+            "counters": dict(sorted(snapshot["counters"].items())),
+            "histograms": histograms,
+        }
+
+    def write_json(self, path, command, **extra):
+        _write_atomically(path, json.dumps(self.summary(command, **extra), indent=2) + "\n")
+
+    def write_prometheus(self, path, command):
+        """Writes the metrics in the Prometheus text exposition format."""
+        _write_atomically(path, self.prometheus_text(command))
+
+    def prometheus_text(self, command):
+        """The metrics in the Prometheus text exposition format (also served by service.py)."""
+        snapshot = self.snapshot()
+        labels = f'command="{command}"'
+        lines = [
+            f"# HELP {PROMETHEUS_PREFIX}_stage_seconds_total Wall time spent per stage.",
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds_total counter",
+        ]
+        lines += [f'{PROMETHEUS_PREFIX}_stage_seconds_total{{{labels},stage="{stage}"}} {entry["seconds"]:.6f}'
+                  for stage, entry in snapshot["stages"].items()]
+        lines += [f"# TYPE {PROMETHEUS_PREFIX}_stage_calls_total counter"]
+        lines += [f'{PROMETHEUS_PREFIX}_stage_calls_total{{{labels},stage="{stage}"}} {entry["calls"]}'
+                  for stage, entry in snapshot["stages"].items()]
+        for name, value in sorted(snapshot["counters"].items()):
+            lines += [f"# TYPE {PROMETHEUS_PREFIX}_{name}_total counter", f"{PROMETHEUS_PREFIX}_{name}_total{{{labels}}} {value}"]
+        for name, histogram in snapshot["histograms"].items():
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} histogram")
+            for bound, count in zip(histogram["buckets"], histogram["counts"]):
+                lines.append(f'{PROMETHEUS_PREFIX}_{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{PROMETHEUS_PREFIX}_{name}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{PROMETHEUS_PREFIX}_{name}_sum{{{labels}}} {histogram['sum']:.6f}")
+            lines.append(f"{PROMETHEUS_PREFIX}_{name}_count{{{labels}}} {histogram['count']}")
+        lines.append(f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds{{{labels}}} {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+
+def _write_atomically(path, text):
+    # The textfile collector may read at any moment, so never expose a half-written file
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+# Process-wide registry used by the scripts
+METRICS = Metrics()
+
+
+def write_run_report(command, json_path=None, prometheus_path=None, **extra):
+    """Writes the requested reports of METRICS and says where they went."""
+    if json_path:
+        METRICS.write_json(json_path, command, **extra)
+        print(f"📊 Run summary written to: '{os.path.abspath(json_path)}'")
+    if prometheus_path:
+        METRICS.write_prometheus(prometheus_path, command)
+        print(f"📊 Prometheus metrics written to: '{os.path.abspath(prometheus_path)}'")
+
+
+class QuietOutput(io.TextIOBase):
+    """
+    sys.stdout wrapper for quiet runs. Inside hold(), a thread's writes are buffered
+    for that thread only, and the caller decides whether to release() them (e.g.
+    only when the package failed). Other writes pass straight through.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def write(self, text):
+        held = getattr(self._local, "held", None)
+        if held is None:
+            return self.stream.write(text)
+        held.append(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    @contextlib.contextmanager
+    def hold(self):
+        held = []
+        self._local.held = held
+        try:
+            yield held
+        finally:
+            self._local.held = None
+
+    def release(self, held):
+        self.stream.write("".join(held))
+
+
+@contextlib.contextmanager
+def quiet_stdout():
+    """Installs a QuietOutput as sys.stdout while active (or reuses the one already installed)."""
+    if isinstance(sys.stdout, QuietOutput):
+        yield sys.stdout
+        return
+    quiet_output = QuietOutput(sys.stdout)
+    sys.stdout = quiet_output
+    try:
+        yield quiet_output
+    finally:
+        sys.stdout = quiet_output.stream
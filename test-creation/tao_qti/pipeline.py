@@ -0,0 +1,248 @@
+"""
+Pipelined generate-and-upload: builds the QTI packages of an Excel/CSV file and
+imports each one into TAO as soon as it is built.
+
+The package builder (main.py, serial or with --workers processes) hands every
+finished package, as zip bytes in memory, to a bounded queue. Upload threads
+(taoApiUtil.py) take packages off the queue and import them over one pooled
+session. When the uploads fall behind, the queue fills up and the builder waits,
+so at most --queue-size packages are held in memory at any time. Generation and
+upload overlap, so a run takes about as long as the slower of the two.
+
+Usage: python -m tao_qti.pipeline <path_to_excel_file> <output_folder_for_packages> [options]
+"""
+import contextlib
+import os
+import queue
+import sys
+import threading
+import time
+
+from . import main, taoApiUtil
+from .metrics import METRICS, quiet_stdout, write_run_report
+
+
+class UploadPipeline:
+    """
+    Bounded queue of InMemoryPackages consumed by upload threads.
+
+    submit() is the on_package callback of main's package builders: it optionally
+    saves the zip, then blocks while the queue is full. Results are collected per
+    filename in the same {endpoint: True, False or None} form as taoApiUtil.import_packages, and
+    the uploads share one taoApiUtil.UploadController in the same way.
+    """
+
+    def __init__(self, upload_workers=1, queue_size=None, journal=None, mode="auto", save_dir=None, quiet=False,
+                 adaptive=True, retries=taoApiUtil.UPLOAD_RETRIES, retry_unverified=False):
+        self.journal = journal
+        self.retry_unverified = retry_unverified
+        self.quiet = quiet
+        self.mode = mode
+        self.save_dir = save_dir
+        self.queue = queue.Queue(maxsize=queue_size or upload_workers * 2)
+        self.filenames = []
+        self.results = {}
+        self.session = taoApiUtil.create_tao_session(pool_size=upload_workers)
+        self.controller = taoApiUtil.UploadController(upload_workers, adaptive=adaptive, retries=retries)
+        self.threads = [
+            threading.Thread(target=self._upload_worker, name=f"upload-{i + 1}", daemon=True)
+            for i in range(upload_workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, group, package):
+        if package is None:
+            return
+        if self.save_dir:
+            # Written from the same bytes that are uploaded; nothing is read back
+            zip_path = os.path.join(self.save_dir, package.filename)
+            with open(f"{zip_path}.tmp", "wb") as f:
+                f.write(package.data)
+            os.replace(f"{zip_path}.tmp", zip_path)
+            METRICS.incr("bytes_written", len(package.data))
+        self.filenames.append(package.filename)
+        self.queue.put(package) # Blocks while the queue is full: backpressure on the builder
+
+    def _upload_worker(self):
+        while True:
+            package = self.queue.get()
+            if package is None:
+                return
+            try:
+                endpoints = taoApiUtil.plan_imports(package.filename, self.mode, zip_data=package.data)
+                import_one = taoApiUtil.import_package_quietly if self.quiet else taoApiUtil.import_package
+                self.results[package.filename] = import_one(
+                    package.filename, session=self.session, journal=self.journal, endpoints=endpoints,
+                    zip_data=package.data, controller=self.controller,
+                    retry_unverified=self.retry_unverified
+                )
+            except Exception as e:
+                print(f"❌ ERROR: Exception occurred while importing '{package.filename}': {e}")
+                self.results[package.filename] = {}
+
+    def close(self):
+        """Waits for the queued uploads to finish. Returns filename -> {endpoint: True, False or None}."""
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.session.close()
+        if self.controller.adaptive and len(self.threads) > 1:
+            print(f"Upload concurrency settled at {self.controller.limit.limit} of {len(self.threads)}.")
+        return {filename: self.results.get(filename, {}) for filename in self.filenames}
+
+
+def print_usage():
+    print("Usage: python -m tao_qti.pipeline <path_to_excel_file> <output_folder_for_packages> [options]")
+    print("Options (plus every generation option of main.py except --incremental):")
+    print("  --upload-workers N  Upload up to N packages concurrently (default 1); adapts as in taoApiUtil.py")
+    print("  --fixed-concurrency Always keep --upload-workers uploads in flight")
+    print(f"  --retries N         Retries of a refused upload request (default {taoApiUtil.UPLOAD_RETRIES})")
+    print("  --retry-unverified  Send again the uploads whose outcome was unknown (check TAO first)")
+    print("  --queue-size N      Built packages held in memory waiting for upload (default 2 per upload worker)")
+    print("  --no-save           Don't write the zips to the output folder, only upload them")
+    print(f"  --journal FILE      Upload journal (default: <output_folder_for_packages>/{taoApiUtil.UPLOAD_JOURNAL_FILENAME})")
+    print("  --no-journal        Upload everything without consulting or writing a journal")
+    print("  --mode MODE         auto (default), items, tests or both; see taoApiUtil.py")
+    print("Example: python -m tao_qti.pipeline test.xlsx qti_output --workers 4 --upload-workers 8")
+
+
+def parse_args(argv):
+    """
+    Parses command line arguments into (excel_file_path, output_dir, options).
+
+    Upload options are handled here; everything else is parsed by main.parse_args.
+    """
+    options = {"upload_workers": 1, "queue_size": None, "save": True, "journal": None, "use_journal": True,
+               "mode": "auto", "adaptive": True, "retries": taoApiUtil.UPLOAD_RETRIES,
+               "retry_unverified": False}
+    generation_args = []
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg in ("--upload-workers", "--queue-size", "--retries"):
+            if not args:
+                raise ValueError(f"{arg} requires a value.")
+            value = args.pop(0)
+            try:
+                number = int(value)
+            except ValueError:
+                raise ValueError(f"{arg} must be an integer, got '{value}'.")
+            minimum = 0 if arg == "--retries" else 1
+            if number < minimum:
+                raise ValueError(f"{arg} must be at least {minimum}.")
+            options[arg[2:].replace("-", "_")] = number
+        elif arg == "--journal":
+            if not args:
+                raise ValueError("--journal requires a value.")
+            options["journal"] = args.pop(0)
+        elif arg == "--mode":
+            if not args:
+                raise ValueError("--mode requires a value.")
+            options["mode"] = args.pop(0)
+            if options["mode"] not in taoApiUtil.IMPORT_MODES:
+                raise ValueError(f"--mode must be one of {list(taoApiUtil.IMPORT_MODES)}.")
+        elif arg == "--no-journal":
+            options["use_journal"] = False
+        elif arg == "--no-save":
+            options["save"] = False
+        elif arg == "--fixed-concurrency":
+            options["adaptive"] = False
+        elif arg == "--retry-unverified":
+            options["retry_unverified"] = True
+        else:
+            generation_args.append(arg)
+    excel_file_path, output_dir, generation_options = main.parse_args(generation_args)
+    if generation_options["incremental"]:
+        raise ValueError("--incremental is not supported by the pipeline; packages are uploaded from memory.")
+    options.update(generation_options)
+    return excel_file_path, output_dir, options
+
+
+def cli_main(argv):
+    """Runs the command line (python -m tao_qti.pipeline ... or tao-qti run ...) with the arguments in argv."""
+    try:
+        excel_file_path, output_dir, options = parse_args(argv)
+    except ValueError as ve:
+        print(f"❌ Error: {ve}")
+        print_usage()
+        sys.exit(1)
+
+    if not os.path.isfile(excel_file_path):
+        print(f"❌ Error: File '{excel_file_path}' does not exist.")
+        sys.exit(1)
+
+    if not taoApiUtil.base_url or not taoApiUtil.username or not taoApiUtil.password:
+        print(f"❌ Error: Environment variables not set. Create .env file with variables as per sample.env with proper values. Try to run source .env command if you are using bash.")
+        sys.exit(1)
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    journal = None
+    if options["use_journal"]:
+        journal_path = options["journal"] or os.path.join(output_dir, taoApiUtil.UPLOAD_JOURNAL_FILENAME)
+        journal = taoApiUtil.UploadJournal(journal_path)
+        print(f"📒 Using upload journal: {journal_path}")
+
+    start = time.perf_counter()
+    pipeline = UploadPipeline(
+        upload_workers=options["upload_workers"], queue_size=options["queue_size"], journal=journal,
+        mode=options["mode"], save_dir=output_dir if options["save"] else None, quiet=options["quiet"],
+        adaptive=options["adaptive"], retries=options["retries"], retry_unverified=options["retry_unverified"]
+    )
+    package_options = {
+        "workers": options["workers"],
+        "compression": options["compression"],
+        "compresslevel": options["compresslevel"],
+        "rejected_report_path": options["rejected_report_path"],
+        "item_serializer": options["item_serializer"],
+        "pretty_print": options["pretty_print"],
+        "in_memory": True,
+        "on_package": pipeline.submit,
+        "quiet": options["quiet"],
+        "stream_xml": options["stream_xml"],
+        "media_source_dir": options["media_source_dir"],
+        "max_image_size": options["max_image_size"],
+        "validate_schema": options["validate_schema"],
+        "schema_dir": options["schema_dir"],
+        "max_items_per_section": options["max_items_per_section"],
+        "max_items_per_package": options["max_items_per_package"],
+        "max_package_bytes": options["max_package_bytes"],
+        "item_cache_bytes": options["item_cache_bytes"],
+        "item_cache_dir": options["item_cache_dir"],
+    }
+
+    try:
+        # Installed once for the whole run, so the builder and the upload threads share it
+        with quiet_stdout() if options["quiet"] else contextlib.nullcontext():
+            try:
+                if options["stream"]:
+                    main.create_qti_packages_from_stream(excel_file_path, output_base_dir=output_dir, **package_options)
+                else:
+                    df_exam_data = main.read_exam_data(excel_file_path, read_cache_dir=options["read_cache_dir"])
+                    if df_exam_data.empty:
+                        print("No valid data found in the input file to process.")
+                    else:
+                        main.create_qti_packages_by_assessment_code(df_exam_data, output_base_dir=output_dir, **package_options)
+            finally:
+                # Let the packages already built finish uploading, even if generation failed
+                print("\n⏳ Waiting for the remaining uploads...")
+                results = pipeline.close()
+    except ValueError as ve:
+        print(f"❌ ValueError: {ve}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ An unexpected error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if journal is not None:
+            journal.close()
+        write_run_report("pipeline", options["metrics_json"], options["prometheus_textfile"])
+
+    taoApiUtil.print_import_summary(list(results), results)
+    print(f"\n✅ Generated and uploaded {len(results)} packages in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    cli_main(sys.argv[1:])
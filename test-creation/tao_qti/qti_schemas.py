@@ -0,0 +1,320 @@
+"""
+Offline XML Schema validation of generated QTI 2.1 items, tests and manifests.
+
+The XSDs named in the generated xsi:schemaLocation attributes (and everything they
+import) are kept in a local mirror, by default the schemas/ folder next to this
+file, laid out as <host>/<path> of their URLs, e.g.
+
+    schemas/www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_v2p1p1.xsd
+
+Schema URLs are resolved against the mirror only, so validation never touches the
+network. Each distinct schemaLocation is compiled into an lxml XMLSchema once per
+process (so once per worker under --workers) and reused for every document.
+
+--fetch also writes SHA256SUMS, the checksums of every mirrored file. Before a
+run validates anything, check_schema_mirror() makes sure every file listed there
+is present and unchanged, so an incomplete mirror fails at startup instead of once
+per package.
+
+The bundled mirror is meant to be filled with --fetch and committed. When it is
+incomplete and no --schema-dir was given, the first check fetches the schemas into
+tao_qti/schemas in the user's cache directory (see default_schema_dir()) and later
+runs use that copy; offline, the check fails with FETCH_HINT as before.
+
+Fill the mirror once, on a machine with internet access:
+
+Usage: python -m tao_qti.qti_schemas --fetch [--schema-dir DIR]
+"""
+import argparse
+import hashlib
+import io
+import os
+import sys
+import threading
+import urllib.parse
+import zipfile
+
+DEFAULT_SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+
+XSD_NAMESPACE = "http://www.w3.org/2001/XMLSchema"
+XSI_SCHEMA_LOCATION = "{http://www.w3.org/2001/XMLSchema-instance}schemaLocation"
+
+# The schemaLocation values main.py writes: items and tests, then manifests
+QTI_SCHEMA_LOCATION = "http://www.imsglobal.org/xsd/imsqti_v2p1 http://www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_v2p1p1.xsd"
+MANIFEST_SCHEMA_LOCATION = (
+    "http://www.imsglobal.org/xsd/imscp_v1p1 http://www.imsglobal.org/xsd/qti/qtiv2p1/qtiv2p1_imscpv1p2_v1p0.xsd "
+    "http://ltsc.ieee.org/xsd/LOM http://www.imsglobal.org/xsd/imsmd_loose_v1p3p2.xsd "
+    "http://www.imsglobal.org/xsd/imsqti_metadata_v2p1 http://www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_metadata_v2p1p1.xsd"
+)
+SCHEMA_LOCATIONS = [QTI_SCHEMA_LOCATION, MANIFEST_SCHEMA_LOCATION]
+
+# Schema errors quoted per invalid document
+MAX_REPORTED_ERRORS = 3
+
+# Checksums of the mirrored files (sha256sum format), written by --fetch
+SCHEMA_MANIFEST_FILENAME = "SHA256SUMS"
+
+FETCH_HINT = "Run 'python -m tao_qti.qti_schemas --fetch' once with internet access."
+
+
+def schema_location_pairs(schema_location):
+    """Splits an xsi:schemaLocation value into (namespace, url) pairs."""
+    tokens = schema_location.split()
+    return list(zip(tokens[0::2], tokens[1::2]))
+
+
+def local_schema_path(url, schema_dir=DEFAULT_SCHEMA_DIR):
+    """Path of a schema URL in the mirror (<schema_dir>/<host>/<path>)."""
+    parts = urllib.parse.urlsplit(url)
+    return os.path.join(schema_dir, parts.netloc, *parts.path.lstrip("/").split("/"))
+
+
+def missing_schemas(schema_dir=None):
+    """Root schema files of SCHEMA_LOCATIONS that are not in the mirror."""
+    schema_dir = schema_dir or DEFAULT_SCHEMA_DIR
+    return [
+        local_schema_path(url, schema_dir)
+        for schema_location in SCHEMA_LOCATIONS for _, url in schema_location_pairs(schema_location)
+        if not os.path.isfile(local_schema_path(url, schema_dir))
+    ]
+
+
+def _file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def write_schema_manifest(schema_dir=DEFAULT_SCHEMA_DIR):
+    """Writes SHA256SUMS for every file of the mirror. Returns the number of files listed."""
+    lines = []
+    for root, _, names in os.walk(schema_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            relative_path = os.path.relpath(path, schema_dir).replace(os.sep, "/")
+            if relative_path != SCHEMA_MANIFEST_FILENAME and not name.endswith(".tmp"):
+                lines.append(f"{_file_sha256(path)}  {relative_path}\n")
+    manifest_path = os.path.join(schema_dir, SCHEMA_MANIFEST_FILENAME)
+    with open(f"{manifest_path}.tmp", "w", encoding="utf-8", newline="\n") as f:
+        f.writelines(sorted(lines, key=lambda line: line.split("  ", 1)[1]))
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return len(lines)
+
+
+def schema_mirror_problems(schema_dir=None):
+    """
+    Checks the mirror against its SHA256SUMS. Returns a list of problems, empty when
+    the mirror is complete: missing root schemas, a missing manifest, and files
+    missing or changed since they were fetched.
+    """
+    schema_dir = schema_dir or DEFAULT_SCHEMA_DIR
+    problems = [f"'{path}' is missing" for path in missing_schemas(schema_dir)]
+    manifest_path = os.path.join(schema_dir, SCHEMA_MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            entries = [line.rstrip("\n").split("  ", 1) for line in f if line.strip()]
+    except FileNotFoundError:
+        return problems + [f"'{manifest_path}' is missing"]
+    for checksum, relative_path in entries:
+        path = os.path.join(schema_dir, *relative_path.split("/"))
+        if not os.path.isfile(path):
+            problems.append(f"'{path}' is missing")
+        elif _file_sha256(path) != checksum:
+            problems.append(f"'{path}' changed since it was fetched")
+    return problems
+
+
+def user_schema_dir():
+    """The fallback mirror: tao_qti/schemas in the user's cache directory."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "tao_qti", "schemas")
+
+
+def default_schema_dir():
+    """The mirror used without --schema-dir: the bundled one when it is complete, else user_schema_dir()."""
+    if not schema_mirror_problems(DEFAULT_SCHEMA_DIR):
+        return DEFAULT_SCHEMA_DIR
+    return user_schema_dir()
+
+
+def check_schema_mirror(schema_dir=None):
+    """
+    Raises ValueError, naming the first problem, unless the mirror is complete (see
+    schema_mirror_problems). Without schema_dir, an incomplete bundled mirror is
+    replaced by user_schema_dir(), fetched there on first use.
+    """
+    if schema_dir is None:
+        schema_dir = default_schema_dir()
+        if schema_dir != DEFAULT_SCHEMA_DIR and schema_mirror_problems(schema_dir):
+            print(f"The bundled QTI schemas are missing; fetching them once into '{schema_dir}'...")
+            try:
+                fetch_schemas(schema_dir, quiet=True)
+            except Exception as e: # Offline, or a server answering with something that isn't XML
+                raise ValueError(f"The bundled schema mirror '{DEFAULT_SCHEMA_DIR}' is incomplete and fetching the "
+                                 f"schemas into '{schema_dir}' failed: {e}. {FETCH_HINT}") from e
+    problems = schema_mirror_problems(schema_dir)
+    if problems:
+        more = f" (and {len(problems) - 1} more problems)" if len(problems) > 1 else ""
+        raise ValueError(f"The local schema mirror '{schema_dir}' is incomplete: "
+                         f"{problems[0]}{more}. {FETCH_HINT}")
+
+
+def local_schema_resolver(schema_dir):
+    """An lxml resolver serving http(s) schema URLs from the mirror; anything not mirrored fails instead of being downloaded."""
+    from lxml import etree
+
+    class LocalSchemaResolver(etree.Resolver):
+        def resolve(self, url, public_id, context):
+            if url.startswith(("http://", "https://")):
+                path = local_schema_path(url, schema_dir)
+                if os.path.isfile(path):
+                    return self.resolve_filename(path, context)
+                raise FileNotFoundError(f"Schema '{url}' is not in the local mirror (expected at '{path}').")
+            return None # Relative includes of mirrored files resolve to the mirror already
+
+    return LocalSchemaResolver()
+
+
+class SchemaCache:
+    """
+    Compiled XMLSchema per schemaLocation value, built on first use.
+
+    A document naming several namespaces (like the manifest) is validated against a
+    small wrapper schema importing each (namespace, url) pair.
+    """
+
+    def __init__(self, schema_dir=DEFAULT_SCHEMA_DIR):
+        self.schema_dir = schema_dir
+        self._schemas = {}
+        self._lock = threading.Lock()
+
+    def get(self, schema_location):
+        schema = self._schemas.get(schema_location)
+        if schema is None:
+            with self._lock:
+                schema = self._schemas.get(schema_location)
+                if schema is None:
+                    schema = self._compile(schema_location)
+                    self._schemas[schema_location] = schema
+        return schema
+
+    def _compile(self, schema_location):
+        from lxml import etree
+
+        wrapper = etree.Element(f"{{{XSD_NAMESPACE}}}schema", nsmap={"xs": XSD_NAMESPACE})
+        for namespace, url in schema_location_pairs(schema_location):
+            etree.SubElement(wrapper, f"{{{XSD_NAMESPACE}}}import", namespace=namespace, schemaLocation=url)
+        parser = etree.XMLParser(no_network=True)
+        parser.resolvers.add(local_schema_resolver(self.schema_dir))
+        return etree.XMLSchema(etree.fromstring(etree.tostring(wrapper), parser))
+
+    def validate(self, document):
+        """
+        Validates an element tree or serialized document against the schemas of its
+        xsi:schemaLocation. Returns a list of error messages (empty when valid).
+        """
+        from lxml import etree
+
+        if isinstance(document, bytes):
+            document = etree.fromstring(document)
+        schema_location = document.get(XSI_SCHEMA_LOCATION)
+        if not schema_location:
+            return [f"<{etree.QName(document).localname}> has no xsi:schemaLocation to validate against."]
+        schema = self.get(schema_location)
+        if schema.validate(document):
+            return []
+        return [f"line {error.line}: {error.message}" for error in schema.error_log]
+
+
+# One cache per schema directory and process, shared by every package built in that process
+_SCHEMA_CACHES = {}
+
+
+def get_schema_cache(schema_dir=None):
+    """
+    The process's SchemaCache for schema_dir (default_schema_dir() if None); the
+    mirror is checked (check_schema_mirror) when it is created.
+    """
+    if schema_dir not in _SCHEMA_CACHES:
+        check_schema_mirror(schema_dir)
+        _SCHEMA_CACHES[schema_dir] = SchemaCache(schema_dir or default_schema_dir())
+    return _SCHEMA_CACHES[schema_dir]
+
+
+def validate_package(zip_source, schema_cache):
+    """
+    Validates every XML document of a package zip (a path or the zip bytes).
+
+    Returns:
+        dict: entry name -> error messages, for the invalid documents only.
+    """
+    from lxml import etree
+
+    errors = {}
+    with zipfile.ZipFile(io.BytesIO(zip_source) if isinstance(zip_source, bytes) else zip_source) as zf:
+        for name in zf.namelist():
+            if not name.lower().endswith(".xml"):
+                continue
+            try:
+                document_errors = schema_cache.validate(zf.read(name))
+            except etree.XMLSyntaxError as e:
+                document_errors = [f"not well-formed: {e}"]
+            if document_errors:
+                errors[name] = document_errors
+    return errors
+
+
+def fetch_schemas(schema_dir=DEFAULT_SCHEMA_DIR, quiet=False):
+    """Downloads the schemas of SCHEMA_LOCATIONS and everything they import or include into the mirror."""
+    import requests # Only needed to fill the mirror
+    from lxml import etree
+
+    pending = [url for schema_location in SCHEMA_LOCATIONS for _, url in schema_location_pairs(schema_location)]
+    seen = set()
+    with requests.Session() as session:
+        while pending:
+            url = pending.pop()
+            if url in seen:
+                continue
+            seen.add(url)
+            path = local_schema_path(url, schema_dir)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+                if not quiet:
+                    print(f"  = {url}")
+            else:
+                response = session.get(url, timeout=60)
+                response.raise_for_status()
+                data = response.content
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(f"{path}.tmp", "wb") as f:
+                    f.write(data)
+                os.replace(f"{path}.tmp", path)
+                if not quiet:
+                    print(f"  ↓ {url}")
+            for reference in etree.fromstring(data).iter(
+                f"{{{XSD_NAMESPACE}}}import", f"{{{XSD_NAMESPACE}}}include", f"{{{XSD_NAMESPACE}}}redefine"
+            ):
+                location = reference.get("schemaLocation")
+                if location:
+                    pending.append(urllib.parse.urljoin(url, location))
+    write_schema_manifest(schema_dir)
+    return len(seen)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fetch", action="store_true", help="Download the schemas into the mirror")
+    parser.add_argument("--schema-dir", default=DEFAULT_SCHEMA_DIR, help=f"Schema mirror (default {DEFAULT_SCHEMA_DIR})")
+    args = parser.parse_args()
+
+    if args.fetch:
+        print(f"Fetching QTI 2.1 and IMS CP schemas into '{args.schema_dir}'...")
+        print(f"✅ {fetch_schemas(args.schema_dir)} schema files in the mirror.")
+    problems = schema_mirror_problems(args.schema_dir)
+    if problems:
+        print("❌ The schema mirror is incomplete:\n" + "\n".join(f"  {problem}" for problem in problems))
+        sys.exit(1)
+    for schema_location in SCHEMA_LOCATIONS:
+        get_schema_cache(args.schema_dir).get(schema_location)
+    print(f"✅ All schemas present in '{args.schema_dir}' and compiled.")
@@ -0,0 +1,413 @@
+"""
+Generation service: a local HTTP endpoint that turns an uploaded workbook into QTI
+packages, without starting an interpreter, importing pandas/lxml or writing to
+disk per request.
+
+Packages are built by a pool of --workers processes that is started once with
+the service and warmed up: every worker builds a sample package first, so lxml,
+the XML templates and (with --validate) the compiled schemas are ready before
+the first request. The service reads the sample workbook through the same path
+as uploads. A request then only pays for reading its rows and building its own
+packages, so a single-assessment preview comes back in milliseconds.
+
+    POST /generate
+        Body: the workbook as multipart/form-data (field "workbook", .xlsx or .csv),
+        the raw file (Content-Type text/csv or the .xlsx media type), or JSON rows
+        ({"rows": [{"Item code": ..., "Assessment Code": ..., ...}, ...]}).
+        ?assessment=CODE (repeatable) builds only those Assessment Codes.
+        Response: the package zip when there is one package. Several packages come
+        back as one zip of the package zips plus report.json, streamed while the
+        packages are built. Rejected rows are counted in X-QTI-Rejected-Rows and
+        listed in report.json.
+    GET /health   {"status": "ok", "workers": N}
+    GET /metrics  Metrics of all requests so far, in Prometheus text format
+
+Usage: python -m tao_qti.service [--host 127.0.0.1] [--port 8000] [--workers N] [generation options of main.py]
+"""
+import email.parser
+import email.policy
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from . import main
+from .metrics import METRICS, write_run_report
+
+# Content-Type of raw uploads -> file extension read_exam_data should treat them as
+UPLOAD_EXTENSIONS = {
+    "text/csv": ".csv",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": ".xlsx",
+}
+
+DEFAULT_MAX_UPLOAD_MB = 20
+
+BUNDLE_FILENAME = "qti_packages.zip"
+BUNDLE_REPORT_FILENAME = "report.json"
+
+# Upper bounds (seconds) of the request latency histogram buckets; previews are expected well below 0.1
+REQUEST_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+
+class RequestError(Exception):
+    """A request that can't be served, with the HTTP status to answer it with."""
+
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def sample_workbook():
+    """The .xlsx bytes of a one-row workbook, read and built at startup to warm up every code path."""
+    import pandas as pd
+
+    row = {column: "" for column in main.EXPECTED_COLUMNS}
+    row.update({"Item code": "WARMUP_1", "Assessment Code": "WARMUP", "Item Stem": "Warm-up question",
+                "Option A": "Yes", "Option B": "No", "Correct Answer": "A"})
+    data = io.BytesIO()
+    pd.DataFrame([row]).to_excel(data, index=False)
+    return data.getvalue()
+
+
+def _warm_up_worker(sample_group, package_options):
+    """Process pool initializer: builds the sample package once so the worker is warm."""
+    main._create_package_captured(sample_group, None, package_options)
+    # Forked from the parent and then used for the warm-up; neither belongs to a request
+    METRICS.reset()
+
+
+class GenerationService:
+    """
+    Builds packages for requests on a warm process pool shared by all requests.
+
+    Reading, validation and sharding run in the request thread; every package is
+    built in the pool with in_memory=True and comes back as an InMemoryPackage.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.workers = options["workers"]
+        self.package_options = {
+            "compression": options["compression"],
+            "compresslevel": options["compresslevel"],
+            "item_serializer": options["item_serializer"],
+            "pretty_print": options["pretty_print"],
+            "in_memory": True,
+            "stream_xml": options["stream_xml"],
+            "media_source_dir": options["media_source_dir"],
+            "max_image_size": options["max_image_size"],
+            "validate_schema": options["validate_schema"],
+            "schema_dir": options["schema_dir"],
+            "max_items_per_section": options["max_items_per_section"],
+            "item_cache_bytes": options["item_cache_bytes"],
+            "item_cache_dir": options["item_cache_dir"],
+        }
+        # Also warms up this process: openpyxl, the read path and validation
+        df = main.read_exam_data("warm-up.xlsx", data=sample_workbook())
+        sample_group, = self.validated_groups(df)[1]
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_warm_up_worker, initargs=(sample_group, self.package_options)
+        )
+        # Starts the workers now instead of on the first request
+        for future in [self.executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+        METRICS.reset()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def read_rows(self, content_type, body, query):
+        """Reads the request body into an exam DataFrame (see read_exam_data)."""
+        import pandas as pd
+
+        media_type = content_type.split(";")[0].strip().lower()
+        if media_type == "application/json":
+            try:
+                payload = json.loads(body)
+            except ValueError as e:
+                raise RequestError(400, f"Invalid JSON: {e}")
+            rows = payload.get("rows") if isinstance(payload, dict) else payload
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise RequestError(400, 'Expected a JSON list of rows, or {"rows": [...]}, with one object per row.')
+            with METRICS.time("read"):
+                df, filtered_rows = main.prepare_exam_frame(pd.DataFrame(rows), "JSON rows")
+            main.warn_about_filtered_rows(df, filtered_rows)
+            return df
+
+        if media_type == "multipart/form-data":
+            message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+            )
+            parts = {
+                part.get_param("name", header="content-disposition"): part
+                for part in message.iter_parts() if part.get_content_disposition() == "form-data"
+            }
+            if "workbook" not in parts:
+                raise RequestError(400, "Missing file field 'workbook'.")
+            filename = parts["workbook"].get_filename() or "workbook.xlsx"
+            data = parts["workbook"].get_payload(decode=True) or b""
+        elif media_type in UPLOAD_EXTENSIONS:
+            filename = query.get("filename", [f"workbook{UPLOAD_EXTENSIONS[media_type]}"])[0]
+            data = body
+        else:
+            raise RequestError(415, f"Unsupported Content-Type '{media_type}'; send multipart/form-data, "
+                                    f"JSON rows or one of {list(UPLOAD_EXTENSIONS)}.")
+        if os.path.splitext(filename)[1].lower() not in UPLOAD_EXTENSIONS.values():
+            raise RequestError(415, f"'{filename}' is not a .xlsx or .csv file.")
+        return main.read_exam_data(os.path.basename(filename), data=data)
+
+    def validated_groups(self, df, assessment_codes=None):
+        """Validates the rows (of the requested Assessment Codes only) into (validation, sharded groups)."""
+        if assessment_codes:
+            unknown = sorted(set(assessment_codes) - set(df['Assessment Code']))
+            if unknown:
+                raise RequestError(404, f"Unknown Assessment Codes: {unknown}")
+            df = df[df['Assessment Code'].isin(assessment_codes)]
+        validation = main.validate_exam_data(df)
+        groups = list(main.shard_assessment_groups(
+            main.group_validated_items(validation, df.groupby('Assessment Code')),
+            self.options["max_items_per_package"], self.options["max_package_bytes"],
+            self.options["media_source_dir"], quiet=True
+        ))
+        return validation, groups
+
+    def build_packages(self, groups):
+        """
+        Builds the groups on the pool, yielding (group, InMemoryPackage or None, console
+        output) in group order. Like main's pool, only a window of groups is submitted
+        ahead of the one being yielded.
+        """
+        pending = deque()
+        for group in groups:
+            pending.append((group, self.executor.submit(main._create_package_in_worker, group, None, self.package_options)))
+            if len(pending) >= self.workers * 2:
+                yield self._result(*pending.popleft())
+        while pending:
+            yield self._result(*pending.popleft())
+
+    def _result(self, group, future):
+        try:
+            package, chunks, worker_metrics = future.result()
+        except Exception as e:
+            # Only reached if the worker itself died
+            return group, None, f"  ❌ An unexpected error occurred while processing Assessment Code '{group.assessment_code}': {e}\n"
+        METRICS.merge(worker_metrics)
+        return group, package, "".join(text for _, text in chunks)
+
+
+class ChunkedResponseWriter(io.RawIOBase):
+    """Write-only, unseekable file object sending everything written as HTTP/1.1 chunks."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if data:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), bytes(data)))
+        return len(data)
+
+    def finish(self):
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class GenerationHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so the portal can reuse its connection
+    server_version = "QTIGenerationService/1.0"
+    # Headers and body are separate writes; with Nagle's algorithm the body waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if not self.server.service.options["quiet"]:
+            super().log_message(format, *args)
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self.send_json(200, {"status": "ok", "workers": self.server.service.workers})
+        elif path == "/metrics":
+            self.send_body(200, METRICS.prometheus_text("service").encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self.send_json(404, {"error": f"Not found: {path}"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            if url.path != "/generate":
+                self.rfile.read(length)
+                raise RequestError(404, f"Not found: {url.path}")
+            if length > self.server.max_upload_bytes:
+                self.close_connection = True # The body is left unread
+                raise RequestError(413, f"Upload of {length} bytes is over the limit of {self.server.max_upload_bytes} bytes.")
+            self.generate(self.rfile.read(length), parse_qs(url.query))
+        except RequestError as e:
+            self.send_json(e.status, {"error": str(e), **e.details})
+        except ValueError as e:
+            # read_exam_data and validation report unusable input as ValueError
+            self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            print(f"❌ An unexpected error occurred while serving {self.path}: {e}", file=sys.stderr)
+            self.send_json(500, {"error": f"Unexpected error: {e}"})
+        finally:
+            METRICS.incr("service_requests")
+            METRICS.observe("request_latency_seconds", time.perf_counter() - start, REQUEST_LATENCY_BUCKETS)
+
+    def generate(self, body, query):
+        service = self.server.service
+        df = service.read_rows(self.headers.get("Content-Type", ""), body, query)
+        if df.empty:
+            raise RequestError(422, "No rows with an Assessment Code to build.")
+        validation, groups = service.validated_groups(df, query.get("assessment"))
+        rejected_rows = json.loads(validation.rejected_rows.to_json(orient="records"))
+        if not groups:
+            raise RequestError(422, "Every row was rejected by validation.", rejected_rows=rejected_rows)
+
+        if len(groups) == 1:
+            (group, package, output), = service.build_packages(groups)
+            if package is None:
+                raise RequestError(422, f"The package for '{group.assessment_code}' could not be built.",
+                                   output=output, rejected_rows=rejected_rows)
+            self.send_body(200, package.data, "application/zip", {
+                "Content-Disposition": f'attachment; filename="{package.filename}"',
+                "X-QTI-Rejected-Rows": str(len(rejected_rows)),
+            })
+            return
+
+        # Headers go out before the first package is built, so failures are reported in report.json
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Disposition", f'attachment; filename="{BUNDLE_FILENAME}"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-QTI-Rejected-Rows", str(len(rejected_rows)))
+        self.end_headers()
+        report = {"packages": [], "failed": {}, "rejected_rows": rejected_rows}
+        writer = ChunkedResponseWriter(self.wfile)
+        # The packages are compressed already; storing them keeps the bundle cheap to stream
+        with zipfile.ZipFile(writer, "w", zipfile.ZIP_STORED) as bundle:
+            for group, package, output in service.build_packages(groups):
+                if package is None:
+                    report["failed"][group.assessment_code] = output
+                    continue
+                bundle.writestr(zipfile.ZipInfo(package.filename, date_time=main.ZIP_ENTRY_DATE_TIME), package.data)
+                report["packages"].append(package.filename)
+            bundle.writestr(
+                zipfile.ZipInfo(BUNDLE_REPORT_FILENAME, date_time=main.ZIP_ENTRY_DATE_TIME),
+                json.dumps(report, indent=2, ensure_ascii=False)
+            )
+        writer.finish()
+
+
+def create_service_server(service, host="127.0.0.1", port=0, max_upload_bytes=None):
+    """Creates (but doesn't start) the HTTP server; port 0 picks a free port (see server.server_port)."""
+    server = ThreadingHTTPServer((host, port), GenerationHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.max_upload_bytes = max_upload_bytes or DEFAULT_MAX_UPLOAD_MB * 1024 * 1024
+    return server
+
+
+def print_usage():
+    print("Usage: python -m tao_qti.service [options]")
+    print("Options (plus the generation options of main.py except --stream, --incremental, --rejected-report and --read-cache):")
+    print("  --host HOST          Address to listen on (default 127.0.0.1)")
+    print("  --port PORT          Port to listen on (default 8000)")
+    print(f"  --max-upload-mb MB   Largest accepted request body (default {DEFAULT_MAX_UPLOAD_MB})")
+    print("  --workers N          Warm worker processes building the packages (default 1)")
+    print("  --metrics-json FILE and --prometheus-textfile FILE are written when the service stops")
+    print("Example: python -m tao_qti.service --port 8000 --workers 4 --item-serializer template")
+
+
+def parse_args(argv):
+    """
+    Parses command line arguments into options.
+
+    Server options are handled here; everything else is parsed by main.parse_generation_options.
+    """
+    options = {"host": "127.0.0.1", "port": 8000, "max_upload_bytes": DEFAULT_MAX_UPLOAD_MB * 1024 * 1024}
+    generation_args = []
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg == "--host":
+            if not args:
+                raise ValueError("--host requires a value.")
+            options["host"] = args.pop(0)
+        elif arg in ("--port", "--max-upload-mb"):
+            if not args:
+                raise ValueError(f"{arg} requires a value.")
+            value = args.pop(0)
+            try:
+                number = int(value)
+            except ValueError:
+                raise ValueError(f"{arg} must be an integer, got '{value}'.")
+            if arg == "--port":
+                if not 0 <= number <= 65535:
+                    raise ValueError("--port must be between 0 and 65535.")
+                options["port"] = number
+            else:
+                if number < 1:
+                    raise ValueError("--max-upload-mb must be at least 1.")
+                options["max_upload_bytes"] = number * 1024 * 1024
+        else:
+            generation_args.append(arg)
+    positional, generation_options = main.parse_generation_options(generation_args)
+    if positional:
+        raise ValueError(f"Unexpected argument '{positional[0]}'; the workbooks are uploaded to the service.")
+    for name, option in (("stream", "--stream"), ("incremental", "--incremental"),
+                         ("rejected_report_path", "--rejected-report"), ("read_cache_dir", "--read-cache")):
+        if generation_options[name]:
+            raise ValueError(f"{option} is not supported by the service; packages are built in memory per request.")
+    options.update(generation_options)
+    return options
+
+
+def cli_main(argv):
+    """Runs the command line (python -m tao_qti.service ... or tao-qti serve ...) with the arguments in argv."""
+    try:
+        options = parse_args(argv)
+    except ValueError as ve:
+        print(f"❌ Error: {ve}")
+        print_usage()
+        sys.exit(1)
+
+    start = time.perf_counter()
+    print(f"🔥 Starting and warming up {options['workers']} workers...")
+    service = GenerationService(options)
+    server = create_service_server(service, options["host"], options["port"], options["max_upload_bytes"])
+    print(f"🚀 QTI generation service ready in {time.perf_counter() - start:.1f}s on "
+          f"http://{options['host']}:{server.server_port} (POST /generate, Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        write_run_report("service", options["metrics_json"], options["prometheus_textfile"])
+
+
+if __name__ == "__main__":
+    cli_main(sys.argv[1:])
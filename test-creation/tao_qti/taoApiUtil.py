@@ -0,0 +1,900 @@
+from __future__ import annotations # requests is only imported once a request is made
+
+import os
+import base64
+import collections
+import contextlib
+import json
+import hashlib
+import io
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING
+from xml.etree import ElementTree
+
+from .metrics import METRICS, quiet_stdout, write_run_report
+
+if TYPE_CHECKING: # For the annotations only
+    import requests
+
+# Default journal file name, created inside the packages directory
+UPLOAD_JOURNAL_FILENAME = ".tao_upload_journal.sqlite3"
+
+# Module attributes read from .env / the environment by load_settings
+SETTINGS = ("base_url", "username", "password", "auth_header")
+
+def load_settings():
+    """
+    Reads .env and the TAO_* environment variables into base_url, username, password
+    and auth_header. Done on first use instead of at import, so importing this
+    module stays cheap. Attributes already assigned (e.g. by load_test_upload.py)
+    are kept.
+    """
+    settings = globals()
+    if all(name in settings for name in SETTINGS):
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    settings.setdefault("base_url", os.getenv("TAO_BASE_URL"))
+    settings.setdefault("username", os.getenv("TAO_USERNAME"))
+    settings.setdefault("password", os.getenv("TAO_PASSWORD"))
+    # Encode the credentials manually
+    credentials = f"{settings['username']}:{settings['password']}"
+    settings.setdefault("auth_header", f"Basic {base64.b64encode(credentials.encode()).decode()}")
+
+def __getattr__(name):
+    # taoApiUtil.base_url etc. load the settings on first access
+    if name in SETTINGS:
+        load_settings()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def create_tao_session(pool_size: int = 1) -> requests.Session:
+    """
+    Creates a requests Session for talking to TAO.
+
+    The session keeps connections alive between uploads, so only the first request
+    on each connection pays for the TCP/TLS handshake. pool_size should match the
+    number of threads sharing the session.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# Bytes of the package read and sent at a time by MultipartFileBody
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Upload timeouts: connecting, and waiting on the server, which grows with the package
+# (TAO unpacks and imports it before answering): base seconds plus seconds per MiB
+UPLOAD_CONNECT_TIMEOUT = 10
+UPLOAD_TIMEOUT_SECONDS = 30
+UPLOAD_TIMEOUT_SECONDS_PER_MB = 6
+
+def upload_timeout(size_bytes: int) -> tuple[float, float]:
+    """(connect, read) timeout for uploading a package of size_bytes."""
+    return UPLOAD_CONNECT_TIMEOUT, UPLOAD_TIMEOUT_SECONDS + UPLOAD_TIMEOUT_SECONDS_PER_MB * size_bytes / (1024 * 1024)
+
+class MultipartFileBody:
+    """
+    multipart/form-data request body with one file field, read while it is sent.
+
+    requests builds a files= body in memory before sending it. This body keeps only
+    one UPLOAD_CHUNK_SIZE chunk of the package in memory at a time, so concurrent
+    uploads of large packages don't multiply memory use. Its length is known up
+    front, so it is sent with a Content-Length header rather than chunked. Every
+    iteration starts over, so the body can be sent again. progress(filename,
+    bytes_sent, total_bytes) is called after each chunk of the file. delivered
+    tells whether the last iteration handed the whole body to the connection; until
+    then TAO can't have imported the package.
+    """
+
+    def __init__(self, field: str, filename: str, file_path: str | None = None, data: bytes | None = None,
+                 content_type: str = "application/zip", progress=None):
+        self.boundary = os.urandom(16).hex()
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.filename = filename
+        self.file_path = file_path
+        self.data = data
+        self.progress = progress
+        self.file_size = len(data) if data is not None else os.path.getsize(file_path)
+        # Quoted the way browsers (and urllib3) do it
+        quoted_filename = filename.translate({10: "%0A", 13: "%0D", 34: "%22"})
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{quoted_filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode("utf-8")
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self.delivered = False
+
+    def __len__(self) -> int:
+        return len(self._head) + self.file_size + len(self._tail)
+
+    def _file_chunks(self):
+        if self.data is not None:
+            view = memoryview(self.data)
+            for start in range(0, self.file_size, UPLOAD_CHUNK_SIZE):
+                yield view[start:start + UPLOAD_CHUNK_SIZE]
+            return
+        with open(self.file_path, "rb") as f:
+            while chunk := f.read(UPLOAD_CHUNK_SIZE):
+                yield chunk
+
+    def __iter__(self):
+        self.delivered = False
+        yield self._head
+        sent = 0
+        for chunk in self._file_chunks():
+            yield chunk
+            sent += len(chunk)
+            if self.progress is not None:
+                self.progress(self.filename, sent, self.file_size)
+        yield self._tail
+        # Only reached once the tail was written and the next chunk asked for
+        self.delivered = True
+
+# Retries of an upload that TAO refused or never got (see UploadController)
+UPLOAD_RETRIES = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30
+# Answers meaning TAO refused the request without importing it, so it can be sent
+# again. A 500 is an import error, not retried.
+RETRY_STATUSES = (429, 503)
+# Gateway answers: TAO may still be importing behind the proxy, so whether the
+# package was imported is unknown. Never retried, to avoid duplicate imports.
+UNKNOWN_OUTCOME_STATUSES = (502, 504)
+
+class CircuitOpenError(Exception):
+    """Raised for uploads given up on because TAO has been down for too long."""
+
+class UnknownOutcomeError(Exception):
+    """
+    Raised for an upload TAO may or may not have imported: a read timeout, a connection
+    lost after the whole package was sent, or a 502/504 from a gateway. Sending it
+    again could import it twice, so it is left for manual verification.
+    """
+
+def failed_before_delivery(error: Exception, delivered: bool | None = None) -> bool:
+    """
+    Whether a requests exception means TAO never got the whole request: a connect
+    timeout, a refused or unresolvable connection, or (with delivered=False) a
+    connection lost while the body was still being sent.
+    """
+    import requests
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or isinstance(error, requests.exceptions.Timeout):
+        return False
+    if delivered is False:
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason is the underlying error
+    reason = error.args[0] if error.args else None
+    return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD limit on the number of uploads in flight, between 1 and maximum.
+
+    Each request's latency is divided by its upload_timeout allowance, so packages
+    of any size compare, and judged per window of limit requests by the window's
+    median. While that stays within LATENCY_TOLERANCE of the lowest recent median,
+    the limit grows: doubling per window until the first sign of congestion, then
+    by one per window. A higher median means uploads queue at TAO and takes off
+    LATENCY_BACKOFF of the limit (at least one). A 429, 5xx, timeout or connection
+    error halves it, at most once per round trip: only requests started after the
+    last decrease can cause another one. The limit settles around what TAO
+    processes at once. With adaptive=False it stays at maximum.
+    """
+
+    LATENCY_TOLERANCE = 1.5
+    LATENCY_BACKOFF = 0.1
+    BASELINE_WINDOWS = 20
+
+    def __init__(self, maximum: int, adaptive: bool = True):
+        self.maximum = maximum
+        self.adaptive = adaptive
+        self.limit = 1 if adaptive else maximum
+        self.in_flight = 0
+        self.slow_start = True
+        self._window = []
+        self._medians = collections.deque(maxlen=self.BASELINE_WINDOWS)
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> float:
+        """Waits for a free slot. Returns the start time to pass to release."""
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    def release(self, started: float, congested: bool, latency: float | None = None):
+        """Frees a slot and adapts the limit; latency is relative to the request's timeout allowance."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+            if not self.adaptive:
+                return
+            if congested:
+                if started >= self._last_decrease:
+                    self._set_limit(self.limit // 2)
+                    self._last_decrease = time.monotonic()
+                return
+            if latency is None:
+                return
+            self._window.append(latency)
+            if len(self._window) < self.limit:
+                return
+            median = statistics.median(self._window)
+            self._window = []
+            self._medians.append(median)
+            if median > min(self._medians) * self.LATENCY_TOLERANCE:
+                self._set_limit(min(self.limit - 1, int(self.limit * (1 - self.LATENCY_BACKOFF))))
+            elif self.limit < self.maximum:
+                self._set_limit(self.limit * 2 if self.slow_start else self.limit + 1)
+
+    def _set_limit(self, limit: int):
+        if limit < self.limit:
+            self.slow_start = False
+            METRICS.incr("upload_concurrency_decreases")
+        self.limit = max(1, min(self.maximum, limit))
+        self._window = []
+        self._condition.notify_all()
+
+class CircuitBreaker:
+    """
+    Pauses all uploads while TAO is down.
+
+    After failure_threshold consecutive failures (connection errors, timeouts,
+    502/503/504) the circuit opens and uploads wait for reset_timeout seconds. Then a
+    single probe request is let through: if it succeeds, uploads resume, otherwise
+    the circuit opens again for twice as long (up to max_reset_timeout). Once TAO
+    has been down for give_up_after seconds, waiting uploads fail with
+    CircuitOpenError, so the journal retries them on the next run.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10, max_reset_timeout: float = 120,
+                 give_up_after: float = 600):
+        self.failure_threshold = failure_threshold
+        self.initial_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.give_up_after = give_up_after
+        self.state = "closed"
+        self._failures = 0
+        self._open_until = 0.0
+        self._down_since = None
+        self._condition = threading.Condition()
+
+    def before_request(self):
+        """Waits while the circuit is open. Raises CircuitOpenError once TAO has been down too long."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self._down_since is not None and now - self._down_since > self.give_up_after:
+                    raise CircuitOpenError(f"TAO has not answered for over {self.give_up_after:.0f}s; giving up.")
+                if self.state == "closed":
+                    return
+                if self.state == "open" and now >= self._open_until:
+                    self.state = "half-open" # This request is the probe
+                    return
+                self._condition.wait(max(0.0, self._open_until - now) if self.state == "open" else None)
+
+    def record(self, ok: bool):
+        with self._condition:
+            if ok:
+                self.state = "closed"
+                self._failures = 0
+                self._down_since = None
+                self.reset_timeout = self.initial_reset_timeout
+                self._condition.notify_all()
+                return
+            self._failures += 1
+            if self.state == "half-open" or (self.state == "closed" and self._failures >= self.failure_threshold):
+                if self.state == "half-open":
+                    self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+                self.state = "open"
+                self._open_until = time.monotonic() + self.reset_timeout
+                if self._down_since is None:
+                    self._down_since = time.monotonic()
+                METRICS.incr("circuit_breaker_trips")
+                print(f"⛔ TAO looks down ({self._failures} failed requests in a row); pausing uploads for {self.reset_timeout:.0f}s.")
+                self._condition.notify_all()
+
+class UploadController:
+    """
+    Sends the upload requests of a batch: shared by all its upload threads.
+
+    Every request waits for the CircuitBreaker and for a slot of the
+    AdaptiveConcurrencyLimit (or of a fixed limit of max_concurrency when adaptive
+    is False). A request TAO refused (RETRY_STATUSES) or never got in full (see
+    failed_before_delivery) is retried up to retries times after a jittered
+    exponential backoff, or after the server's Retry-After. A request TAO may have
+    imported (UNKNOWN_OUTCOME_STATUSES, a read timeout, a connection lost after the
+    whole body was sent) raises UnknownOutcomeError instead of being sent again.
+    """
+
+    def __init__(self, max_concurrency: int = 1, adaptive: bool = True, retries: int = UPLOAD_RETRIES,
+                 breaker: CircuitBreaker | None = None):
+        self.limit = AdaptiveConcurrencyLimit(max_concurrency, adaptive)
+        self.adaptive = adaptive
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+
+    def retry_delay(self, attempt: int, response=None) -> float:
+        """Full-jitter exponential backoff, but never shorter than the server's Retry-After."""
+        delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def send(self, request, size: int, description: str, delivered=None):
+        """
+        Calls request() (one HTTP request) for a body of size bytes, retrying as described
+        above. delivered() tells whether the last request's body went out in full
+        (see MultipartFileBody.delivered); without it, only connect failures are
+        retried. Returns the last response, or raises the last requests exception.
+        """
+        import requests
+
+        allowance = upload_timeout(size)[1]
+        for attempt in range(self.retries + 1):
+            self.breaker.before_request()
+            started = self.limit.acquire()
+            response = None
+            try:
+                response = request()
+            except Exception as e:
+                failed = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                self.limit.release(started, congested=failed)
+                # Anything else (a bad URL, an unreadable file) says nothing about TAO
+                self.breaker.record(not failed)
+                if failed and not failed_before_delivery(e, delivered() if delivered else None):
+                    raise UnknownOutcomeError(f"{description}: {type(e).__name__} after the package was sent ({e})") from e
+                if not failed or attempt == self.retries:
+                    raise
+                reason = type(e).__name__
+            else:
+                elapsed = time.monotonic() - started
+                METRICS.observe("http_request_seconds", elapsed)
+                congested = response.status_code in RETRY_STATUSES + UNKNOWN_OUTCOME_STATUSES
+                self.limit.release(started, congested, None if congested else elapsed / allowance)
+                # A 429 still means TAO is up
+                self.breaker.record(response.status_code == 429 or not congested)
+                if response.status_code in UNKNOWN_OUTCOME_STATUSES:
+                    raise UnknownOutcomeError(f"{description}: HTTP {response.status_code} from the gateway")
+                if not congested or attempt == self.retries:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            delay = self.retry_delay(attempt, response)
+            METRICS.incr("http_retries")
+            print(f"🔁 Retrying {description} in {delay:.1f}s ({reason}, attempt {attempt + 2} of {self.retries + 1}).")
+            time.sleep(delay)
+
+def _upload_package_to_tao_api(import_path: str, field: str, zip_file_path: str, session: requests.Session | None = None,
+                               zip_data: bytes | None = None, progress=None,
+                               controller: UploadController | None = None) -> dict | str | None:
+    """
+    Posts a package to a TAO import endpoint as a streamed MultipartFileBody, with a
+    timeout scaled to its size, through controller (default: a single upload with
+    retries). Returns the JSON response, its text if it isn't JSON, or None if the
+    upload failed. Raises UnknownOutcomeError when TAO may have imported the
+    package without answering (see UploadController).
+    """
+    import requests
+
+    load_settings()
+    url = f"{base_url}{import_path}"
+
+    # With zip_data the package is sent from memory and zip_file_path only names it
+    if zip_data is None and not os.path.exists(zip_file_path):
+        print(f"Error: The file '{zip_file_path}' does not exist.")
+        return None
+    if zip_data is None and not os.path.isfile(zip_file_path):
+        print(f"Error: The path '{zip_file_path}' is not a file.")
+        return None
+
+    try:
+        # Provide the filename and the MIME type explicitly
+        body = MultipartFileBody(
+            field, os.path.basename(zip_file_path), file_path=None if zip_data is not None else zip_file_path,
+            data=zip_data, progress=progress
+        )
+        headers = {
+            "Accept": "application/json",
+            "Authorization": auth_header,  # Use encoded Basic Auth
+            "Content-Type": body.content_type,
+        }
+
+        print(f"Uploading '{os.path.basename(zip_file_path)}' to {url}...")
+        response = (controller or UploadController()).send(
+            lambda: (session or requests).post(
+                url,
+                headers=headers,
+                data=body,
+                timeout=upload_timeout(body.file_size)
+            ),
+            body.file_size,
+            f"'{os.path.basename(zip_file_path)}'",
+            delivered=lambda: body.delivered
+        )
+        METRICS.incr("bytes_uploaded", body.file_size)
+        response.raise_for_status() # This will raise an exception for 4xx/5xx responses
+
+        print(f"Success! Status Code: {response.status_code}")
+        try:
+            return response.json()
+        except json.JSONDecodeError:
+            print("Warning: Response was not JSON.")
+            print(f"Raw response content: {response.text}") # Print raw text for debugging
+            return response.text
+
+    except CircuitOpenError as e:
+        print(f"Skipped: {e}")
+        return None
+    except UnknownOutcomeError:
+        raise
+    except requests.exceptions.RequestException as e:
+        METRICS.incr("http_errors")
+        print(f"Request Error: {e}")
+        if hasattr(e, "response") and e.response is not None:
+            print(f"Response content:\n{e.response.text}")
+        return None
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        return None
+
+def upload_zip_to_tao_api(zip_file_path: str, session: requests.Session | None = None, zip_data: bytes | None = None,
+                          progress=None, controller: UploadController | None = None) -> dict | str | None:
+    return _upload_package_to_tao_api(
+        "/taoQtiItem/RestQtiItem/import/", "content", zip_file_path, session, zip_data, progress, controller
+    )
+
+def upload_test_zip_to_tao_api(zip_file_path: str, session: requests.Session | None = None, zip_data: bytes | None = None,
+                               progress=None, controller: UploadController | None = None) -> dict | str | None:
+    return _upload_package_to_tao_api(
+        "/taoQtiTest/RestQtiTests/import/", "qtiPackage", zip_file_path, session, zip_data, progress, controller
+    )
+
+class UploadProgressPrinter:
+    """Upload progress callback printing how much of each package was sent, every step_percent."""
+
+    def __init__(self, step_percent: int = 25):
+        self.step_percent = step_percent
+        self._reported = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, filename: str, sent: int, total: int):
+        percent = 100 * sent // total if total else 100
+        with self._lock:
+            last = self._reported.get(filename)
+            # A lower share than last time means the package is being sent again (next endpoint or retry)
+            if last is not None and last <= percent < 100 and percent < last + self.step_percent:
+                return
+            self._reported[filename] = percent
+        print(f"  ↑ {filename}: {percent}% of {total / (1024 * 1024):.1f} MiB sent")
+
+class UploadJournal:
+    """
+    Local SQLite journal of package imports, so an interrupted batch can be resumed.
+
+    One row per (zip SHA-256, endpoint) holds the latest status ('started', 'success',
+    'failed' or 'unknown') and the response payload. Every change is committed before
+    the upload continues, so the journal stays consistent however the process dies.
+    A package whose content hash was already imported through an endpoint is skipped
+    on later runs, whatever its filename, and failed imports are retried. Imports TAO
+    may or may not have completed ('unknown', see UnknownOutcomeError, or 'started'
+    when the process died mid-upload) are not sent again until they are verified.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS imports ("
+            " sha256 TEXT NOT NULL,"
+            " endpoint TEXT NOT NULL,"
+            " filename TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " response TEXT,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (sha256, endpoint))"
+        )
+
+    def status(self, sha256: str, endpoint: str) -> str | None:
+        """The recorded status of an import, or None if it was never attempted."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status FROM imports WHERE sha256 = ? AND endpoint = ?", (sha256, endpoint)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def is_imported(self, sha256: str, endpoint: str) -> bool:
+        return self.status(sha256, endpoint) == "success"
+
+    def record(self, sha256: str, endpoint: str, filename: str, status: str, response=None):
+        """Upserts the status of one import; response is stored as JSON (or raw text)."""
+        if response is not None and not isinstance(response, str):
+            response = json.dumps(response)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO imports (sha256, endpoint, filename, status, response, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (sha256, endpoint) DO UPDATE SET"
+                " filename = excluded.filename, status = excluded.status,"
+                " response = excluded.response, updated_at = excluded.updated_at",
+                (sha256, endpoint, filename, status, response, time.time())
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Import endpoints in the order a package is sent to them
+IMPORT_ENDPOINTS = {
+    "item": upload_zip_to_tao_api,
+    "test": upload_test_zip_to_tao_api,
+}
+
+# --mode values: explicit endpoint choices, or "auto" to decide from each package's manifest
+IMPORT_MODES = {
+    "auto": None,
+    "items": ["item"],
+    "tests": ["test"],
+    "both": ["item", "test"],
+}
+
+# imsmanifest.xml resource types, as written by create_imsmanifest_xml_for_test_package
+ITEM_RESOURCE_TYPE = "imsqti_item_xmlv2p1"
+TEST_RESOURCE_TYPE = "imsqti_test_xmlv2p1"
+
+def read_manifest_resource_types(zip_file_path: str, zip_data: bytes | None = None) -> set[str]:
+    """Returns the set of resource types declared in a package's imsmanifest.xml (read from zip_data if given)."""
+    with zipfile.ZipFile(io.BytesIO(zip_data) if zip_data is not None else zip_file_path) as zf:
+        with zf.open("imsmanifest.xml") as manifest:
+            root = ElementTree.parse(manifest).getroot()
+    # Match on the local name so any IMS CP namespace version is accepted
+    return {
+        element.get("type")
+        for element in root.iter()
+        if isinstance(element.tag, str) and element.tag.rsplit("}", 1)[-1] == "resource" and element.get("type")
+    }
+
+def plan_imports(zip_file_path: str, mode: str = "auto", zip_data: bytes | None = None) -> list[str]:
+    """
+    Decides which import endpoints a package should be sent to.
+
+    In "auto" mode a package with a test resource goes to the test import only,
+    because importing the test also imports the items it depends on. A package with
+    only item resources goes to the item import. If the manifest can't be read the
+    package is sent to both endpoints, as before import plans existed. zip_data
+    holds the package when it is in memory rather than at zip_file_path.
+
+    Returns:
+        list: Endpoint names from IMPORT_ENDPOINTS, in upload order.
+    """
+    if IMPORT_MODES[mode] is not None:
+        return IMPORT_MODES[mode]
+    try:
+        resource_types = read_manifest_resource_types(zip_file_path, zip_data)
+    except (OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+        print(f"⚠️ Could not read the manifest of '{os.path.basename(zip_file_path)}' ({e}); importing as item and test.")
+        return IMPORT_MODES["both"]
+    if TEST_RESOURCE_TYPE in resource_types:
+        return ["test"]
+    if ITEM_RESOURCE_TYPE in resource_types:
+        return ["item"]
+    print(f"⚠️ No QTI item or test resources in the manifest of '{os.path.basename(zip_file_path)}'; importing as item and test.")
+    return IMPORT_MODES["both"]
+
+# Journal statuses of imports TAO may have completed; they wait for manual verification
+UNVERIFIED_STATUSES = ("unknown", "started")
+
+def import_package(file_path: str, session: requests.Session | None = None, journal: UploadJournal | None = None,
+                   endpoints: list[str] | None = None, zip_data: bytes | None = None, progress=None,
+                   controller: UploadController | None = None, retry_unverified: bool = False) -> dict:
+    """
+    Imports one QTI package into TAO through the given endpoints ("item" and/or
+    "test"; default: plan_imports in auto mode).
+
+    With a journal, imports already recorded as successful for the same file
+    content are skipped, and every attempt is recorded. Imports whose outcome is
+    unknown (UNVERIFIED_STATUSES) are skipped too, unless retry_unverified is set
+    once they have been checked in TAO. Pass zip_data to import a package held in
+    memory; file_path then only provides its filename. progress is passed on to the
+    uploads (see MultipartFileBody), and so is controller, which uploads sharing a
+    session should share (see UploadController).
+
+    Returns:
+        dict: endpoint -> True (imported), False (failed) or None (outcome unknown,
+        to be verified in TAO) for each planned import.
+    """
+    filename = os.path.basename(file_path)
+    if endpoints is None:
+        endpoints = plan_imports(file_path, zip_data=zip_data)
+    result = {endpoint: False for endpoint in endpoints}
+    sha256 = None
+    if journal is not None:
+        sha256 = hashlib.sha256(zip_data).hexdigest() if zip_data is not None else file_sha256(file_path)
+
+    for endpoint in endpoints:
+        upload = IMPORT_ENDPOINTS[endpoint]
+        status = journal.status(sha256, endpoint) if journal is not None else None
+        if status == "success":
+            result[endpoint] = True
+            METRICS.incr("imports_skipped")
+            print(f"⏭️  SKIPPED: {filename} was already imported as {endpoint} (journal).")
+            continue
+        if status in UNVERIFIED_STATUSES and not retry_unverified:
+            result[endpoint] = None
+            METRICS.incr("imports_unverified")
+            print(f"⚠️  UNVERIFIED: {filename} may already be imported as {endpoint} (the outcome of its last "
+                  "upload is unknown). Check TAO, then rerun with --retry-unverified to send it again.")
+            continue
+        if journal is not None:
+            # Left as 'started' if we are killed mid-upload: TAO may or may not have the package then
+            journal.record(sha256, endpoint, filename, "started")
+
+        response_data = None
+        try:
+            with METRICS.time("upload"):
+                response_data = upload(
+                    zip_file_path=file_path, session=session, zip_data=zip_data, progress=progress, controller=controller
+                )
+            if isinstance(response_data, dict) and response_data.get('success') is True:
+                result[endpoint] = True
+                print(f"✅ SUCCESS: {filename} imported as {endpoint}.")
+            else:
+                print(f"❌ FAILURE: {filename} could not be imported as {endpoint}.")
+        except UnknownOutcomeError as e:
+            result[endpoint] = None
+            response_data = str(e)
+            print(f"⚠️  UNKNOWN: {e}. Not sent again; check whether TAO imported {filename} as {endpoint}.")
+        except Exception as e:
+            print(f"❌ ERROR: Exception occurred while importing as {endpoint} '{filename}': {e}")
+        METRICS.incr({True: "imports_succeeded", False: "imports_failed", None: "imports_unverified"}[result[endpoint]])
+
+        if journal is not None:
+            status = {True: "success", False: "failed", None: "unknown"}[result[endpoint]]
+            journal.record(sha256, endpoint, filename, status, response_data)
+
+    return result
+
+def import_package_quietly(*args, **kwargs) -> dict:
+    """import_package with its output held back unless one of its imports failed (see metrics.QuietOutput)."""
+    with quiet_stdout() as quiet_output:
+        with quiet_output.hold() as held:
+            result = import_package(*args, **kwargs)
+        if not all(result.values()):
+            quiet_output.release(held)
+    return result
+
+def import_packages(qti_packages_dir: str, zip_files: list[str], workers: int = 1,
+                    journal: UploadJournal | None = None, mode: str = "auto", quiet: bool = False,
+                    progress=None, adaptive: bool = True, retries: int = UPLOAD_RETRIES,
+                    retry_unverified: bool = False) -> dict:
+    """
+    Imports every zip in zip_files (names relative to qti_packages_dir).
+
+    All uploads share one pooled Session and one UploadController, which retries
+    requests TAO refused and pauses the batch while TAO is down. With workers > 1
+    up to that many packages are uploaded at once, largest first, so the biggest
+    transfers don't end up running alone at the tail of the batch. With adaptive
+    the number of uploads in flight starts at 1 and follows what TAO sustains, up
+    to workers (see AdaptiveConcurrencyLimit). See import_package for the journal and
+    plan_imports for how mode picks the endpoints of each package. With quiet=True
+    only the output of packages that failed to import is printed. progress is called
+    from the upload threads as each package is sent (see MultipartFileBody).
+    retry_unverified is passed on to import_package.
+
+    Returns:
+        dict: filename -> {endpoint: True, False or None} for the endpoints each package was sent to
+    """
+    results = {}
+    plans = {filename: plan_imports(os.path.join(qti_packages_dir, filename), mode) for filename in zip_files}
+    import_one = import_package_quietly if quiet else import_package
+    controller = UploadController(workers, adaptive=adaptive, retries=retries)
+    # Installed once for the whole batch, so upload threads all share the same QuietOutput
+    with create_tao_session(pool_size=workers) as session, (quiet_stdout() if quiet else contextlib.nullcontext()):
+        if workers <= 1:
+            for i, filename in enumerate(zip_files):
+                if not quiet:
+                    print(f"\n--- Importing {i+1}/{len(zip_files)}: {filename} ---")
+                results[filename] = import_one(
+                    os.path.join(qti_packages_dir, filename), session=session, journal=journal, endpoints=plans[filename],
+                    progress=progress, controller=controller, retry_unverified=retry_unverified
+                )
+            return results
+
+        by_size = sorted(zip_files, key=lambda f: os.path.getsize(os.path.join(qti_packages_dir, f)), reverse=True)
+        print(f"Importing {len(by_size)} packages with {workers} concurrent uploads (largest first)...")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    import_one, os.path.join(qti_packages_dir, filename), session, journal, plans[filename],
+                    progress=progress, controller=controller, retry_unverified=retry_unverified
+                ): filename
+                for filename in by_size
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                filename = futures[future]
+                try:
+                    results[filename] = future.result()
+                except Exception as e:
+                    print(f"❌ ERROR: Exception occurred while importing '{filename}': {e}")
+                    results[filename] = {endpoint: False for endpoint in plans[filename]}
+                if not quiet:
+                    print(f"--- Finished {done}/{len(by_size)}: {filename} ---")
+        if adaptive:
+            print(f"Upload concurrency settled at {controller.limit.limit} of {workers}.")
+    return results
+
+def print_import_summary(zip_files: list[str], results: dict):
+    """Prints the per-endpoint import summary of import_packages results."""
+    # Only packages planned for an endpoint are listed under it
+    item_successful_imports = [f for f in zip_files if results[f].get("item") is True]
+    item_failed_imports = [f for f in zip_files if results[f].get("item") is False]
+
+    test_successful_imports = [f for f in zip_files if results[f].get("test") is True]
+    test_failed_imports = [f for f in zip_files if results[f].get("test") is False]
+
+    print("\n--- 📦 Import Summary ---")
+    print(f"✅ Successful Item Imports: {item_successful_imports}")
+    print(f"❌ Failed Item Imports: {item_failed_imports}")
+    print(f"✅ Successful Test Imports: {test_successful_imports}")
+    print(f"❌ Failed Test Imports: {test_failed_imports}")
+    # Imports TAO may have completed without answering; they are never sent again automatically
+    unverified_imports = [f"{f} ({endpoint})" for f in zip_files for endpoint, ok in results[f].items() if ok is None]
+    if unverified_imports:
+        print(f"⚠️ Unverified Imports (check them in TAO, then rerun with --retry-unverified): {unverified_imports}")
+
+def print_usage():
+    print("Usage: python -m tao_qti.taoApiUtil <qti_packages_dir> [options]")
+    print("Options:")
+    print("  --workers N     Upload up to N packages concurrently; how many are in flight adapts to how")
+    print("                  fast TAO answers, starting at 1")
+    print("  --fixed-concurrency  Always keep --workers uploads in flight")
+    print(f"  --retries N     Retries of a request TAO refused (429, 503) or never got (default {UPLOAD_RETRIES})")
+    print("  --retry-unverified  Send again the imports whose outcome was unknown (timed out, 502/504, cut off")
+    print("                  after the package was sent); check in TAO first that they weren't imported")
+    print(f"  --journal FILE  Upload journal used to resume interrupted runs (default: <qti_packages_dir>/{UPLOAD_JOURNAL_FILENAME})")
+    print("  --no-journal    Upload everything without consulting or writing a journal")
+    print("  --mode MODE     auto (default: test import for packages with a test, item import otherwise),")
+    print("                  items, tests or both")
+    print("  --quiet         Only print failed imports and the summary")
+    print("  --progress      Print how much of each package has been sent, every 25%")
+    print("  --metrics-json FILE  Write a JSON run summary with upload timings and counters")
+    print("  --prometheus-textfile FILE  Write the run metrics in Prometheus text format")
+    print("Example: python -m tao_qti.taoApiUtil qti_output")
+    print("         python -m tao_qti.taoApiUtil qti_output --workers 8")
+
+def parse_args(argv):
+    """Parses command line arguments into (qti_packages_dir, options)."""
+    options = {"workers": 1, "journal": None, "use_journal": True, "mode": "auto", "quiet": False,
+               "progress": False, "adaptive": True, "retries": UPLOAD_RETRIES, "retry_unverified": False,
+               "metrics_json": None, "prometheus_textfile": None}
+    positional = []
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg == "--workers":
+            if not args:
+                raise ValueError("--workers requires a value.")
+            value = args.pop(0)
+            try:
+                options["workers"] = int(value)
+            except ValueError:
+                raise ValueError(f"--workers must be an integer, got '{value}'.")
+            if options["workers"] < 1:
+                raise ValueError("--workers must be at least 1.")
+        elif arg == "--retries":
+            if not args:
+                raise ValueError("--retries requires a value.")
+            value = args.pop(0)
+            try:
+                options["retries"] = int(value)
+            except ValueError:
+                raise ValueError(f"--retries must be an integer, got '{value}'.")
+            if options["retries"] < 0:
+                raise ValueError("--retries must not be negative.")
+        elif arg == "--fixed-concurrency":
+            options["adaptive"] = False
+        elif arg == "--retry-unverified":
+            options["retry_unverified"] = True
+        elif arg == "--journal":
+            if not args:
+                raise ValueError("--journal requires a value.")
+            options["journal"] = args.pop(0)
+        elif arg == "--mode":
+            if not args:
+                raise ValueError("--mode requires a value.")
+            options["mode"] = args.pop(0)
+            if options["mode"] not in IMPORT_MODES:
+                raise ValueError(f"--mode must be one of {list(IMPORT_MODES)}.")
+        elif arg == "--no-journal":
+            options["use_journal"] = False
+        elif arg == "--quiet":
+            options["quiet"] = True
+        elif arg == "--progress":
+            options["progress"] = True
+        elif arg in ("--metrics-json", "--prometheus-textfile"):
+            if not args:
+                raise ValueError(f"{arg} requires a value.")
+            options[arg[2:].replace("-", "_")] = args.pop(0)
+        elif arg.startswith("--"):
+            raise ValueError(f"Unknown option '{arg}'.")
+        else:
+            positional.append(arg)
+    if len(positional) != 1:
+        raise ValueError("Missing required argument.")
+    return positional[0], options
+
+def cli_main(argv):
+    """Runs the command line (python -m tao_qti.taoApiUtil ... or tao-qti upload ...) with the arguments in argv."""
+    try:
+        qti_packages_dir, options = parse_args(argv)
+    except ValueError as ve:
+        print(f"❌ Error: {ve}")
+        print_usage()
+        sys.exit(1)
+
+    if not os.path.isdir(qti_packages_dir):
+        print(f"❌ Error: Directory '{qti_packages_dir}' not found.")
+        sys.exit(1)
+
+    zip_files = sorted([f for f in os.listdir(qti_packages_dir) if f.endswith(".zip")])
+
+    if not zip_files:
+        print(f"⚠️ No .zip files found in '{qti_packages_dir}'.")
+        sys.exit(0)
+        
+    load_settings()
+    if not base_url or not username or not password:
+        print(f"❌ Error: Environment variables not set. Create .env file with variables as per sample.env with proper values. Try to run source .env command if you are using bash.")
+        sys.exit(1)
+
+    journal = None
+    if options["use_journal"]:
+        journal_path = options["journal"] or os.path.join(qti_packages_dir, UPLOAD_JOURNAL_FILENAME)
+        journal = UploadJournal(journal_path)
+        print(f"📒 Using upload journal: {journal_path}")
+
+    try:
+        results = import_packages(
+            qti_packages_dir, zip_files, workers=options["workers"], journal=journal, mode=options["mode"],
+            quiet=options["quiet"], progress=UploadProgressPrinter() if options["progress"] else None,
+            adaptive=options["adaptive"], retries=options["retries"], retry_unverified=options["retry_unverified"]
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+        write_run_report("upload", options["metrics_json"], options["prometheus_textfile"])
+
+    print_import_summary(zip_files, results)
+
+if __name__ == "__main__":
+    cli_main(sys.argv[1:])
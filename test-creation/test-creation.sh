@@ -18,9 +18,17 @@ pip install -r requirements.txt
 
 # Uncomment the following line to generate QTI packages from Excel
 # echo "🛠️ Generating QTI packages..."
-# python3 main.py data/quizzes.xlsx qti_output
+# python3 -m tao_qti.main data/quizzes.xlsx qti_output
+
+# Or generate every workbook of a folder in one run, with a consolidated report
+# echo "🛠️ Generating QTI packages for all workbooks..."
+# python3 -m tao_qti.batch data qti_output
+
+# Or generate and upload in one pipelined pass instead of the two steps
+# echo "🔁 Generating and uploading QTI packages..."
+# python3 -m tao_qti.pipeline data/quizzes.xlsx qti_output
 
 echo "🚀 Uploading QTI packages to TAO..."
-python3 taoApiUtil.py qti_output
+python3 -m tao_qti.taoApiUtil qti_output
 
 echo "✅ Done."
@@ -0,0 +1,70 @@
+"""Shared fixtures: validated items built in code, a small local schema mirror and a mock TAO server."""
+import os
+
+import pytest
+
+from mock_tao_server import MockTaoConfig, start_mock_server
+from tao_qti import qti_schemas, taoApiUtil
+from tao_qti.main import AssessmentGroup, ValidatedItem
+
+# Permissive stand-ins for the root schemas of SCHEMA_LOCATIONS, by URL. They check
+# the root elements and namespaces only, which is all the plumbing tests need.
+_ANY_CONTENT = ('<xs:complexType><xs:sequence><xs:any processContents="skip" minOccurs="0" maxOccurs="unbounded"/>'
+                '</xs:sequence>{attributes}<xs:anyAttribute processContents="lax"/></xs:complexType>')
+STUB_SCHEMAS = {
+    "http://www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_v2p1p1.xsd": (
+        "http://www.imsglobal.org/xsd/imsqti_v2p1",
+        {"assessmentItem": '<xs:attribute name="identifier" type="xs:NCName" use="required"/>', "assessmentTest": ""},
+    ),
+    "http://www.imsglobal.org/xsd/qti/qtiv2p1/qtiv2p1_imscpv1p2_v1p0.xsd": (
+        "http://www.imsglobal.org/xsd/imscp_v1p1", {"manifest": ""},
+    ),
+    "http://www.imsglobal.org/xsd/imsmd_loose_v1p3p2.xsd": ("http://ltsc.ieee.org/xsd/LOM", {"lom": ""}),
+    "http://www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_metadata_v2p1p1.xsd": (
+        "http://www.imsglobal.org/xsd/imsqti_metadata_v2p1", {"qtiMetadata": ""},
+    ),
+}
+
+
+def make_item(code, question="Which one?", options=("Yes", "No", "Maybe", "Never"), correct="A", stimulus=""):
+    """A ValidatedItem as validate_exam_data would produce it."""
+    return ValidatedItem(
+        row_number=2, item_code=code, item_identifier=code.replace(".", "_"), item_stimulus=stimulus,
+        question_text=question, options=tuple((f"option_{letter}", text) for letter, text in zip("ABCD", options)),
+        correct_answer_id=f"option_{correct}",
+    )
+
+
+def make_group(code, item_count=4):
+    return AssessmentGroup(code, [make_item(f"{code}_I{i}", question=f"Question {i}?") for i in range(item_count)], [])
+
+
+@pytest.fixture
+def schema_mirror(tmp_path):
+    """A complete mirror of the stub schemas, with its SHA256SUMS."""
+    schema_dir = str(tmp_path / "schemas")
+    for url, (namespace, elements) in STUB_SCHEMAS.items():
+        path = qti_schemas.local_schema_path(url, schema_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f'<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" targetNamespace="{namespace}" '
+                    'elementFormDefault="qualified">')
+            for name, attributes in elements.items():
+                f.write(f'<xs:element name="{name}">{_ANY_CONTENT.format(attributes=attributes)}</xs:element>')
+            f.write("</xs:schema>\n")
+    qti_schemas.write_schema_manifest(schema_dir)
+    yield schema_dir
+    qti_schemas._SCHEMA_CACHES.pop(schema_dir, None)
+
+
+@pytest.fixture
+def tao_server(monkeypatch):
+    """A mock TAO server the uploads of the test go to."""
+    config = MockTaoConfig(username="journal", password="journal")
+    server, base_url = start_mock_server(config)
+    for name, value in (("base_url", base_url), ("username", "journal"), ("password", "journal"),
+                        ("auth_header", config.auth_header)):
+        monkeypatch.setattr(taoApiUtil, name, value, raising=False)
+    monkeypatch.setattr(taoApiUtil, "RETRY_BASE_DELAY", 0)
+    yield server
+    server.shutdown()
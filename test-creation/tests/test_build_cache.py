@@ -0,0 +1,86 @@
+import os
+import re
+import zipfile
+
+import pytest
+
+from tao_qti import main
+from conftest import make_group
+
+
+def build(groups, output_dir, capsys, **options):
+    """Builds groups incrementally into output_dir. Returns the codes of the groups that were skipped."""
+    main.create_qti_packages_from_groups(groups, str(output_dir), incremental=True, **options)
+    return set(re.findall(r"Skipping Assessment Code '([^']+)'", capsys.readouterr().out))
+
+
+def replace_item(group, index, **fields):
+    items = list(group.items)
+    items[index] = items[index]._replace(**fields)
+    return main.AssessmentGroup(group.assessment_code, items, [])
+
+
+@pytest.fixture
+def groups():
+    return [make_group("A"), make_group("B")]
+
+
+@pytest.fixture
+def built(groups, tmp_path, capsys):
+    assert build(groups, tmp_path, capsys) == set()
+    return tmp_path
+
+
+def test_unchanged_groups_are_skipped(groups, built, capsys):
+    assert build(groups, built, capsys) == {"A", "B"}
+
+
+def test_workers_skip_unchanged_groups(groups, built, capsys):
+    assert build(groups, built, capsys, workers=2) == {"A", "B"}
+
+
+def test_changed_items_are_rebuilt(groups, built, capsys):
+    changed = replace_item(groups[1], 2, question_text="Another question?")
+    assert build([groups[0], changed], built, capsys) == {"A"}
+    assert build([groups[0], changed], built, capsys) == {"A", "B"}
+
+
+def test_moved_rows_are_not_rebuilt(groups, built, capsys):
+    moved = replace_item(groups[0], 0, row_number=40)
+    assert build([moved, groups[1]], built, capsys) == {"A", "B"}
+
+
+def test_a_new_generator_version_rebuilds_everything(groups, built, capsys, monkeypatch):
+    monkeypatch.setattr(main, "GENERATOR_VERSION", f"{main.GENERATOR_VERSION}-next")
+    assert build(groups, built, capsys) == set()
+
+
+@pytest.mark.parametrize("options", [
+    {"compresslevel": 1},
+    {"compression": zipfile.ZIP_STORED},
+    {"pretty_print": False},
+    {"max_items_per_section": 2},
+])
+def test_options_that_change_the_zip_rebuild_everything(groups, built, capsys, options):
+    assert build(groups, built, capsys, **options) == set()
+    assert build(groups, built, capsys, **options) == {"A", "B"}
+
+
+@pytest.mark.parametrize("options", [{"item_serializer": "template"}, {"stream_xml": True}])
+def test_options_that_write_the_same_zip_keep_the_cache(groups, built, capsys, options):
+    assert build(groups, built, capsys, **options) == {"A", "B"}
+
+
+@pytest.mark.parametrize("damage", ["delete", "truncate"])
+def test_missing_or_damaged_zips_are_rebuilt(groups, built, capsys, damage):
+    zip_path = built / "A.zip"
+    size = os.path.getsize(zip_path)
+    if damage == "delete":
+        os.remove(zip_path)
+    else:
+        with open(zip_path, "r+b") as f:
+            f.truncate(size // 2)
+
+    assert build(groups, built, capsys) == {"B"}
+    assert os.path.getsize(zip_path) == size
+    assert zipfile.ZipFile(zip_path).testzip() is None
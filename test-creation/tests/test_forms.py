@@ -0,0 +1,134 @@
+import zipfile
+
+import pytest
+from lxml import etree
+
+from tao_qti import forms, main
+from conftest import make_group, make_item
+
+QTI = {"qti": "http://www.imsglobal.org/xsd/imsqti_v2p1"}
+
+
+def form_options(**overrides):
+    options = {"forms": 3, "seed": "42", "sample": None, "shuffle_items": True, "shuffle_options": True}
+    options.update(overrides)
+    return options
+
+
+def package_options(**overrides):
+    options = {
+        "compression": zipfile.ZIP_DEFLATED, "compresslevel": None, "item_serializer": "lxml", "pretty_print": True,
+        "stream_xml": False, "media_source_dir": None, "max_image_size": None, "validate_schema": False,
+        "schema_dir": None, "max_items_per_section": None, "item_cache_bytes": main.ITEM_CACHE_BYTES,
+        "item_cache_dir": None,
+    }
+    options.update(overrides)
+    return options
+
+
+def exam_group():
+    items = [
+        make_item(f"EX_{i}", question=f"Question {i} <b> & more?",
+                  options=(f"{i}: right", f"{i}: wrong 1", f"{i}: wrong 2", f"{i}: wrong 3"), correct="A")
+        for i in range(6)
+    ]
+    items.append(make_item("EX_three", options=("right", "wrong", "also wrong"), correct="C"))
+    return main.AssessmentGroup("EX", items, [])
+
+
+def item_documents(package_path):
+    with zipfile.ZipFile(package_path) as zf:
+        return {name: zf.read(name) for name in zf.namelist() if name.startswith("Items/") and name.endswith(".xml")}
+
+
+@pytest.mark.parametrize("item_serializer", ["lxml", "template"])
+def test_shuffled_form_matches_the_serializer_and_keeps_the_answer(tmp_path, item_serializer):
+    group = exam_group()
+    options = form_options()
+    [(form_number, package_path, key)] = forms.build_forms(
+        group, [2], str(tmp_path), package_options(item_serializer=item_serializer), options
+    )
+    assert form_number == 2 and package_path.endswith("EX_form02.zip")
+    originals = {item.item_code: item for item in group.items}
+    documents = item_documents(package_path)
+    assert len(documents) == len(group.items)
+
+    plan = forms.plan_form(group, 2, options)
+    assert [entry["item_code"] for entry in key] == [item.item_code for item, _ in plan]
+    for (item, option_order), entry in zip(plan, key):
+        original = originals[item.item_code]
+        variant = forms.form_item(item, option_order, "F02")
+        document = documents[f"Items/item_{variant.item_identifier}.xml"]
+        # Same bytes the DOM serializer writes for the reordered item
+        assert document == main.serialize_qti_item(
+            variant.item_identifier, f"Item: {item.item_code}", item.item_stimulus, item.question_text,
+            variant.options, variant.correct_answer_id, item_serializer="lxml",
+        )
+
+        tree = etree.fromstring(document)
+        choices = tree.findall(".//qti:simpleChoice", QTI)
+        # Option identifiers stay in place; the texts move
+        assert [choice.get("identifier") for choice in choices] == [option_id for option_id, _ in original.options]
+        shown_texts = [choice.findtext("qti:p", namespaces=QTI) for choice in choices]
+        assert shown_texts == [original.options[source][1] for source in option_order]
+        assert sorted(shown_texts) == sorted(text for _, text in original.options)
+        # The correct answer points at the choice showing the original correct text
+        correct_value = tree.findtext(".//qti:correctResponse/qti:value", namespaces=QTI)
+        correct_text = dict(original.options)[original.correct_answer_id]
+        assert correct_value == entry["correct_answer"] == variant.correct_answer_id
+        assert dict(zip((choice.get("identifier") for choice in choices), shown_texts))[correct_value] == correct_text
+
+
+def test_forms_are_reproducible_and_differ_by_seed():
+    group = exam_group()
+    first = forms.plan_form(group, 1, form_options())
+    assert forms.plan_form(group, 1, form_options()) == first
+    assert forms.plan_form(group, 1, form_options(seed="43")) != first
+    assert forms.plan_form(group, 2, form_options()) != first
+
+
+def test_sample_and_no_shuffle():
+    group = exam_group()
+    plan = forms.plan_form(group, 1, form_options(sample=3, shuffle_items=False, shuffle_options=False))
+    positions = [group.items.index(item) for item, _ in plan]
+    assert len(plan) == 3 and positions == sorted(positions)
+    assert all(order == list(range(len(item.options))) for item, order in plan)
+
+
+def test_workers_build_the_same_forms(tmp_path):
+    groups = [exam_group(), make_group("OTHER", 5)]
+    (tmp_path / "serial").mkdir()
+    (tmp_path / "pooled").mkdir()
+    serial = forms.create_forms(groups, str(tmp_path / "serial"), package_options(), form_options(), quiet=True)
+    pooled = forms.create_forms(groups, str(tmp_path / "pooled"), package_options(), form_options(), workers=2,
+                                quiet=True)
+    strip = lambda key: {code: [{**form, "package": None} for form in entries] for code, entries in key.items()}
+    assert strip(serial) == strip(pooled)
+    for entries in serial.values():
+        for form in entries:
+            assert (tmp_path / "serial" / form["package"]).read_bytes() == (tmp_path / "pooled" / form["package"]).read_bytes()
+
+
+def test_a_failed_worker_only_loses_its_forms(tmp_path, capsys):
+    # A lambda can't be pickled, so this group's tasks fail before reaching a worker
+    broken = main.AssessmentGroup("BROKEN", [make_item("BROKEN_1")._replace(item_stimulus=lambda: None)], [])
+    groups = [make_group("FIRST", 4), broken, make_group("LAST", 4)]
+    forms_key = forms.create_forms(groups, str(tmp_path), package_options(), form_options(), workers=2, quiet=True)
+
+    assert sorted(forms_key) == ["FIRST", "LAST"]
+    assert all(form["package"] for entries in forms_key.values() for form in entries)
+    assert "Assessment Code 'BROKEN'" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("item_cache_bytes", [main.ITEM_CACHE_BYTES, 0])
+def test_forms_build_with_schema_validation(tmp_path, schema_mirror, item_cache_bytes):
+    # Form items come in pre-rendered, so they never get an item cache key
+    results = forms.build_forms(
+        exam_group(), [1, 2], str(tmp_path),
+        package_options(validate_schema=True, schema_dir=schema_mirror, item_cache_bytes=item_cache_bytes),
+        form_options(),
+    )
+    assert [form_number for form_number, _, _ in results] == [1, 2]
+    for _, package_path, _ in results:
+        assert package_path is not None
+        assert len(item_documents(package_path)) == len(exam_group().items)
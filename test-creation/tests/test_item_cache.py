@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from tao_qti import main
+
+
+def cache_state(cache):
+    """(keys from least to most recently used, size), checking size against the entries."""
+    assert cache.size == sum(len(data) for data in cache.entries.values())
+    return list(cache.entries), cache.size
+
+
+@pytest.fixture
+def cache():
+    return main.ItemXmlCache(max_bytes=10)
+
+
+def test_hits_make_entries_most_recently_used(cache):
+    for key in "abc":
+        cache.put(key, b"xxx")
+    assert cache.get("a") == b"xxx"
+    assert cache_state(cache) == (["b", "c", "a"], 9)
+
+    cache.put("d", b"xxx") # 12 bytes: b is the least recently used
+    assert cache_state(cache) == (["c", "a", "d"], 9)
+    assert cache.get("b") is None
+
+
+@pytest.mark.parametrize("size, kept", [(4, ["a", "b", "c"]), (5, ["b", "c"])])
+def test_eviction_at_max_bytes(cache, size, kept):
+    cache.put("a", b"x" * 3)
+    cache.put("b", b"x" * 3)
+    cache.put("c", b"x" * size) # 10 bytes fit exactly
+    assert cache_state(cache)[0] == kept
+
+
+def test_entries_larger_than_max_bytes_are_not_kept(cache):
+    cache.put("a", b"x" * 5)
+    cache.put("big", b"x" * 11)
+    assert cache_state(cache) == (["a"], 5)
+    assert cache.get("big") is None
+
+
+def test_overwriting_an_entry_replaces_its_size(cache):
+    cache.put("a", b"x" * 4)
+    cache.put("b", b"x" * 4)
+    for _ in range(3):
+        cache.put("a", b"x" * 4)
+    assert cache_state(cache) == (["b", "a"], 8)
+
+    cache.put("a", b"x" * 6)
+    assert cache_state(cache) == (["b", "a"], 10)
+    cache.put("a", b"x" * 11) # Too large now: the old bytes go too
+    assert cache_state(cache) == (["b"], 4)
+
+
+def test_the_disk_tier_repopulates_memory(tmp_path):
+    cache = main.ItemXmlCache(max_bytes=6, cache_dir=str(tmp_path))
+    cache.put("aa11", b"first")
+    cache.put("bb22", b"second") # Evicts aa11 from memory only
+    assert cache_state(cache) == (["bb22"], 6)
+    assert os.path.isfile(tmp_path / "aa" / "aa11.xml")
+
+    assert cache.get("aa11") == b"first"
+    assert cache_state(cache) == (["aa11"], 5)
+
+    # Another process (or a later run) sharing the directory
+    assert main.ItemXmlCache(max_bytes=6, cache_dir=str(tmp_path)).get("bb22") == b"second"
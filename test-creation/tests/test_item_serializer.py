@@ -0,0 +1,113 @@
+"""The template serializer must write the same bytes as building the item tree with lxml."""
+import random
+
+import pytest
+
+from tao_qti.main import ItemTemplateParts, create_qti_item_xml, render_qti_item_xml, serialize_xml
+
+OPTION_IDS = ['option_A', 'option_B', 'option_C', 'option_D']
+
+# Escaping, stripping, the stimulus "N/A" rule, unicode and non-string cells
+EDGE_CASE_TEXTS = [
+    '', ' ', 'N/A', ' n/a ', 'nan', 'None', 'plain text', '  padded  ',
+    'a < b && c > d', '"double" and \'single\' quotes', ']]>', '&amp; already escaped',
+    'line one\nline two', 'carriage\r\nreturn', 'tab\tseparated', '√2 ≠ 1.414…', 'emoji 😀 and 中文',
+    'עברית RTL', 'x' * 5000, 42, 3.5,
+]
+
+IMAGE_SOURCES = {'a.png': '../Media/a.png', 'dir/b c.png': '../Media/b%20c&d.png'}
+
+IMAGE_TEXTS = [
+    '[img:a.png]',
+    'before [img:a.png] after',
+    '[img:a.png|An <alt> & "quote"] tail',
+    '[img:a.png][img:dir/b c.png|second]',
+    'x < y [img:dir/b c.png] & z',
+]
+
+
+def assert_same_bytes(*args, image_sources=None):
+    for pretty_print in (True, False):
+        expected = serialize_xml(create_qti_item_xml(*args, image_sources=image_sources), pretty_print)
+        assert render_qti_item_xml(*args, pretty_print=pretty_print, image_sources=image_sources) == expected
+
+
+@pytest.mark.parametrize("text", EDGE_CASE_TEXTS)
+def test_edge_case_texts(text):
+    assert_same_bytes('ITEM_1', f"Item: {text}", text, text, [(option_id, text) for option_id in OPTION_IDS], 'option_A')
+
+
+@pytest.mark.parametrize("options", [
+    [],
+    [('option_A', 'only one')],
+    [('option_A', ''), ('option_B', ' ')],
+    [('option_A', 'a'), ('option_B', 'b'), ('option_C', 'c')],
+], ids=["none", "one", "empty texts", "three"])
+def test_option_counts(options):
+    assert_same_bytes('ITEM_OPTIONS', 'Item: options', '', 'Stem', options, 'option_A')
+
+
+def test_special_characters_in_attributes():
+    assert_same_bytes('ITEM_<&">', 'Item: <b> & "c" \'d\'', 'N/A', 'Stem', [('option_A', 'x')], 'option_"A"')
+
+
+@pytest.mark.parametrize("text", IMAGE_TEXTS)
+def test_images(text):
+    image_sources = {reference: source for reference, source in IMAGE_SOURCES.items() if f"[img:{reference}" in text}
+    options = [('option_A', text), ('option_B', 'no image'), ('option_C', f"{text} again")]
+    assert_same_bytes('ITEM_IMG', 'Item: images', text, text, options, 'option_B', image_sources=image_sources)
+
+
+def test_image_references_stay_text_without_sources():
+    text = IMAGE_TEXTS[1]
+    assert_same_bytes('ITEM_IMG', 'Item: images', text, text, [('option_A', text)], 'option_A')
+
+
+@pytest.mark.parametrize("option_order", [[0, 1, 2, 3], [3, 2, 1, 0], [2, 0, 3, 1], [1, 3, 0, 2]])
+@pytest.mark.parametrize("with_images", [False, True])
+def test_option_order(option_order, with_images):
+    options = [('option_A', 'right & <true>'), ('option_B', '[img:a.png] wrong'), ('option_C', 'wrong 😀'), ('option_D', '')]
+    image_sources = IMAGE_SOURCES if with_images else None
+    # Identifiers keep their positions; the correct answer moves with its text
+    reordered = [(option_id, options[source][1]) for option_id, source in zip(OPTION_IDS, option_order)]
+    correct_answer_id = OPTION_IDS[option_order.index(0)]
+    parts = ItemTemplateParts('Item: order', 'N/A', 'Which is right?', options, image_sources)
+    for pretty_print in (True, False):
+        expected = serialize_xml(create_qti_item_xml(
+            'ITEM_F01', 'Item: order', 'N/A', 'Which is right?', reordered, correct_answer_id, image_sources=image_sources
+        ), pretty_print)
+        assert parts.render('ITEM_F01', correct_answer_id, pretty_print, option_order) == expected
+
+
+def test_parts_render_many_variants():
+    options = [('option_A', 'a'), ('option_B', 'b')]
+    parts = ItemTemplateParts('Item: x', 'stimulus', 'stem', options)
+    for identifier in ('ONE', 'TWO'):
+        assert parts.render(identifier, 'option_B') == render_qti_item_xml(
+            identifier, 'Item: x', 'stimulus', 'stem', options, 'option_B'
+        )
+
+
+@pytest.mark.parametrize("bad_text", ['null\x00byte', 'bell\x07', 'form\x0cfeed'])
+def test_both_reject_xml_incompatible_characters(bad_text):
+    case = ('ITEM_BAD', 'Item: bad', '', bad_text, [('option_A', 'ok')], 'option_A')
+    with pytest.raises(ValueError):
+        create_qti_item_xml(*case)
+    with pytest.raises(ValueError):
+        render_qti_item_xml(*case)
+
+
+def random_text(rng):
+    if rng.random() < 0.5:
+        return rng.choice(EDGE_CASE_TEXTS)
+    alphabet = 'abcdefghij <>&"\'\n\t√π中😀'
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+
+
+def test_randomized_items():
+    rng = random.Random(0)
+    for i in range(500):
+        options = [(option_id, random_text(rng) or 'x') for option_id in OPTION_IDS[:rng.randint(1, 4)]]
+        assert_same_bytes(
+            f"ITEM_{i}", f"Item: {random_text(rng)}", random_text(rng), random_text(rng), options, rng.choice(options)[0]
+        )
@@ -0,0 +1,78 @@
+import email.parser
+import email.policy
+
+import pytest
+import requests
+
+from tao_qti import main, taoApiUtil
+from conftest import make_group
+
+FILENAMES = ["A1.zip", "Prüfung_测试 ü.zip", 'with "quotes".zip']
+
+
+def parse(body, raw=None):
+    """The form-data parts of a MultipartFileBody by field name, parsed like the mock TAO server does."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {body.content_type}\r\n\r\n".encode("latin-1") + (raw or b"".join(body))
+    )
+    return {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+
+
+def received_filename(filename):
+    """The filename the server reads: quotes are percent-encoded, like browsers send them."""
+    return filename.replace('"', "%22")
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(taoApiUtil, "UPLOAD_CHUNK_SIZE", 1000)
+
+
+@pytest.mark.parametrize("filename", FILENAMES)
+@pytest.mark.parametrize("source", ["data", "file"])
+def test_body_has_one_file_field(tmp_path, small_chunks, filename, source):
+    data = bytes(range(256)) * 20 + b"\r\n--not-a-boundary\r\n"
+    path = tmp_path / "package.zip"
+    path.write_bytes(data)
+    sent = []
+    body = taoApiUtil.MultipartFileBody(
+        "qtiPackage", filename, **({"data": data} if source == "data" else {"file_path": str(path)}),
+        progress=lambda name, done, total: sent.append((name, done, total)),
+    )
+
+    raw = b"".join(body)
+    assert len(body) == len(raw)
+    request = requests.Request("POST", "http://tao.invalid/", data=body).prepare()
+    assert request.headers["Content-Length"] == str(len(raw)) and "Transfer-Encoding" not in request.headers
+    assert body.content_type == f"multipart/form-data; boundary={body.boundary}"
+    parts = parse(body, raw)
+    assert list(parts) == ["qtiPackage"]
+    assert parts["qtiPackage"].get_filename() == received_filename(filename)
+    assert parts["qtiPackage"].get_content_type() == "application/zip"
+    assert parts["qtiPackage"].get_payload(decode=True) == data
+    assert sent == [(filename, min(done, len(data)), len(data)) for done in range(1000, len(data) + 1000, 1000)]
+    assert body.delivered
+
+
+def test_every_iteration_sends_the_same_bytes():
+    body = taoApiUtil.MultipartFileBody("content", "A1.zip", data=b"PK\x03\x04 zip", content_type="application/x-zip")
+    first = b"".join(body)
+    assert b"".join(body) == first
+    assert parse(body)["content"].get_content_type() == "application/x-zip"
+
+    chunks = iter(body)
+    next(chunks)
+    assert not body.delivered # Not every chunk was handed over yet
+
+
+@pytest.mark.parametrize("filename", FILENAMES)
+def test_upload_to_the_mock_server(tao_server, tmp_path, filename):
+    main.create_qti_packages_from_groups([make_group("A1")], str(tmp_path), quiet=True)
+    package = tmp_path / filename
+    (tmp_path / "A1.zip").rename(package)
+    body_size = len(taoApiUtil.MultipartFileBody("qtiPackage", filename, file_path=str(package)))
+
+    response = taoApiUtil.upload_test_zip_to_tao_api(str(package))
+    assert response == {"success": True, "data": {"filename": received_filename(filename), "size": package.stat().st_size}}
+    # The server read exactly Content-Length bytes, and that was the whole body
+    assert tao_server.stats.snapshot()["bytes_received"] == body_size
@@ -0,0 +1,82 @@
+import io
+import zipfile
+
+import pytest
+
+from tao_qti import main, taoApiUtil
+from conftest import make_group
+
+ITEM = taoApiUtil.ITEM_RESOURCE_TYPE
+TEST = taoApiUtil.TEST_RESOURCE_TYPE
+
+
+def manifest(*resource_types, namespace="http://www.imsglobal.org/xsd/imscp_v1p1"):
+    resources = "".join(
+        f'<resource identifier="r{i}" type="{resource_type}" href="r{i}.xml"/>'
+        for i, resource_type in enumerate(resource_types)
+    )
+    return f'<manifest xmlns="{namespace}"><resources>{resources}</resources></manifest>'
+
+
+def package(manifest_xml=None):
+    """Zip bytes with the given imsmanifest.xml (none if None)."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr("r0.xml", "<assessmentItem/>")
+        if manifest_xml is not None:
+            zf.writestr("imsmanifest.xml", manifest_xml)
+    return buffer.getvalue()
+
+
+PACKAGES = {
+    "item-only": package(manifest(ITEM, ITEM)),
+    "test-only": package(manifest(TEST)),
+    "mixed": package(manifest(ITEM, TEST, ITEM)),
+    "other IMS CP version": package(manifest(ITEM, namespace="http://www.imsglobal.org/xsd/imscp_v1p2")),
+    "no QTI resources": package(manifest("webcontent")),
+    "no resources": package(manifest()),
+    "missing manifest": package(),
+    "unparsable manifest": package("<manifest><resources>"),
+    "not a zip": b"not a zip",
+}
+
+# package -> endpoints in auto mode
+AUTO_PLANS = {
+    "item-only": ["item"],
+    "test-only": ["test"],
+    "mixed": ["test"],
+    "other IMS CP version": ["item"],
+    "no QTI resources": ["item", "test"],
+    "no resources": ["item", "test"],
+    "missing manifest": ["item", "test"],
+    "unparsable manifest": ["item", "test"],
+    "not a zip": ["item", "test"],
+}
+
+
+@pytest.mark.parametrize("name, expected", AUTO_PLANS.items())
+def test_auto_mode_follows_the_manifest(name, expected, tmp_path):
+    zip_path = tmp_path / "package.zip"
+    zip_path.write_bytes(PACKAGES[name])
+    assert taoApiUtil.plan_imports(str(zip_path)) == expected
+    assert taoApiUtil.plan_imports("package.zip", zip_data=PACKAGES[name]) == expected
+
+
+@pytest.mark.parametrize("mode, expected", [("items", ["item"]), ("tests", ["test"]), ("both", ["item", "test"])])
+@pytest.mark.parametrize("name", PACKAGES)
+def test_explicit_modes_ignore_the_manifest(mode, expected, name):
+    assert taoApiUtil.plan_imports("package.zip", mode, zip_data=PACKAGES[name]) == expected
+
+
+def test_missing_files_are_imported_both_ways(tmp_path, capsys):
+    assert taoApiUtil.plan_imports(str(tmp_path / "missing.zip")) == ["item", "test"]
+    assert "Could not read the manifest of 'missing.zip'" in capsys.readouterr().out
+
+
+def test_generated_packages_go_to_the_test_import(tmp_path):
+    packages = []
+    main.create_qti_packages_from_groups(
+        [make_group("G")], str(tmp_path), in_memory=True, quiet=True, on_package=lambda group, result: packages.append(result)
+    )
+    assert taoApiUtil.read_manifest_resource_types(packages[0].filename, packages[0].data) == {ITEM, TEST}
+    assert taoApiUtil.plan_imports(packages[0].filename, zip_data=packages[0].data) == ["test"]
@@ -0,0 +1,100 @@
+import os
+import shutil
+
+import pytest
+
+from tao_qti import main, qti_schemas
+from conftest import STUB_SCHEMAS, make_group
+
+
+def test_complete_mirror_passes(schema_mirror):
+    assert qti_schemas.schema_mirror_problems(schema_mirror) == []
+    qti_schemas.check_schema_mirror(schema_mirror)
+
+
+def test_manifest_lists_every_mirrored_file(schema_mirror):
+    with open(os.path.join(schema_mirror, qti_schemas.SCHEMA_MANIFEST_FILENAME), encoding="utf-8") as f:
+        listed = [line.split("  ", 1)[1].strip() for line in f]
+    assert len(listed) == len(STUB_SCHEMAS)
+    assert "www.imsglobal.org/xsd/qti/qtiv2p1/imsqti_v2p1p1.xsd" in listed
+
+
+def test_missing_manifest_asks_for_fetch(schema_mirror):
+    os.remove(os.path.join(schema_mirror, qti_schemas.SCHEMA_MANIFEST_FILENAME))
+    with pytest.raises(ValueError, match=r"SHA256SUMS' is missing.*--fetch"):
+        qti_schemas.check_schema_mirror(schema_mirror)
+
+
+def test_changed_and_missing_files_are_reported(schema_mirror):
+    imported = os.path.join(schema_mirror, "www.imsglobal.org", "xsd", "xml.xsd")
+    with open(imported, "w") as f:
+        f.write("<xs:schema xmlns:xs='http://www.w3.org/2001/XMLSchema'/>")
+    qti_schemas.write_schema_manifest(schema_mirror)
+    os.remove(imported)
+    with open(qti_schemas.local_schema_path(qti_schemas.QTI_SCHEMA_LOCATION.split()[1], schema_mirror), "a") as f:
+        f.write("<!-- edited -->")
+    problems = qti_schemas.schema_mirror_problems(schema_mirror)
+    assert any("xml.xsd' is missing" in problem for problem in problems)
+    assert any("imsqti_v2p1p1.xsd' changed" in problem for problem in problems)
+
+
+def test_validate_fails_at_startup_without_a_mirror(tmp_path):
+    with pytest.raises(ValueError, match="--fetch"):
+        main.parse_args(["test.xlsx", str(tmp_path / "out"), "--validate", "--schema-dir", str(tmp_path / "none")])
+
+
+def test_builder_checks_the_mirror_before_building(tmp_path):
+    output_dir = tmp_path / "out"
+    with pytest.raises(ValueError, match="incomplete"):
+        main.create_qti_packages_from_groups(
+            [make_group("A1")], str(output_dir), validate_schema=True, schema_dir=str(tmp_path / "none"), quiet=True
+        )
+    assert not output_dir.exists() or not os.listdir(output_dir)
+
+
+def test_packages_validate_against_the_mirror(tmp_path, schema_mirror):
+    built = main.create_qti_packages_from_groups(
+        [make_group("A1")], str(tmp_path), validate_schema=True, schema_dir=schema_mirror, quiet=True
+    )
+    assert built == 1
+    schema_cache = qti_schemas.get_schema_cache(schema_mirror)
+    assert qti_schemas.validate_package(str(tmp_path / "A1.zip"), schema_cache) == {}
+
+
+@pytest.fixture
+def no_bundled_mirror(tmp_path, monkeypatch):
+    """An empty bundled mirror, with the user cache directory under tmp_path."""
+    monkeypatch.setattr(qti_schemas, "DEFAULT_SCHEMA_DIR", str(tmp_path / "bundled"))
+    monkeypatch.setattr(qti_schemas, "_SCHEMA_CACHES", {})
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return os.path.join(str(tmp_path / "cache"), "tao_qti", "schemas")
+
+
+def test_missing_bundled_schemas_are_fetched_once(no_bundled_mirror, schema_mirror, monkeypatch):
+    fetched = []
+
+    def fetch(schema_dir, quiet=False):
+        fetched.append(schema_dir)
+        shutil.copytree(schema_mirror, schema_dir)
+
+    monkeypatch.setattr(qti_schemas, "fetch_schemas", fetch)
+    qti_schemas.check_schema_mirror()
+    qti_schemas.check_schema_mirror()
+    assert fetched == [no_bundled_mirror]
+    assert qti_schemas.get_schema_cache().schema_dir == no_bundled_mirror
+
+
+def test_offline_runs_without_bundled_schemas_ask_for_fetch(no_bundled_mirror, monkeypatch):
+    def fetch(schema_dir, quiet=False):
+        raise ConnectionError("Name or service not known")
+
+    monkeypatch.setattr(qti_schemas, "fetch_schemas", fetch)
+    with pytest.raises(ValueError, match="Name or service not known.*--fetch"):
+        main.parse_args(["test.xlsx", "out", "--validate"])
+
+
+def test_a_complete_bundled_mirror_is_used_as_is(schema_mirror, monkeypatch):
+    monkeypatch.setattr(qti_schemas, "DEFAULT_SCHEMA_DIR", schema_mirror)
+    monkeypatch.setattr(qti_schemas, "fetch_schemas", None)
+    assert qti_schemas.default_schema_dir() == schema_mirror
+    qti_schemas.check_schema_mirror()
@@ -0,0 +1,169 @@
+import os
+import re
+import stat
+
+import pandas as pd
+import pytest
+
+from tao_qti import batch, main
+
+ROWS = pd.DataFrame([
+    {column: f"{column} {i}" for column in main.EXPECTED_COLUMNS} | {"Assessment Code": code, "Correct Answer": "A"}
+    for i, code in enumerate(["T1", "", "T1", ""])
+])
+FILTERED_WARNING = "Filtered out 2 rows with empty 'Assessment Code'"
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / "exam.csv"
+    ROWS.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def entry_files(cache_dir):
+    return [os.path.join(cache_dir, name) for name in sorted(os.listdir(cache_dir))]
+
+
+def test_entries_are_private(csv_file, cache_dir):
+    main.read_exam_data(csv_file, read_cache_dir=cache_dir)
+    assert stat.S_IMODE(os.stat(cache_dir).st_mode) == 0o700
+    files = entry_files(cache_dir)
+    assert [os.path.splitext(f)[1] for f in files] == [".cols", ".json"]
+    for path in files:
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_hits_repeat_the_filtered_rows_warning(csv_file, cache_dir, capsys):
+    first = main.read_exam_data(csv_file, read_cache_dir=cache_dir)
+    assert FILTERED_WARNING in capsys.readouterr().out
+
+    cached = main.read_exam_data(csv_file, read_cache_dir=cache_dir)
+    out = capsys.readouterr().out
+    assert "Reusing the cached read" in out
+    assert FILTERED_WARNING in out
+    pd.testing.assert_frame_equal(cached, first)
+
+
+def test_batch_hits_repeat_the_filtered_rows_warning(tmp_path, cache_dir, capsys):
+    workbook = str(tmp_path / "exams.xlsx")
+    with pd.ExcelWriter(workbook) as writer:
+        ROWS.to_excel(writer, sheet_name="A", index=False)
+        ROWS.iloc[:3].to_excel(writer, sheet_name="B", index=False)
+
+    def filtered_counts():
+        return re.findall(r"Filtered out (\d+) rows", capsys.readouterr().out)
+
+    batch.read_input_sheets(workbook, cache_dir)
+    assert filtered_counts() == ["2", "1"]
+    assert main.ReadCache(cache_dir).load(workbook, variant="sheets") is not None
+    batch.read_input_sheets(workbook, cache_dir)
+    assert filtered_counts() == ["2", "1"]
+
+
+@pytest.mark.parametrize("target", ["json", "cols", "dir"])
+def test_entries_others_can_write_to_are_not_loaded(csv_file, cache_dir, target, capsys):
+    main.read_exam_data(csv_file, read_cache_dir=cache_dir)
+    path = cache_dir if target == "dir" else next(f for f in entry_files(cache_dir) if f.endswith(target))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IWGRP | stat.S_IWOTH)
+    capsys.readouterr()
+
+    assert main.ReadCache(cache_dir).load(csv_file) is None
+    assert "only you can write to" in capsys.readouterr().out
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid") or os.getuid() != 0, reason="chown to another user needs root")
+@pytest.mark.parametrize("target", ["json", "cols", "dir"])
+def test_entries_of_other_users_are_not_loaded(csv_file, cache_dir, target):
+    main.read_exam_data(csv_file, read_cache_dir=cache_dir)
+    path = cache_dir if target == "dir" else next(f for f in entry_files(cache_dir) if f.endswith(target))
+    os.chown(path, 12345, 12345)
+
+    assert main.ReadCache(cache_dir).load(csv_file) is None
+
+
+def test_symlinked_entries_are_not_loaded(csv_file, cache_dir, tmp_path):
+    main.read_exam_data(csv_file, read_cache_dir=cache_dir)
+    frame_path = next(f for f in entry_files(cache_dir) if f.endswith(".cols"))
+    os.replace(frame_path, tmp_path / "elsewhere.cols")
+    os.symlink(tmp_path / "elsewhere.cols", frame_path)
+
+    assert main.ReadCache(cache_dir).load(csv_file) is None
+
+
+def test_read_cache_option_uses_the_user_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    positional, options = main.parse_generation_options(["exam.csv", "out", "--read-cache"])
+    assert positional == ["exam.csv", "out"]
+    assert options["read_cache_dir"] == os.path.join(str(tmp_path), "tao_qti", "read")
+    assert main.ReadCache().cache_dir == options["read_cache_dir"]
+
+
+def mixed_frame():
+    import datetime
+
+    import numpy as np
+
+    cells = ["text", 3, 2.5, float("nan"), None, True, pd.Timestamp("2024-05-01 10:30"),
+             datetime.datetime(2024, 5, 1, 10, 30, 5, 7), datetime.date(2024, 5, 1), datetime.time(9, 15),
+             pd.NaT, np.float64(1.25), np.int64(7), np.bool_(False), "ünïcode ✓", ""]
+    count = len(cells)
+    return pd.DataFrame({
+        "Mixed": pd.Series(cells, dtype=object),
+        "Floats": np.linspace(0, 1, count),
+        "Ints": np.arange(count, dtype=np.int64),
+        "Flags": np.arange(count) % 2 == 0,
+        "Dates": pd.date_range("2024-01-01", periods=count),
+    }, index=pd.Index(range(2, 2 * count + 2, 2), name="row"))
+
+
+def test_mixed_type_cells_come_back_as_they_were_read(csv_file, cache_dir):
+    df = mixed_frame()
+    cache = main.ReadCache(cache_dir)
+    cache.save(csv_file, cache.fingerprint(csv_file), [df, df.iloc[:0]], extra={"any": "json"})
+
+    (cached, empty), extra = cache.load(csv_file)
+    pd.testing.assert_frame_equal(cached, df)
+    assert [type(value) for value in cached["Mixed"]] == [type(value) for value in df["Mixed"]]
+    pd.testing.assert_frame_equal(empty, df.iloc[:0])
+    assert extra == {"any": "json"}
+
+
+def test_numeric_columns_are_memory_mapped(csv_file, cache_dir):
+    import numpy as np
+
+    cache = main.ReadCache(cache_dir)
+    cache.save(csv_file, cache.fingerprint(csv_file), [mixed_frame()])
+    (cached,), _ = cache.load(csv_file)
+    base = cached["Floats"].to_numpy()
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert isinstance(base, np.memmap)
+
+    cached.loc[2, "Floats"] = 99.0 # Copy-on-write: the entry is unchanged
+    (again,), _ = cache.load(csv_file)
+    assert again.loc[2, "Floats"] == 0.0
+
+
+@pytest.mark.parametrize("column", [pd.Series(["a", "b"], dtype="category"), pd.Series([["a"], ["b"]])])
+def test_frames_that_cant_be_stored_are_not_cached(csv_file, cache_dir, column, capsys):
+    cache = main.ReadCache(cache_dir)
+    cache.save(csv_file, cache.fingerprint(csv_file), [pd.DataFrame({"Column": column})])
+    assert "Not caching the read" in capsys.readouterr().out
+    assert cache.load(csv_file) is None
+
+
+def test_damaged_entries_are_ignored(csv_file, cache_dir, capsys):
+    main.read_exam_data(csv_file, read_cache_dir=cache_dir)
+    frame_path = next(f for f in entry_files(cache_dir) if f.endswith(".cols"))
+    with open(frame_path, "r+b") as f:
+        f.truncate(10)
+    capsys.readouterr()
+
+    assert main.ReadCache(cache_dir).load(csv_file) is None
+    assert "unreadable read cache entry" in capsys.readouterr().out
@@ -0,0 +1,98 @@
+import os
+import zipfile
+
+import pytest
+
+from tao_qti import main
+from conftest import make_group, make_item
+
+
+def group_with_rejections(code, item_count):
+    return main.AssessmentGroup(code, make_group(code, item_count).items, ["Skipping row 9", "Skipping row 10"])
+
+
+def item_entries(zip_path):
+    with zipfile.ZipFile(zip_path) as zf:
+        return [name for name in zf.namelist() if name.startswith("Items/") and name.endswith(".xml")]
+
+
+def part_sizes(parts):
+    return [len(part.items) for part in parts]
+
+
+def test_groups_within_the_limits_are_kept():
+    group = make_group("X", 3)
+    assert main.shard_assessment_group(group, max_items_per_package=3) == [group]
+    assert main.shard_assessment_group(group) == [group]
+
+
+@pytest.mark.parametrize("limit, sizes", [(1, [1, 1, 1, 1, 1]), (2, [2, 2, 1]), (4, [4, 1]), (5, [5])])
+def test_item_limit_boundaries(limit, sizes):
+    assert part_sizes(main.shard_assessment_group(make_group("X", 5), max_items_per_package=limit)) == sizes
+
+
+@pytest.mark.parametrize("slack, sizes", [(0, [2, 2, 1]), (-1, [1, 1, 1, 1, 1])])
+def test_byte_limit_boundaries(slack, sizes):
+    group = make_group("X", 5)
+    item_bytes = {main.estimate_item_bytes(item) for item in group.items}
+    assert len(item_bytes) == 1 # Same-sized items make the boundary exact
+    limit = main.PACKAGE_OVERHEAD_BYTES + 2 * item_bytes.pop() + slack
+    assert part_sizes(main.shard_assessment_group(group, max_package_bytes=limit)) == sizes
+
+
+def test_items_larger_than_the_limit_get_a_part_of_their_own():
+    items = [make_item("SMALL_1"), make_item("BIG", question="x" * 100_000), make_item("SMALL_2")]
+    group = main.AssessmentGroup("X", items, [])
+    parts = main.shard_assessment_group(group, max_package_bytes=main.PACKAGE_OVERHEAD_BYTES + 10_000)
+    assert [[item.item_code for item in part.items] for part in parts] == [["SMALL_1"], ["BIG"], ["SMALL_2"]]
+
+
+@pytest.mark.parametrize("item_count, codes", [
+    (3, ["X_part01", "X_part02", "X_part03"]),
+    (12, [f"X_part{n:02d}" for n in range(1, 13)]),
+    (100, [f"X_part{n:03d}" for n in range(1, 101)]),
+])
+def test_part_names(item_count, codes):
+    parts = main.shard_assessment_group(make_group("X", item_count), max_items_per_package=1)
+    assert [part.assessment_code for part in parts] == codes
+
+
+def test_rejected_messages_stay_on_the_first_part():
+    parts = main.shard_assessment_group(group_with_rejections("X", 3), max_items_per_package=1)
+    assert [part.rejected_messages for part in parts] == [["Skipping row 9", "Skipping row 10"], [], []]
+
+
+def test_escaping_is_counted_in_the_estimate():
+    plain, escaped = make_item("A", question="a" * 100), make_item("A", question="&" * 100)
+    assert main.estimate_item_bytes(escaped) >= main.estimate_item_bytes(plain) + len(b"&amp;") * 100 - 100
+
+
+def test_text_that_isnt_xml_compatible_only_rejects_its_item(tmp_path, capsys):
+    bad = make_item("BAD", question="Broken \x01 question?")
+    groups = [main.AssessmentGroup("X", [make_item("GOOD"), bad], []), make_group("Y", 2)]
+    assert main.estimate_item_bytes(bad) > 0
+
+    main.create_qti_packages_from_groups(groups, str(tmp_path), max_package_bytes=10 ** 6)
+    captured = capsys.readouterr()
+    assert "Error processing item" in captured.out + captured.err
+    assert item_entries(tmp_path / "X.zip") == ["Items/item_GOOD.xml"]
+    assert os.path.isfile(tmp_path / "Y.zip")
+
+
+def test_parts_are_built_as_packages(tmp_path):
+    main.create_qti_packages_from_groups([make_group("X", 3)], str(tmp_path), max_items_per_package=2, quiet=True)
+    assert sorted(os.listdir(tmp_path)) == ["X_part01.zip", "X_part02.zip"]
+    assert item_entries(tmp_path / "X_part02.zip") == ["Items/item_X_I2.xml"]
+
+
+@pytest.mark.parametrize("codes", [["X", "X_part01"], ["X_part01", "X"], ["X", "X part02"]])
+def test_part_codes_must_not_clash_with_group_codes(codes):
+    groups = [make_group(code, 3 if code == "X" else 1) for code in codes]
+    with pytest.raises(ValueError, match="X.part0"):
+        list(main.shard_assessment_groups(groups, max_items_per_package=2))
+
+
+def test_group_codes_like_part_codes_are_fine_without_limits():
+    groups = [make_group("X", 3), make_group("X_part01", 1)]
+    assert list(main.shard_assessment_groups(groups)) == groups
+    assert len(list(main.shard_assessment_groups(groups, max_items_per_package=3))) == 2
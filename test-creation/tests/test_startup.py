@@ -0,0 +1,42 @@
+"""Startup checks for the tao-qti entry points: help and upload must not load the heavy modules."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["pandas", "numpy", "lxml", "openpyxl"]
+
+
+def loaded_modules(code, forbidden):
+    """Runs code in a fresh interpreter and returns the forbidden modules it loaded."""
+    completed = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport json, sys\n"
+                               f"print(json.dumps([name for name in {forbidden!r} if name in sys.modules]))"],
+        capture_output=True, text=True, cwd=PACKAGE_ROOT, check=True,
+    )
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("argv", [
+    ["--help"],
+    ["generate", "--help"],
+    ["batch", "--help"],
+    ["forms", "--help"],
+    ["upload", "--help"],
+    ["run", "--help"],
+    ["serve", "--help"],
+    ["validate", "--help"],
+])
+def test_help_does_not_import_heavy_modules(argv):
+    code = f"from tao_qti import cli\ncli.main({argv!r})"
+    assert loaded_modules(code, HEAVY_MODULES + ["requests", "dotenv"]) == []
+
+
+@pytest.mark.parametrize("module", ["tao_qti.cli", "tao_qti.main", "tao_qti.taoApiUtil", "tao_qti.qti_schemas"])
+def test_import_does_not_load_heavy_modules(module):
+    # requests and dotenv are only loaded by the first upload
+    assert loaded_modules(f"import {module}", HEAVY_MODULES + ["requests", "dotenv"]) == []
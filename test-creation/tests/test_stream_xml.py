@@ -0,0 +1,61 @@
+"""The streaming test and manifest writers must write the same bytes as building the trees with lxml."""
+import io
+
+import pytest
+
+from tao_qti import main
+
+# Identifiers and titles with characters to escape, and non-ASCII ones
+CODES = ["A1", "Q&A <1> \"x\" 'y'", "Ünïcödé_测试_😀"]
+
+
+def item_references(code, count):
+    return [(f"{code}_I{i}", f"Items/item_{code}_I{i}.xml") for i in range(count)]
+
+
+def streamed(writer, *args, **kwargs):
+    out = io.BytesIO()
+    writer(out, *args, **kwargs)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("pretty_print", [True, False])
+@pytest.mark.parametrize("max_items_per_section", [None, 1, 2, 3, 10])
+@pytest.mark.parametrize("item_count", [0, 1, 5])
+@pytest.mark.parametrize("code", CODES)
+def test_test_documents(code, item_count, max_items_per_section, pretty_print):
+    references = item_references(code, item_count)
+    title = f"Test for Assessment Code: {code}"
+    expected = main.serialize_xml(main.create_qti_test_xml(code, title, references, max_items_per_section), pretty_print)
+    assert streamed(
+        main.write_qti_test_xml, code, title, references, pretty_print, max_items_per_section
+    ) == expected
+
+
+@pytest.mark.parametrize("pretty_print", [True, False])
+@pytest.mark.parametrize("files", [
+    {},
+    {"media_files": ["Media/a.png", "Media/b&c <d>.png"]},
+    {"css_files": ["Style/ünï.css"]},
+    {"media_files": ["Media/a.png"], "css_files": ["Style/s.css"], "item_files": {}},
+], ids=["none", "media", "css", "item files, media and css"])
+@pytest.mark.parametrize("item_count", [0, 1, 5])
+@pytest.mark.parametrize("code", CODES)
+def test_manifest_documents(code, item_count, files, pretty_print):
+    references = item_references(code, item_count)
+    files = dict(files)
+    if "item_files" in files:
+        files["item_files"] = {identifier: [f"Media/{identifier}.png"] for identifier, _ in references[::2]}
+    args = (code, f"{code}_Test", f"Tests/test_{code}_Test.xml", references)
+    expected = main.serialize_xml(main.create_imsmanifest_xml_for_test_package(*args, **files), pretty_print)
+    assert streamed(main.write_imsmanifest_xml_for_test_package, *args, pretty_print=pretty_print, **files) == expected
+
+
+def test_documents_written_in_several_batches(monkeypatch):
+    monkeypatch.setattr(main, "STREAM_WRITE_BATCH", 2)
+    references = item_references(CODES[2], 7)
+    expected = main.serialize_xml(main.create_qti_test_xml("T", "Title", references, 3), True)
+    assert streamed(main.write_qti_test_xml, "T", "Title", references, True, 3) == expected
+    args = ("P", "T", "Tests/test_T.xml", references)
+    expected = main.serialize_xml(main.create_imsmanifest_xml_for_test_package(*args, media_files=["Media/a.png"]), True)
+    assert streamed(main.write_imsmanifest_xml_for_test_package, *args, media_files=["Media/a.png"]) == expected
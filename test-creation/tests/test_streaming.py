@@ -0,0 +1,108 @@
+"""--stream must see the same items as reading the whole file: stream_assessment_groups against read_exam_data."""
+import csv
+import datetime
+
+import openpyxl
+import pytest
+
+from tao_qti import main
+
+
+def row(item_code, assessment_code, stimulus=None, stem="Which one?", options=("Yes", "No", None, None), answer="A"):
+    cells = dict.fromkeys(main.EXPECTED_COLUMNS)
+    cells.update({"Item code": item_code, "Assessment Code": assessment_code, "Item Stimulus": stimulus,
+                  "Item Stem": stem, "Correct Answer": answer})
+    cells.update(zip(["Option A", "Option B", "Option C", "Option D"], options))
+    return [cells[column] for column in main.EXPECTED_COLUMNS]
+
+
+MIDNIGHT = datetime.datetime(2024, 5, 1)
+
+# Codes interleaved, a numeric one and rows without one; Option D holds whole numbers
+# with an empty cell in another group, Option C dates, numbers and booleans, and the
+# stimuli only dates (all at midnight) or nothing
+ROWS = [
+    row("I1", "T1", MIDNIGHT, options=(1, 2.5, MIDNIGHT, 4)),
+    row(102, "T2", None, stem=42, options=(1.0, "N/A", True, 5), answer="c"),
+    row(2.5, "T1", MIDNIGHT, options=(False, "x", None, 6), answer="D"),
+    row("I4", None, options=("a", "b", 3, 7)),
+    row("I5", 7, datetime.datetime(2024, 1, 2), stem="  padded ", options=("NA", "", " ", None), answer="D"),
+    row(None, "T2", options=("a", "b", datetime.datetime(2024, 1, 2, 3, 4, 5), 8), answer="E"),
+    row("I7", "T1", options=(1, 2, 0, 9), answer="b"),
+    row("TRUE", "T3", options=("true", 1e3, "1.5", 10)),
+]
+
+
+def write_xlsx(path, rows):
+    workbook = openpyxl.Workbook()
+    workbook.active.append(main.EXPECTED_COLUMNS)
+    for values in rows:
+        workbook.active.append(values)
+    workbook.save(path)
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(main.EXPECTED_COLUMNS)
+        writer.writerows(["" if value is None else value for value in values] for values in rows)
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx}
+
+
+def validated(frame):
+    validation = main.validate_exam_data(frame)
+    return ([item for item in validation.items if item is not None],
+            [message for message in validation.rejected_messages if message is not None])
+
+
+def eager_groups(path):
+    df = main.read_exam_data(path)
+    return {
+        group.assessment_code: (group.items, group.rejected_messages)
+        for group in main.group_validated_items(main.validate_exam_data(df), df.groupby("Assessment Code"))
+    }
+
+
+def streamed_groups(path):
+    return {code: validated(main.item_records_to_frame(records)) for code, records in main.stream_assessment_groups(path)}
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 3, 10000])
+@pytest.mark.parametrize("extension", WRITERS)
+def test_streamed_groups_match_the_whole_file_read(tmp_path, extension, chunk_rows, monkeypatch, capsys):
+    monkeypatch.setattr(main, "STREAM_CHUNK_ROWS", chunk_rows)
+    path = str(tmp_path / f"exam.{extension}")
+    WRITERS[extension](path, ROWS)
+
+    expected = eager_groups(path)
+    eager_out = capsys.readouterr().out
+    streamed = streamed_groups(path)
+    assert capsys.readouterr().out == eager_out # The same filtered-rows warning
+    assert sorted(streamed) == sorted(expected)
+    for code, (items, messages) in expected.items():
+        assert streamed[code][0] == items, code
+        assert streamed[code][1] == messages, code
+    assert sum(len(items) for items, _ in expected.values()) == 5
+
+
+@pytest.mark.parametrize("extension", WRITERS)
+def test_whole_number_columns_with_gaps_hold_floats_in_every_group(tmp_path, extension):
+    path = str(tmp_path / f"exam.{extension}")
+    WRITERS[extension](path, [row("I1", "T1", options=(1, 2, None, None)), row("I2", "T2", options=(3, None, None, None))])
+    streamed = streamed_groups(path)
+    assert streamed["T1"][0][0].options == (("option_A", "1"), ("option_B", "2.0"))
+    assert streamed == eager_groups(path)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, main.NaN), ("", main.NaN), ("N/A", main.NaN), ("NULL", main.NaN), (3.0, 3), (2.5, 2.5), (True, True),
+    (MIDNIGHT, MIDNIGHT), ("text", "text"), (" ", " "),
+])
+def test_xlsx_cell_values(value, expected):
+    converted = main._xlsx_cell_value(value)
+    if expected is main.NaN:
+        assert converted != converted
+    else:
+        assert converted == expected and type(converted) is type(expected)
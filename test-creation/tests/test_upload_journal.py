@@ -0,0 +1,109 @@
+import os
+
+import pytest
+
+from tao_qti import main, taoApiUtil
+from conftest import make_group
+
+
+@pytest.fixture
+def packages_dir(tmp_path):
+    output_dir = tmp_path / "packages"
+    output_dir.mkdir()
+    main.create_qti_packages_from_groups([make_group("A"), make_group("B")], str(output_dir), quiet=True)
+    return str(output_dir)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return taoApiUtil.UploadJournal(str(tmp_path / "journal.sqlite3"))
+
+
+def upload(packages_dir, journal, **kwargs):
+    """Imports the packages; returns (results, names of the packages whose body was sent)."""
+    sent = set()
+    results = taoApiUtil.import_packages(
+        packages_dir, ["A.zip", "B.zip"], journal=journal, progress=lambda name, done, total: sent.add(name), **kwargs
+    )
+    return results, sent
+
+
+def statuses(journal, packages_dir):
+    return {
+        filename: journal.status(taoApiUtil.file_sha256(os.path.join(packages_dir, filename)), "test")
+        for filename in ("A.zip", "B.zip")
+    }
+
+
+def test_imported_packages_are_not_sent_again(tao_server, packages_dir, journal):
+    results, sent = upload(packages_dir, journal)
+    assert results == {"A.zip": {"test": True}, "B.zip": {"test": True}}
+    assert sent == {"A.zip", "B.zip"}
+    assert statuses(journal, packages_dir) == {"A.zip": "success", "B.zip": "success"}
+
+    results, sent = upload(packages_dir, journal)
+    assert results == {"A.zip": {"test": True}, "B.zip": {"test": True}}
+    assert sent == set()
+    assert tao_server.stats.snapshot()["requests"] == 2
+
+
+def test_renamed_packages_are_recognized_by_content(tao_server, packages_dir, journal):
+    upload(packages_dir, journal)
+    os.rename(os.path.join(packages_dir, "A.zip"), os.path.join(packages_dir, "A_renamed.zip"))
+
+    sent = set()
+    results = taoApiUtil.import_packages(
+        packages_dir, ["A_renamed.zip"], journal=journal, progress=lambda name, done, total: sent.add(name)
+    )
+    assert results == {"A_renamed.zip": {"test": True}}
+    assert sent == set()
+
+
+def test_failed_imports_are_sent_again(tao_server, packages_dir, journal, monkeypatch):
+    monkeypatch.setattr(taoApiUtil, "auth_header", "Basic wrong")
+    results, _ = upload(packages_dir, journal)
+    assert results == {"A.zip": {"test": False}, "B.zip": {"test": False}}
+    assert statuses(journal, packages_dir) == {"A.zip": "failed", "B.zip": "failed"}
+
+    monkeypatch.setattr(taoApiUtil, "auth_header", tao_server.config.auth_header)
+    results, sent = upload(packages_dir, journal)
+    assert results == {"A.zip": {"test": True}, "B.zip": {"test": True}}
+    assert sent == {"A.zip", "B.zip"}
+
+
+def test_unknown_outcomes_wait_for_verification(tao_server, packages_dir, journal, monkeypatch):
+    # TAO answers after the client gave up waiting: the packages may well be imported
+    tao_server.config.latency_ms = 500
+    monkeypatch.setattr(taoApiUtil, "UPLOAD_TIMEOUT_SECONDS", 0.1)
+    monkeypatch.setattr(taoApiUtil, "UPLOAD_TIMEOUT_SECONDS_PER_MB", 0)
+    results, _ = upload(packages_dir, journal)
+    assert results == {"A.zip": {"test": None}, "B.zip": {"test": None}}
+    assert statuses(journal, packages_dir) == {"A.zip": "unknown", "B.zip": "unknown"}
+
+    tao_server.config.latency_ms = 0
+    results, sent = upload(packages_dir, journal)
+    assert results == {"A.zip": {"test": None}, "B.zip": {"test": None}}
+    assert sent == set()
+
+    results, sent = upload(packages_dir, journal, retry_unverified=True)
+    assert results == {"A.zip": {"test": True}, "B.zip": {"test": True}}
+    assert sent == {"A.zip", "B.zip"}
+    assert statuses(journal, packages_dir) == {"A.zip": "success", "B.zip": "success"}
+
+
+def test_rerun_after_a_crash_mid_import(tao_server, packages_dir, journal, capsys):
+    def crash(name, done, total):
+        if name == "B.zip":
+            raise KeyboardInterrupt
+    with pytest.raises(KeyboardInterrupt):
+        taoApiUtil.import_packages(packages_dir, ["A.zip", "B.zip"], journal=journal, progress=crash)
+    assert statuses(journal, packages_dir) == {"A.zip": "success", "B.zip": "started"}
+
+    results, sent = upload(packages_dir, journal)
+    assert results == {"A.zip": {"test": True}, "B.zip": {"test": None}}
+    assert sent == set()
+    assert "UNVERIFIED: B.zip" in capsys.readouterr().out
+
+    results, sent = upload(packages_dir, journal, retry_unverified=True)
+    assert results == {"A.zip": {"test": True}, "B.zip": {"test": True}}
+    assert sent == {"B.zip"}
@@ -0,0 +1,146 @@
+import hashlib
+import socket
+
+import pytest
+import requests
+
+from tao_qti import taoApiUtil
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def scripted_request(*outcomes):
+    """A request() callable returning (or raising) the given outcomes in turn; calls counts the attempts."""
+    outcomes = list(outcomes)
+
+    def request():
+        request.calls += 1
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+    request.calls = 0
+    return request
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(taoApiUtil, "RETRY_BASE_DELAY", 0)
+
+
+def send(request, delivered=None):
+    return taoApiUtil.UploadController(retries=2).send(request, 1024, "test.zip", delivered=delivered)
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_refused_requests_are_retried(status):
+    request = scripted_request(status, 200)
+    assert send(request).status_code == 200
+    assert request.calls == 2
+
+
+@pytest.mark.parametrize("status", [502, 504])
+def test_gateway_errors_are_unknown_outcomes(status):
+    request = scripted_request(status, 200)
+    with pytest.raises(taoApiUtil.UnknownOutcomeError, match=f"HTTP {status}"):
+        send(request)
+    assert request.calls == 1
+
+
+def test_server_errors_are_returned_without_retry():
+    request = scripted_request(500, 200)
+    assert send(request).status_code == 500
+    assert request.calls == 1
+
+
+def test_connect_timeouts_are_retried():
+    request = scripted_request(requests.exceptions.ConnectTimeout("connect timed out"), 200)
+    assert send(request).status_code == 200
+    assert request.calls == 2
+
+
+def test_refused_connections_are_retried():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1] # Nothing listens there once the socket is closed
+    with pytest.raises(requests.exceptions.ConnectionError) as refused:
+        requests.post(f"http://127.0.0.1:{port}/", data=b"x", timeout=5)
+    assert taoApiUtil.failed_before_delivery(refused.value, delivered=True)
+
+    request = scripted_request(refused.value, 200)
+    assert send(request, delivered=lambda: True).status_code == 200
+    assert request.calls == 2
+
+
+def test_retries_are_limited():
+    request = scripted_request(429, 429, 429, 200)
+    assert send(request).status_code == 429
+    assert request.calls == 3
+
+
+def test_read_timeouts_are_unknown_outcomes():
+    request = scripted_request(requests.exceptions.ReadTimeout("read timed out"), 200)
+    with pytest.raises(taoApiUtil.UnknownOutcomeError, match="ReadTimeout"):
+        send(request, delivered=lambda: True)
+    assert request.calls == 1
+
+
+@pytest.mark.parametrize("delivered, retried", [(True, False), (False, True)])
+def test_resets_are_retried_only_before_the_body_is_sent(delivered, retried):
+    request = scripted_request(requests.exceptions.ConnectionError("Connection reset by peer"), 200)
+    if retried:
+        assert send(request, delivered=lambda: delivered).status_code == 200
+    else:
+        with pytest.raises(taoApiUtil.UnknownOutcomeError):
+            send(request, delivered=lambda: delivered)
+    assert request.calls == (2 if retried else 1)
+
+
+@pytest.fixture
+def fake_upload(monkeypatch):
+    """Replaces the item import endpoint with one following upload.outcomes; upload.calls counts the uploads."""
+    def upload(**kwargs):
+        upload.calls += 1
+        outcome = upload.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    upload.calls = 0
+    upload.outcomes = []
+    monkeypatch.setitem(taoApiUtil.IMPORT_ENDPOINTS, "item", upload)
+    return upload
+
+
+def import_item(journal, **kwargs):
+    return taoApiUtil.import_package("a.zip", journal=journal, endpoints=["item"], zip_data=b"zip", **kwargs)
+
+
+def test_unknown_outcomes_wait_for_verification(tmp_path, fake_upload):
+    journal = taoApiUtil.UploadJournal(str(tmp_path / "journal.sqlite3"))
+    fake_upload.outcomes = [taoApiUtil.UnknownOutcomeError("a.zip: HTTP 504 from the gateway"), {"success": True}]
+
+    assert import_item(journal) == {"item": None}
+    sha256 = hashlib.sha256(b"zip").hexdigest()
+    assert journal.status(sha256, "item") == "unknown"
+
+    assert import_item(journal) == {"item": None}
+    assert fake_upload.calls == 1
+
+    assert import_item(journal, retry_unverified=True) == {"item": True}
+    assert fake_upload.calls == 2
+    assert journal.status(sha256, "item") == "success"
+
+
+def test_imports_interrupted_by_a_crash_are_unverified(tmp_path, fake_upload):
+    journal = taoApiUtil.UploadJournal(str(tmp_path / "journal.sqlite3"))
+    sha256 = hashlib.sha256(b"zip").hexdigest()
+    journal.record(sha256, "item", "a.zip", "started")
+    fake_upload.outcomes = [{"success": True}]
+
+    assert import_item(journal) == {"item": None}
+    assert fake_upload.calls == 0
+    assert import_item(journal, retry_unverified=True) == {"item": True}
@@ -0,0 +1,137 @@
+import math
+import os
+
+import pandas as pd
+import pytest
+
+from tao_qti import main
+
+
+def row(item_code, **cells):
+    """A worksheet row of Assessment Code T1 with two options and answer A; cells are keyed by column."""
+    values = {column: "" for column in main.EXPECTED_COLUMNS}
+    values.update({"Item code": item_code, "Assessment Code": "T1", "Item Stem": "Which one?",
+                   "Option A": "Yes", "Option B": "No", "Correct Answer": "A"})
+    values.update(cells)
+    return values
+
+
+def rejected(row_number, item_code, reason):
+    """The message validate_exam_data writes for a rejected row with the options of row()."""
+    if reason == "invalid_item_code":
+        return f"Skipping row {row_number} due to invalid Item Code: '{item_code}' (Sanitized: unspecified_id0)"
+    if reason == "no_valid_options":
+        return f"Skipping item '{item_code}' (row {row_number}) due to no valid options found."
+    raise AssertionError(reason)
+
+
+def wrong_answer(row_number, item_code, answer, letters=("A", "B")):
+    return (f"Skipping item '{item_code}' (row {row_number}) due to invalid or missing 'Correct Answer' "
+            f"value '{answer}'. Must be one of {list(letters)}.")
+
+
+# name -> (rows, kept (item code, options, correct answer id), rejected (row, item code, reason, message))
+CASES = {
+    "valid": (
+        [row("I1")],
+        [("I1", (("option_A", "Yes"), ("option_B", "No")), "option_A")],
+        [],
+    ),
+    "NaN options are left out": (
+        [row("I1", **{"Option A": math.nan, "Option C": "Maybe", "Correct Answer": "C"})],
+        [("I1", (("option_B", "No"), ("option_C", "Maybe")), "option_C")],
+        [],
+    ),
+    "blank options are left out": (
+        [row("I1", **{"Option A": "   ", "Correct Answer": "B"})],
+        [("I1", (("option_B", "No"),), "option_B")],
+        [],
+    ),
+    "no options": (
+        [row("I1", **{"Option A": math.nan, "Option B": " "}), row("I2")],
+        [("I2", (("option_A", "Yes"), ("option_B", "No")), "option_A")],
+        [(2, "I1", "no_valid_options", rejected(2, "I1", "no_valid_options"))],
+    ),
+    "lowercase answer": (
+        [row("I1", **{"Correct Answer": " b "})],
+        [("I1", (("option_A", "Yes"), ("option_B", "No")), "option_B")],
+        [],
+    ),
+    "answer out of range": (
+        [row("I1", **{"Correct Answer": "E"}), row("I2", **{"Correct Answer": "1"})],
+        [],
+        [(2, "I1", "invalid_correct_answer", wrong_answer(2, "I1", "E")),
+         (3, "I2", "invalid_correct_answer", wrong_answer(3, "I2", "1"))],
+    ),
+    "answer names a blank option": (
+        [row("I1", **{"Correct Answer": "D"}), row("I2", **{"Option B": math.nan, "Correct Answer": "B"})],
+        [],
+        [(2, "I1", "invalid_correct_answer", wrong_answer(2, "I1", "D")),
+         (3, "I2", "invalid_correct_answer", wrong_answer(3, "I2", "B", ["A"]))],
+    ),
+    "missing answer": (
+        [row("I1", **{"Correct Answer": ""})],
+        [],
+        [(2, "I1", "invalid_correct_answer", wrong_answer(2, "I1", ""))],
+    ),
+    "blank item code": (
+        [row("I1"), row("  "), row("I3")],
+        [("I1", (("option_A", "Yes"), ("option_B", "No")), "option_A"),
+         ("I3", (("option_A", "Yes"), ("option_B", "No")), "option_A")],
+        [(3, "", "invalid_item_code", rejected(3, "", "invalid_item_code"))],
+    ),
+    "the item code is checked first": (
+        [row("", **{"Option A": "", "Option B": "", "Correct Answer": "Z"})],
+        [],
+        [(2, "", "invalid_item_code", rejected(2, "", "invalid_item_code"))],
+    ),
+    "date cells are written with their time": (
+        [row("I1", **{"Option B": pd.Timestamp("2024-05-01")}), row("I2", **{"Option B": pd.NaT})],
+        [("I1", (("option_A", "Yes"), ("option_B", "2024-05-01 00:00:00")), "option_A"),
+         ("I2", (("option_A", "Yes"),), "option_A")],
+        [],
+    ),
+    # Duplicates are not a skip reason: both rows are kept, as before the vectorized pass
+    "duplicate item codes": (
+        [row("I1"), row("I1", **{"Correct Answer": "B"})],
+        [("I1", (("option_A", "Yes"), ("option_B", "No")), "option_A"),
+         ("I1", (("option_A", "Yes"), ("option_B", "No")), "option_B")],
+        [],
+    ),
+}
+
+
+@pytest.mark.parametrize("rows, kept, rejected_rows", CASES.values(), ids=CASES.keys())
+def test_validation(rows, kept, rejected_rows):
+    validation = main.validate_exam_data(pd.DataFrame(rows))
+
+    items = [item for item in validation.items if item is not None]
+    assert [(item.item_code, item.options, item.correct_answer_id) for item in items] == kept
+    assert validation.valid_mask.sum() == len(kept)
+
+    report = validation.rejected_rows
+    assert list(report.columns) == ["Row", "Assessment Code", "Item code", "Reason", "Message"]
+    assert list(report.itertuples(index=False, name=None)) == [
+        (row_number, "T1", item_code, reason, message) for row_number, item_code, reason, message in rejected_rows
+    ]
+    assert [message for message in validation.rejected_messages if message is not None] == [
+        message for *_, message in rejected_rows
+    ]
+
+
+@pytest.mark.filterwarnings("ignore:Duplicate name") # Both duplicate rows reach the zip
+@pytest.mark.parametrize("rows, kept, rejected_rows", CASES.values(), ids=CASES.keys())
+def test_rejected_rows_are_printed_and_reported(rows, kept, rejected_rows, tmp_path, capsys):
+    report_path = tmp_path / "rejected.csv"
+    main.create_qti_packages_by_assessment_code(
+        pd.DataFrame(rows), str(tmp_path / "out"), rejected_report_path=str(report_path)
+    )
+    out = capsys.readouterr().out
+    assert [line.strip() for line in out.splitlines() if "⚠️ Skipping" in line] == [
+        f"⚠️ {message}" for *_, message in rejected_rows
+    ]
+    report = pd.read_csv(report_path, keep_default_na=False, dtype={"Item code": str})
+    assert list(report.itertuples(index=False, name=None)) == [
+        (row_number, "T1", item_code, reason, message) for row_number, item_code, reason, message in rejected_rows
+    ]
+    assert os.path.isfile(tmp_path / "out" / "T1.zip") == bool(kept)
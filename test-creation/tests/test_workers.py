@@ -0,0 +1,54 @@
+import os
+import re
+
+from tao_qti import main
+from conftest import make_group, make_item
+
+
+def groups():
+    """Groups of different sizes, so pooled ones finish out of order, and one whose items all fail."""
+    built = [make_group(code, item_count) for code, item_count in [("A", 30), ("B", 1), ("C", 12), ("D", 2), ("E", 7)]]
+    broken = main.AssessmentGroup("BAD", [make_item(f"BAD_{i}", question="Broken \x01?") for i in range(3)], [])
+    return built[:2] + [broken] + built[2:]
+
+
+def build(output_dir, workers, groups, capsys):
+    """Builds the groups; returns the (code, zip name) pairs in the order they were reported, stdout and stderr."""
+    output_dir.mkdir()
+    reported = []
+    main.create_qti_packages_from_groups(
+        groups, str(output_dir), workers=workers,
+        on_package=lambda group, zip_path: reported.append(
+            (group.assessment_code, zip_path and os.path.basename(zip_path))
+        ),
+    )
+    captured = capsys.readouterr()
+    return reported, captured.out.replace(str(output_dir), "<out>"), captured.err
+
+
+def test_pooled_packages_match_serial_ones(tmp_path, capsys):
+    serial_reported, serial_out, serial_err = build(tmp_path / "serial", 1, groups(), capsys)
+    pooled_reported, pooled_out, pooled_err = build(tmp_path / "pooled", 3, groups(), capsys)
+
+    assert serial_reported == [
+        ("A", "A.zip"), ("B", "B.zip"), ("BAD", None), ("C", "C.zip"), ("D", "D.zip"), ("E", "E.zip")
+    ]
+    assert pooled_reported == serial_reported
+    assert pooled_out == serial_out
+    assert re.findall(r"Processing Assessment Code: '(\w+)'", pooled_out) == ["A", "B", "BAD", "C", "D", "E"]
+    assert pooled_err == serial_err and pooled_err.count("Error processing item") == 3
+
+    names = sorted(os.listdir(tmp_path / "serial"))
+    assert sorted(os.listdir(tmp_path / "pooled")) == names == ["A.zip", "B.zip", "C.zip", "D.zip", "E.zip"]
+    for name in names:
+        assert (tmp_path / "pooled" / name).read_bytes() == (tmp_path / "serial" / name).read_bytes(), name
+
+
+def test_a_group_that_kills_its_task_is_reported_in_order(tmp_path, capsys):
+    # A lambda can't be pickled, so the group never reaches a worker
+    unpicklable = main.AssessmentGroup("LAMBDA", [make_item("L1", stimulus=lambda: None)], [])
+    reported, _, err = build(tmp_path / "pooled", 2, [make_group("A"), unpicklable, make_group("B")], capsys)
+
+    assert reported == [("A", "A.zip"), ("LAMBDA", None), ("B", "B.zip")]
+    assert "unexpected error occurred while processing Assessment Code 'LAMBDA'" in err
+    assert sorted(os.listdir(tmp_path / "pooled")) == ["A.zip", "B.zip"]